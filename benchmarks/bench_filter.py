@@ -0,0 +1,86 @@
+"""
+Compare per-entry and vectorised time entry filtering.
+
+    python -m benchmarks.bench_filter --entries 100000
+
+Requires NumPy for the vectorised path.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from benchmarks.fixtures import make_metadata, make_time_entries
+from toggl_tally.api import TogglAPI
+from toggl_tally.filter import TogglFilter
+
+
+def filter_per_entry_with_union(toggl_filter: TogglFilter, time_entries: list):
+    """
+    The filter as originally implemented, building the union of project ids
+    for every time entry
+    """
+    workspace_ids_set = set(toggl_filter.filtered_workspaces.entity_ids)
+    client_project_ids_set = set(toggl_filter.filtered_client_projects.entity_ids)
+    project_ids_set = set(toggl_filter.filtered_projects.entity_ids)
+    return [
+        entry
+        for entry in time_entries
+        if entry["duration"] >= 0
+        and (
+            entry["workspace_id"] in workspace_ids_set
+            or entry["project_id"] in client_project_ids_set.union(project_ids_set)
+        )
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--projects", type=int, default=1_000)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    projects, clients, workspaces = make_metadata(5, args.clients, args.projects)
+    time_entries = make_time_entries(args.entries, projects)
+    toggl_filter = TogglFilter(
+        api=TogglAPI(),
+        projects=[project["name"] for project in projects[:10]],
+        clients=[client["name"] for client in clients[: args.clients // 4]],
+        user_projects=projects,
+        user_clients=clients,
+        user_workspaces=workspaces,
+    )
+    workspace_ids = np.array([entry["workspace_id"] for entry in time_entries])
+    project_ids = np.array([entry["project_id"] or 0 for entry in time_entries])
+    durations = np.array([entry["duration"] for entry in time_entries])
+
+    expected = filter_per_entry_with_union(toggl_filter, time_entries)
+    assert toggl_filter.filter_time_entries(time_entries) == expected
+    mask = toggl_filter.inclusion_mask(workspace_ids, project_ids, durations)
+    assert int(mask.sum()) == len(expected)
+
+    timings = {
+        "per_entry_union": lambda: filter_per_entry_with_union(
+            toggl_filter, time_entries
+        ),
+        "compiled": lambda: toggl_filter.filter_time_entries(time_entries),
+        "numpy_mask": lambda: toggl_filter.inclusion_mask(
+            workspace_ids, project_ids, durations
+        ),
+    }
+    baseline = None
+    for name, function in timings.items():
+        seconds = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        baseline = baseline or seconds
+        print(
+            f"{name:>16}: {seconds * 1000:9.2f} ms"
+            f"  {args.entries / seconds / 1e6:8.2f} M entries/s"
+            f"  {baseline / seconds:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
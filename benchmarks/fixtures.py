@@ -0,0 +1,92 @@
+"""
+Synthetic Toggl data for benchmarks
+"""
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+from unittest.mock import MagicMock
+
+
+def make_metadata(
+    n_workspaces: int, n_clients: int, n_projects: int, seed: int = 0
+) -> Tuple[List[dict], List[dict], List[dict]]:
+    rng = random.Random(seed)
+    workspaces = [{"name": f"Workspace {i}", "id": i + 1} for i in range(n_workspaces)]
+    clients = [
+        {"name": f"Client {i}", "id": i + 1, "wid": rng.choice(workspaces)["id"]}
+        for i in range(n_clients)
+    ]
+    projects = []
+    for i in range(n_projects):
+        client = rng.choice(clients + [None])
+        projects.append(
+            {
+                "name": f"Project {i}",
+                "id": i + 1,
+                "workspace_id": (
+                    client["wid"] if client else rng.choice(workspaces)["id"]
+                ),
+                "client_id": client["id"] if client else None,
+            }
+        )
+    return projects, clients, workspaces
+
+
+def make_time_entries(
+    n_entries: int,
+    projects: List[dict],
+    start: datetime = datetime(2023, 1, 1, tzinfo=timezone.utc),
+    days: int = 31,
+    seed: int = 0,
+) -> List[dict]:
+    rng = random.Random(seed)
+    time_entries = []
+    for i in range(n_entries):
+        project = rng.choice(projects)
+        entry_start = start + timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+        time_entries.append(
+            {
+                "id": i + 1,
+                "workspace_id": project["workspace_id"],
+                "project_id": project["id"] if rng.random() > 0.1 else None,
+                "start": entry_start.isoformat(),
+                # roughly 1 in 1000 entries is running
+                "duration": (
+                    rng.randint(60, 4 * 3600)
+                    if rng.random() > 0.001
+                    else -int(entry_start.timestamp())
+                ),
+            }
+        )
+    return time_entries
+
+
+def make_fake_session_get(
+    projects: List[dict],
+    clients: List[dict],
+    workspaces: List[dict],
+    time_entries: List[dict],
+):
+    """
+    A stand-in for requests.Session.get that serves pre-encoded bodies
+    """
+    bodies = {
+        "/me/projects": json.dumps(projects).encode(),
+        "/me/clients": json.dumps(clients).encode(),
+        "/me/workspaces": json.dumps(workspaces).encode(),
+        "/me/time_entries": json.dumps(time_entries).encode(),
+    }
+
+    def get(self, url, params=None, stream=False, **kwargs):
+        body = bodies[url[url.index("/me/") :]]
+        # no validators, so conditional requests leave nothing cached
+        response = MagicMock(ok=True, status_code=200, headers={})
+        response.json.side_effect = lambda: json.loads(body)
+        response.iter_content.side_effect = lambda chunk_size: (
+            body[i : i + chunk_size] for i in range(0, len(body), chunk_size)
+        )
+        return response
+
+    return get
@@ -0,0 +1,242 @@
+"""
+Benchmarks for toggl_tally's hot paths, printed as JSON lines:
+
+    python -m benchmarks [--quick] [--only filter,calendar] [--output results.jsonl]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List
+from unittest.mock import patch
+
+from benchmarks.fixtures import (
+    make_fake_session_get,
+    make_metadata,
+    make_time_entries,
+)
+
+ENTRY_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+QUICK_ENTRY_COUNTS = [1_000, 10_000]
+METADATA_SIZES = [(200, 50), (1_000, 200), (5_000, 1_000)]
+COUNTRIES = ["ZA", "US", "GB", "DE"]
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    gc.collect()
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def result(name: str, seconds: float, n_items: int, **params) -> dict:
+    return dict(
+        benchmark=name,
+        params=params,
+        seconds=seconds,
+        items=n_items,
+        items_per_second=n_items / seconds if seconds else None,
+    )
+
+
+def bench_filter(quick: bool, repeat: int) -> Iterator[dict]:
+    from toggl_tally.api import TogglAPI
+    from toggl_tally.entries import TimeEntryBatch
+    from toggl_tally.filter import TogglFilter
+
+    projects, clients, workspaces = make_metadata(5, 200, 1_000)
+    toggl_filter = TogglFilter(
+        api=TogglAPI(),
+        projects=[project["name"] for project in projects[:10]],
+        clients=[client["name"] for client in clients[:50]],
+        user_projects=projects,
+        user_clients=clients,
+        user_workspaces=workspaces,
+    )
+    for n_entries in QUICK_ENTRY_COUNTS if quick else ENTRY_COUNTS:
+        time_entries = make_time_entries(n_entries, projects)
+        seconds = measure(
+            lambda: toggl_filter.filter_time_entries(time_entries), repeat
+        )
+        yield result("filter_time_entries", seconds, n_entries, entries=n_entries)
+        batch = TimeEntryBatch.from_dicts(time_entries)
+        seconds = measure(lambda: toggl_filter.filter_batch(batch), repeat)
+        yield result("filter_batch", seconds, n_entries, entries=n_entries)
+
+
+def bench_filter_construction(quick: bool, repeat: int) -> Iterator[dict]:
+    from toggl_tally.api import TogglAPI
+    from toggl_tally.filter import TogglFilter
+
+    api = TogglAPI()
+    for n_projects, n_clients in METADATA_SIZES[:2] if quick else METADATA_SIZES:
+        projects, clients, workspaces = make_metadata(10, n_clients, n_projects)
+        client_names = [client["name"] for client in clients[: n_clients // 2]]
+        project_names = [project["name"] for project in projects[: n_projects // 10]]
+
+        def construct():
+            return TogglFilter(
+                api=api,
+                projects=project_names,
+                clients=client_names,
+                user_projects=projects,
+                user_clients=clients,
+                user_workspaces=workspaces,
+            )
+
+        seconds = measure(construct, repeat)
+        yield result(
+            "filter_construction",
+            seconds,
+            n_projects + n_clients,
+            projects=n_projects,
+            clients=n_clients,
+        )
+
+
+def bench_calendar(quick: bool, repeat: int) -> Iterator[dict]:
+    from toggl_tally.tally import TallySnapshot, TogglTally
+
+    n_days = 60 if quick else 730
+    dates = [
+        datetime(2023, 1, 1, 9, tzinfo=timezone.utc) + timedelta(days=day)
+        for day in range(n_days)
+    ]
+    for country in COUNTRIES[:1] if quick else COUNTRIES:
+        for invoice_day in [1, 15, 31]:
+
+            def remaining_working_days():
+                # a fresh tally each time, so holiday and calendar loading
+                # is included in the measurement
+                tally = TogglTally(invoice_day_of_month=invoice_day, country=country)
+                for now in dates:
+                    TallySnapshot(tally, now=now).remaining_working_days
+
+            seconds = measure(remaining_working_days, repeat)
+            yield result(
+                "remaining_working_days",
+                seconds,
+                n_days,
+                country=country,
+                invoice_day=invoice_day,
+            )
+
+        tally = TogglTally(invoice_day_of_month=1, country=country)
+
+        def calculate_invoice_dates():
+            for now in dates:
+                for invoice_day in range(1, 32):
+                    tally.calculate_invoice_date(
+                        invoice_day, now.month, now.year, tzinfo=now.tzinfo
+                    )
+
+        seconds = measure(calculate_invoice_dates, repeat)
+        yield result("calculate_invoice_date", seconds, n_days * 31, country=country)
+
+
+def bench_hours(quick: bool, repeat: int) -> Iterator[dict]:
+    from click.testing import CliRunner
+
+    from toggl_tally.cli import toggl_tally
+
+    projects, clients, workspaces = make_metadata(5, 200, 1_000)
+    now = datetime.now(timezone.utc)
+    args = [
+        "hours",
+        "--hours-per-month=160",
+        "--invoice-day=1",
+        "--country=ZA",
+        "--clients=" + ",".join(client["name"] for client in clients[:50]),
+    ]
+    # a cache directory of its own, so that the user's caches and any daemon
+    # of theirs are left alone
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {"TOGGL_API_TOKEN": "benchmark", "TOGGL_TALLY_CACHE_DIR": cache_dir}
+        for n_entries in QUICK_ENTRY_COUNTS if quick else ENTRY_COUNTS[:3]:
+            time_entries = make_time_entries(
+                n_entries, projects, start=now - timedelta(days=31)
+            )
+            fake_get = make_fake_session_get(
+                projects, clients, workspaces, time_entries
+            )
+
+            def hours():
+                with patch("requests.Session.get", fake_get):
+                    outcome = CliRunner().invoke(toggl_tally, args, env=env)
+                assert outcome.exit_code == 0, outcome.output
+
+            seconds = measure(hours, repeat)
+            yield result("hours_command", seconds, n_entries, entries=n_entries)
+
+
+def bench_fake_server(quick: bool, repeat: int) -> Iterator[dict]:
+    """
+    The hours command end to end over HTTP, against a local fake Toggl API
+    """
+    from click.testing import CliRunner
+
+    from toggl_tally.cli import toggl_tally
+    from toggl_tally.fake_toggl import FakeTogglServer, generate_dataset
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {"TOGGL_API_TOKEN": "benchmark", "TOGGL_TALLY_CACHE_DIR": cache_dir}
+        for n_entries in QUICK_ENTRY_COUNTS if quick else ENTRY_COUNTS[:3]:
+            dataset = generate_dataset(
+                n_time_entries=n_entries, n_clients=50, n_projects=200, days=31
+            )
+            client_names = [client["name"] for client in dataset["clients"][:10]]
+            with FakeTogglServer(dataset) as server:
+                args = [
+                    f"--api-url={server.base_url}",
+                    "hours",
+                    "--hours-per-month=160",
+                    "--invoice-day=1",
+                    "--country=ZA",
+                    "--clients=" + ",".join(client_names),
+                    "--no-daemon",
+                ]
+
+                def hours():
+                    outcome = CliRunner().invoke(toggl_tally, args, env=env)
+                    assert outcome.exit_code == 0, outcome.output
+
+                seconds = measure(hours, repeat)
+            yield result("hours_fake_server", seconds, n_entries, entries=n_entries)
+
+
+BENCHMARKS: Dict[str, Callable[[bool, int], Iterator[dict]]] = {
+    "filter": bench_filter,
+    "filter_construction": bench_filter_construction,
+    "calendar": bench_calendar,
+    "hours": bench_hours,
+    "fake_server": bench_fake_server,
+}
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Run small sizes only, e.g. in CI"
+    )
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help=f"Comma-separated benchmarks to run (default: {','.join(BENCHMARKS)})",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args(argv)
+    environment = dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        quick=args.quick,
+    )
+    for name in args.only.split(","):
+        for benchmark_result in BENCHMARKS[name.strip()](args.quick, args.repeat):
+            benchmark_result["environment"] = environment
+            print(json.dumps(benchmark_result), file=args.output, flush=True)
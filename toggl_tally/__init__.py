@@ -1,6 +1,37 @@
-from toggl_tally.api import TogglAPI
-from toggl_tally.filter import TogglFilter
-from toggl_tally.report import RichReport
-from toggl_tally.tally import TogglTally
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from toggl_tally.api import TogglAPI
+    from toggl_tally.async_api import AsyncTogglAPI
+    from toggl_tally.filter import TogglFilter
+    from toggl_tally.report import RichReport
+    from toggl_tally.tally import TogglTally
 
 __version__ = "0.1.2"
+
+# the public classes are imported on first access, so that e.g. the CLI's
+# --help doesn't pay for importing requests, holidays and rich
+_LAZY_IMPORTS = {
+    "AsyncTogglAPI": "toggl_tally.async_api",
+    "RichReport": "toggl_tally.report",
+    "TogglAPI": "toggl_tally.api",
+    "TogglFilter": "toggl_tally.filter",
+    "TogglTally": "toggl_tally.tally",
+}
+
+__all__ = sorted(_LAZY_IMPORTS)
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _LAZY_IMPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
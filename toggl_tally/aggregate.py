@@ -0,0 +1,53 @@
+from typing import Iterable, Iterator
+
+from toggl_tally.entries import TimeEntryBatch
+
+
+class DurationAggregator(object):
+    """
+    Running total of time entry durations, which consumes time entries one at
+    a time so they never need to be held in memory together
+
+    >>> aggregator = DurationAggregator()
+    >>> list(aggregator.iter_totals([{"duration": 3600}, {"duration": 1800}]))
+    [3600, 5400]
+    >>> aggregator.seconds, aggregator.n_entries
+    (5400, 2)
+
+    Time entries can be dicts, TimeEntry records or TimeEntryBatch columns.
+    """
+
+    def __init__(self):
+        self.seconds = 0
+        self.n_entries = 0
+
+    def add(self, time_entry: dict):
+        self.seconds += time_entry["duration"]
+        self.n_entries += 1
+
+    def consume(self, time_entries: Iterable[dict]) -> int:
+        for time_entry in time_entries:
+            self.add(time_entry)
+        return self.seconds
+
+    def consume_batch(self, batch: TimeEntryBatch) -> int:
+        """
+        Add a batch of time entries, which should already have been filtered
+        """
+        self.seconds += batch.total_duration(exclude_running_entries=False)
+        self.n_entries += len(batch)
+        return self.seconds
+
+    def iter_through(self, time_entries: Iterable[dict]) -> Iterator[dict]:
+        """
+        Add time entries as they pass through, e.g. to count time entries
+        before they are filtered
+        """
+        for time_entry in time_entries:
+            self.add(time_entry)
+            yield time_entry
+
+    def iter_totals(self, time_entries: Iterable[dict]) -> Iterator[int]:
+        for time_entry in time_entries:
+            self.add(time_entry)
+            yield self.seconds
@@ -1,35 +1,160 @@
+import hashlib
+import json
 import os
-from datetime import datetime
-from typing import Dict, List, Union
-
-import requests
-from requests.exceptions import HTTPError
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple, Union
 
+from toggl_tally.scheduler import RequestScheduler
+from toggl_tally.stream import iter_json_array
 from toggl_tally.time_utils import get_current_timestamp
+from toggl_tally.tracing import span
+
+if TYPE_CHECKING:
+    import requests
+
+    from toggl_tally.http_cache import ValidatorCache
+
+TOGGL_API_URL = "https://api.track.toggl.com/api/v9"
 
 
 class TogglAPI(object):
     def __init__(
         self,
-        base_url: str = "https://api.track.toggl.com/api/v9",
+        base_url: str = TOGGL_API_URL,
         headers: Dict[str, str] = {"content-type": "application/json"},
+        scheduler: Union[RequestScheduler, None] = None,
+        window: Union[timedelta, None] = timedelta(days=30),
+        max_window_entries: Union[int, None] = None,
+        min_window: timedelta = timedelta(hours=1),
+        validator_cache: Union["ValidatorCache", None] = None,
     ):
+        """
+        Requests are rate limited, capped in concurrency and retried by the
+        scheduler, which defaults to Toggl's documented rate limit.
+
+        Time entries between dates further apart than ``window`` are fetched
+        in windows of that size, in parallel. A window with at least
+        ``max_window_entries`` time entries is taken to have been truncated
+        by the API, and is split in half and fetched again, down to
+        ``min_window``.
+
+        With a ``validator_cache``, responses from the endpoints it accepts
+        are stored with their ETag and Last-Modified validators and then
+        requested conditionally, reusing the stored body when the server
+        answers 304 Not Modified.
+        """
         self.base_url = base_url
         self.headers = headers
-        self.session = requests.Session()
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.window = window
+        self.max_window_entries = max_window_entries
+        self.min_window = min_window
+        self.validator_cache = validator_cache
+        self._session: Union["requests.Session", None] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        # created on first use, so that requests is only imported when a
+        # request is actually made
+        with self._session_lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+        return self._session
+
+    @session.setter
+    def session(self, session: "requests.Session"):
+        self._session = session
 
     def auth(self):
-        api_token = os.getenv("TOGGL_API_TOKEN")
-        if api_token is None:
-            raise KeyError(
-                "Please ensure that the 'TOGGL_API_TOKEN' environment variable is set"
-            )
-        self.session.auth = (api_token, "api_token")
+        self.session.auth = (get_api_token(), "api_token")
+
+    def get_time_entries_between(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        if self._is_windowed(start_date, end_date):
+            return self._get_time_entries_windowed(start_date, end_date)
+        return self._get_time_entries_window(start_date, end_date)
+
+    def _is_windowed(self, start_date: datetime, end_date: datetime) -> bool:
+        return self.max_window_entries is not None or (
+            self.window is not None and end_date - start_date > self.window
+        )
 
-    def get_time_entries_between(self, start_date: datetime, end_date: datetime):
+    def _get_time_entries_window(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
         params = dict(start_date=start_date.isoformat(), end_date=end_date.isoformat())
         return self._call_toggl_api(f"{self.base_url}/me/time_entries", params=params)
 
+    def _get_time_entries_windowed(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        """
+        Fetch windows of the range in parallel (within the scheduler's rate
+        limit and concurrency cap), splitting truncated windows, and merge
+        the time entries by id, since the windows share their boundaries
+        """
+        time_entries: Dict[int, dict] = {}
+        max_workers = self.scheduler.max_concurrency
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {
+                executor.submit(self._get_time_entries_window, *window): window
+                for window in split_time_range(start_date, end_date, self.window)
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    window_start, window_end = pending.pop(future)
+                    window_entries = future.result() or []
+                    if self._is_truncated(window_entries, window_start, window_end):
+                        middle = window_start + (window_end - window_start) / 2
+                        for window in [(window_start, middle), (middle, window_end)]:
+                            future = executor.submit(
+                                self._get_time_entries_window, *window
+                            )
+                            pending[future] = window
+                        continue
+                    merge_time_entries(time_entries, window_entries)
+        return sorted(time_entries.values(), key=lambda entry: entry["start"])
+
+    def _is_truncated(
+        self, time_entries: List[dict], start_date: datetime, end_date: datetime
+    ) -> bool:
+        return (
+            self.max_window_entries is not None
+            and len(time_entries) >= self.max_window_entries
+            and end_date - start_date > self.min_window
+        )
+
+    def iter_time_entries_between(
+        self, start_date: datetime, end_date: datetime
+    ) -> Iterator[dict]:
+        """
+        Like get_time_entries_between, but decode the response body
+        incrementally, yielding each time entry as it arrives.
+
+        The request is made immediately; the body is read as the returned
+        iterator is consumed. Ranges that get_time_entries_between fetches in
+        windows are fetched the same way, and iterated once merged.
+        """
+        if self._is_windowed(start_date, end_date):
+            return iter(self._get_time_entries_windowed(start_date, end_date))
+        params = dict(start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        return self._stream_toggl_api(f"{self.base_url}/me/time_entries", params=params)
+
+    def get_time_entries_since(self, since: int) -> List[dict]:
+        """
+        Time entries modified since the given UNIX timestamp, including
+        deleted entries (which have ``server_deleted_at`` set)
+        """
+        params = dict(since=since)
+        return self._call_toggl_api(f"{self.base_url}/me/time_entries", params=params)
+
     def get_time_entries_to_date(self):
         current_timestamp = get_current_timestamp()
         params = dict(before=current_timestamp)
@@ -47,19 +172,168 @@ class TogglAPI(object):
     def _call_toggl_api(
         self, url: str, params: Union[dict, None] = None
     ) -> Union[dict, None]:
+        if self.validator_cache is not None and self.validator_cache.is_eligible(
+            self._endpoint(url)
+        ):
+            return self._call_toggl_api_conditionally(url, params=params)
+        response = self._get(url, params=params)
+        with span("api.decode_json", endpoint=self._endpoint(url)) as decode_span:
+            data = response.json()
+            decode_span.attributes["bytes"] = len(response.content)
+        return data
+
+    def _call_toggl_api_conditionally(
+        self, url: str, params: Union[dict, None] = None
+    ) -> Union[dict, None]:
+        """
+        Request with the validators of the cached response, if there is one,
+        and decode the cached body if the server says it is still current
+        """
+        from toggl_tally.http_cache import CachedResponse
+
+        endpoint = self._endpoint(url)
+        key = self._validator_key(url, params)
+        cached_response = self.validator_cache.get(key)
+        with span("cache.http", endpoint=endpoint) as cache_span:
+            response = self._get(
+                url,
+                params=params,
+                headers=(
+                    cached_response.conditional_headers()
+                    if cached_response is not None
+                    else None
+                ),
+            )
+            not_modified = response.status_code == 304 and cached_response is not None
+            cache_span.attributes["hit"] = not_modified
+            if not not_modified:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag is not None or last_modified is not None:
+                    self.validator_cache.put(
+                        key, CachedResponse(response.text, etag, last_modified)
+                    )
+        with span("api.decode_json", endpoint=endpoint) as decode_span:
+            if not_modified:
+                data = json.loads(cached_response.body)
+            else:
+                data = response.json()
+            decode_span.attributes["bytes"] = len(response.content)
+        return data
+
+    def _validator_key(self, url: str, params: Union[dict, None]) -> str:
+        # the credentials are part of the key, since responses are per user
         if self.session.auth is None:
             self.auth()
-        kwargs = dict(headers=self.headers)
+        request = json.dumps([self.session.auth, url, params], sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()[:16]
+
+    def _stream_toggl_api(
+        self, url: str, params: Union[dict, None] = None, chunk_size: int = 64 * 1024
+    ) -> Iterator[dict]:
+        response = self._get(url, params=params, stream=True)
+        return _iter_response(
+            response, chunk_size=chunk_size, endpoint=self._endpoint(url)
+        )
+
+    def _endpoint(self, url: str) -> str:
+        return url[len(self.base_url) :] if url.startswith(self.base_url) else url
+
+    def _get(
+        self,
+        url: str,
+        params: Union[dict, None] = None,
+        stream: bool = False,
+        headers: Union[Dict[str, str], None] = None,
+    ) -> "requests.Response":
+        if self.session.auth is None:
+            self.auth()
+        if headers:
+            headers = dict(self.headers, **headers)
+        else:
+            headers = self.headers
+        kwargs = dict(headers=headers, stream=stream)
         if params is not None:
             kwargs["params"] = params
-        response = self.session.get(url, **kwargs)
+        import requests
+
+        # includes connecting (DNS and TLS) on the first request of a session
+        with span("api.request", endpoint=self._endpoint(url)) as request_span:
+            response = self.scheduler.call(
+                lambda: self.session.get(url, **kwargs),
+                retry_exceptions=(requests.ConnectionError, requests.Timeout),
+            )
+            request_span.attributes["status"] = response.status_code
         if response.ok:
-            return response.json()
+            return response
         # give more info in the case of a bad request
         elif response.status_code == 400:
             error_msg = (
                 f"{response.status_code} Client Error: {response.text} for url: {url}"
             )
-            raise HTTPError(error_msg)
+            raise requests.HTTPError(error_msg)
         else:
             response.raise_for_status()
+
+
+def split_time_range(
+    start_date: datetime, end_date: datetime, window: Union[timedelta, None]
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Consecutive windows covering the range, each sharing its end with the
+    start of the next
+
+    >>> for window in split_time_range(
+    ...     datetime(2023, 1, 1), datetime(2023, 1, 20), timedelta(days=7)
+    ... ):
+    ...     print(*(moment.date() for moment in window))
+    2023-01-01 2023-01-08
+    2023-01-08 2023-01-15
+    2023-01-15 2023-01-20
+    """
+    if window is None:
+        return [(start_date, end_date)]
+    windows = []
+    window_start = start_date
+    while window_start < end_date:
+        window_end = min(window_start + window, end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows or [(start_date, end_date)]
+
+
+def merge_time_entries(merged: Dict[int, dict], time_entries: Iterable[dict]):
+    """
+    Add time entries to a dict keyed by id, keeping the most recently
+    updated version (by ``at``) of a time entry returned more than once
+    """
+    for time_entry in time_entries:
+        existing = merged.get(time_entry["id"])
+        if existing is None or existing.get("at", "") <= time_entry.get("at", ""):
+            merged[time_entry["id"]] = time_entry
+
+
+def _iter_response(
+    response: "requests.Response", chunk_size: int, endpoint: str = ""
+) -> Iterator[dict]:
+    # the span covers reading and decoding the body, and whatever the
+    # consumer does with each time entry in between
+    with response, span("api.stream_body", endpoint=endpoint) as body_span:
+        chunks = response.iter_content(chunk_size=chunk_size)
+        yield from iter_json_array(_count_bytes(chunks, body_span.attributes))
+
+
+def _count_bytes(chunks: Iterable[bytes], attributes: dict) -> Iterator[bytes]:
+    attributes["bytes"] = 0
+    for chunk in chunks:
+        attributes["bytes"] += len(chunk)
+        yield chunk
+
+
+def get_api_token() -> str:
+    api_token = os.getenv("TOGGL_API_TOKEN")
+    if api_token is None:
+        raise KeyError(
+            "Please ensure that the 'TOGGL_API_TOKEN' environment variable is set"
+        )
+    return api_token
@@ -0,0 +1,130 @@
+import base64
+from datetime import datetime
+from typing import Dict, List, Union
+
+from requests.exceptions import HTTPError
+
+from toggl_tally.api import get_api_token
+from toggl_tally.scheduler import RetryPolicy, parse_retry_after
+from toggl_tally.time_utils import get_current_timestamp
+
+
+class AsyncTogglAPI(object):
+    """
+    asyncio counterpart to TogglAPI, with every request made over one shared
+    aiohttp connection pool of at most ``max_connections`` connections, and
+    rate limited or transiently failing requests retried per the retry
+    policy.
+
+    Requires the optional ``async`` dependencies (``pip install toggl-tally[async]``).
+    Use as an async context manager, or call ``close`` when done:
+
+        async with AsyncTogglAPI() as api:
+            projects, clients = await asyncio.gather(
+                api.get_user_projects(), api.get_user_clients()
+            )
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://api.track.toggl.com/api/v9",
+        headers: Dict[str, str] = {"content-type": "application/json"},
+        max_connections: int = 10,
+        retry_policy: Union[RetryPolicy, None] = None,
+    ):
+        self.base_url = base_url
+        self.headers = headers
+        self.max_connections = max_connections
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = None
+        self.api_token: Union[str, None] = None
+
+    async def __aenter__(self) -> "AsyncTogglAPI":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def auth(self):
+        self.api_token = get_api_token()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_time_entries_between(self, start_date: datetime, end_date: datetime):
+        params = dict(start_date=start_date.isoformat(), end_date=end_date.isoformat())
+        return await self._call_toggl_api(
+            f"{self.base_url}/me/time_entries", params=params
+        )
+
+    async def get_time_entries_since(self, since: int) -> List[dict]:
+        params = dict(since=since)
+        return await self._call_toggl_api(
+            f"{self.base_url}/me/time_entries", params=params
+        )
+
+    async def get_time_entries_to_date(self):
+        current_timestamp = get_current_timestamp()
+        params = dict(before=current_timestamp)
+        return await self._call_toggl_api(
+            f"{self.base_url}/me/time_entries", params=params
+        )
+
+    async def get_user_workspaces(self) -> List[dict]:
+        return await self._call_toggl_api(f"{self.base_url}/me/workspaces")
+
+    async def get_user_clients(self) -> List[dict]:
+        return await self._call_toggl_api(f"{self.base_url}/me/clients")
+
+    async def get_user_projects(self) -> List[dict]:
+        return await self._call_toggl_api(f"{self.base_url}/me/projects")
+
+    def _get_session(self):
+        if self.session is None:
+            import aiohttp
+
+            if self.api_token is None:
+                self.auth()
+            credentials = base64.b64encode(f"{self.api_token}:api_token".encode())
+            self.session = aiohttp.ClientSession(
+                headers={"Authorization": f"Basic {credentials.decode()}"},
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+        return self.session
+
+    async def _call_toggl_api(
+        self, url: str, params: Union[dict, None] = None
+    ) -> Union[dict, None]:
+        import asyncio
+
+        session = self._get_session()
+        kwargs = dict(headers=self.headers)
+        if params is not None:
+            kwargs["params"] = {key: str(value) for key, value in params.items()}
+        attempt = 0
+        while True:
+            async with session.get(url, **kwargs) as response:
+                if response.ok:
+                    return await response.json(content_type=None)
+                if not self.retry_policy.should_retry(response.status, attempt):
+                    raise await _http_error(response, url)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            await asyncio.sleep(self.retry_policy.delay(attempt, retry_after))
+            attempt += 1
+
+
+async def _http_error(response, url: str) -> HTTPError:
+    # match the errors raised by TogglAPI, with more info in the case of a
+    # bad request
+    if response.status == 400:
+        text = await response.text()
+        error_msg = f"{response.status} Client Error: {text} for url: {url}"
+    else:
+        error_type = "Client" if response.status < 500 else "Server"
+        error_msg = (
+            f"{response.status} {error_type} Error: {response.reason}"
+            f" for url: {response.url}"
+        )
+    return HTTPError(error_msg)
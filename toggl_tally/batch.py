@@ -0,0 +1,256 @@
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Union
+
+from toggl_tally.aggregate import DurationAggregator
+from toggl_tally.api import TogglAPI
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.filter import TogglFilter
+from toggl_tally.metadata import MetadataCache, TogglMetadataIndex
+
+if TYPE_CHECKING:
+    from toggl_tally.tally import TallySnapshot
+
+
+@dataclass
+class HoursConfig:
+    """
+    One block of a batch file, with the same keys (and defaults) as the
+    options of the hours command, plus the name the block is keyed by
+    """
+
+    name: str
+    hours_per_month: int
+    invoice_day: int
+    country: str
+    workspaces: List[str] = field(default_factory=list)
+    clients: List[str] = field(default_factory=list)
+    projects: List[str] = field(default_factory=list)
+    skip_today: bool = False
+    timezone: Union[str, None] = None
+    working_days: List[str] = field(
+        default_factory=lambda: ["MO", "TU", "WE", "TH", "FR"]
+    )
+    exclude_public_holidays: bool = True
+
+    @classmethod
+    def from_dict(cls, name: str, config: dict) -> "HoursConfig":
+        """
+        >>> HoursConfig.from_dict(
+        ...     "megacorp",
+        ...     {"hours_per_month": 80, "invoice_day": 1, "country": "ZA", "clients": None},
+        ... ).clients
+        []
+        """
+        known_keys = {config_field.name for config_field in fields(cls)} - {"name"}
+        unknown_keys = set(config) - known_keys
+        if unknown_keys:
+            raise ValueError(
+                f"Unknown keys {sorted(unknown_keys)} in batch config {name}"
+            )
+        kwargs = {key: value for key, value in config.items() if value is not None}
+        for key in ["workspaces", "clients", "projects", "working_days"]:
+            if isinstance(kwargs.get(key), str):
+                kwargs[key] = [value.strip() for value in kwargs[key].split(",")]
+        try:
+            return cls(name=name, **kwargs)
+        except TypeError:
+            missing_keys = [
+                key
+                for key in ["hours_per_month", "invoice_day", "country"]
+                if key not in kwargs
+            ]
+            raise ValueError(f"Missing keys {missing_keys} in batch config {name}")
+
+    def unknown_names(self, index: TogglMetadataIndex) -> List[str]:
+        """
+        The workspaces, clients and projects the config filters by that
+        aren't in the index
+        """
+        return [
+            name
+            for toggl_entity, names in [
+                ("project", self.projects),
+                ("client", self.clients),
+                ("workspace", self.workspaces),
+            ]
+            for name in names
+            if name not in index.ids_by_name[toggl_entity]
+        ]
+
+    def make_tally(self):
+        from toggl_tally.tally import TogglTally
+
+        return TogglTally(
+            invoice_day_of_month=self.invoice_day,
+            country=self.country,
+            skip_today=self.skip_today,
+            timezone=self.timezone,
+            working_days=self.working_days,
+            exclude_public_holidays=self.exclude_public_holidays,
+        )
+
+
+def load_batch_configs(configs: Dict[str, dict]) -> List[HoursConfig]:
+    """
+    Batch configs from a mapping of names to config blocks, e.g. as loaded
+    from a yaml batch file
+    """
+    if not isinstance(configs, dict) or not configs:
+        raise ValueError("Expected a mapping of names to config blocks")
+    return [HoursConfig.from_dict(name, config) for name, config in configs.items()]
+
+
+def get_batch_index(
+    configs: List[HoursConfig], metadata_cache: MetadataCache
+) -> TogglMetadataIndex:
+    """
+    The metadata cache's index, refreshed once if any config names an entity
+    created since the cache was filled, as TogglFilter does for a single
+    config. Configs are evaluated against the index in worker processes,
+    which can't refresh the cache themselves.
+    """
+    index = metadata_cache.get_index()
+    if not metadata_cache.is_refreshed and any(
+        config.unknown_names(index) for config in configs
+    ):
+        index = metadata_cache.refresh()
+    return index
+
+
+class SharedData(NamedTuple):
+    """
+    Everything fetched once and shared by every config of a batch
+    """
+
+    time_entries: TimeEntryBatch
+    user_projects: List[dict]
+    user_clients: List[dict]
+    user_workspaces: List[dict]
+
+
+def evaluate_config(config: HoursConfig, now: datetime, shared: SharedData) -> dict:
+    """
+    The hours command's figures for one config, with time entries filtered
+    from the shared time entries rather than fetched
+    """
+    from toggl_tally.tally import TallySnapshot
+
+    try:
+        toggl_filter = TogglFilter(
+            api=TogglAPI(),
+            projects=config.projects,
+            clients=config.clients,
+            workspaces=config.workspaces,
+            user_projects=shared.user_projects,
+            user_clients=shared.user_clients,
+            user_workspaces=shared.user_workspaces,
+        )
+    except ValueError as error:
+        # one misconfigured block shouldn't fail the whole batch
+        return dict(
+            name=config.name, hours_per_month=config.hours_per_month, error=str(error)
+        )
+    return compute_hours(
+        config,
+        snapshot=TallySnapshot(config.make_tally(), now=now),
+        toggl_filter=toggl_filter,
+        time_entries=shared.time_entries,
+    )
+
+
+def compute_hours(
+    config: HoursConfig,
+    snapshot: "TallySnapshot",
+    toggl_filter: TogglFilter,
+    time_entries: TimeEntryBatch,
+) -> dict:
+    """
+    The hours command's figures for one config, as a JSON-serialisable dict
+    """
+    seconds_worked = _seconds_worked_between(
+        toggl_filter,
+        time_entries,
+        start=int(snapshot.first_billable_date.timestamp()),
+        end=int(snapshot.now.timestamp()),
+    )
+    target_seconds = config.hours_per_month * 60 * 60
+    seconds_outstanding = max(target_seconds - seconds_worked, 0)
+    remaining_working_days = snapshot.remaining_working_days
+    return dict(
+        name=config.name,
+        hours_per_month=config.hours_per_month,
+        seconds_worked=seconds_worked,
+        seconds_outstanding=seconds_outstanding,
+        remaining_working_days=remaining_working_days,
+        seconds_per_day=(
+            seconds_outstanding / remaining_working_days
+            if remaining_working_days
+            else None
+        ),
+        first_billable_date=snapshot.first_billable_date.isoformat(),
+        last_billable_date=snapshot.last_billable_date.isoformat(),
+        next_invoice_date=snapshot.next_invoice_date.isoformat(),
+        remaining_public_holidays=[
+            [name, holiday_date.isoformat()]
+            for name, holiday_date in snapshot.remaining_public_holidays
+        ],
+    )
+
+
+def evaluate_configs(
+    configs: List[HoursConfig],
+    nows: List[datetime],
+    shared: SharedData,
+    processes: Union[int, None] = None,
+) -> List[dict]:
+    """
+    Evaluate each config at its own ``now``, in a pool of worker processes
+    if ``processes`` is given. The shared data is sent to each worker once.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not processes:
+        return [
+            evaluate_config(config, now, shared) for config, now in zip(configs, nows)
+        ]
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(shared,)
+    ) as executor:
+        return list(executor.map(_evaluate_config_in_worker, configs, nows))
+
+
+_worker_shared: Union[SharedData, None] = None
+
+
+def _init_worker(shared: SharedData):
+    global _worker_shared
+    _worker_shared = shared
+
+
+def _evaluate_config_in_worker(config: HoursConfig, now: datetime) -> dict:
+    return evaluate_config(config, now, _worker_shared)
+
+
+def _seconds_worked_between(
+    toggl_filter: TogglFilter, batch: TimeEntryBatch, start: int, end: int
+) -> int:
+    """
+    Total duration of the time entries passing the filter that started
+    between the start and end timestamps inclusive
+    """
+    try:
+        columns = batch.to_numpy()
+    except ImportError:
+        return DurationAggregator().consume(
+            toggl_filter.iter_time_entries(
+                time_entry for time_entry in batch if start <= time_entry.start <= end
+            )
+        )
+    mask = toggl_filter.inclusion_mask(
+        workspace_ids=columns["workspace_id"],
+        project_ids=columns["project_id"],
+        durations=columns["duration"],
+    )
+    mask &= (columns["start"] >= start) & (columns["start"] <= end)
+    return int(columns["duration"][mask].sum())
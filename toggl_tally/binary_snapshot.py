@@ -0,0 +1,269 @@
+import math
+import mmap
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Sequence, Union
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.cache import TimeEntryCache, write_bytes_atomic
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.tracing import span
+
+# bumped when the layout changes, which rebuilds snapshots on their next use
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b"TTEB"
+# magic, version, number of fields, number of time entries, last sync as a
+# UNIX timestamp and covered from in microseconds since the epoch; 32 bytes,
+# so the columns are 8 byte aligned
+_HEADER = struct.Struct("<4sHHqqq")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class IncompatibleSnapshot(ValueError):
+    pass
+
+
+class MappedTimeEntryBatch(TimeEntryBatch):
+    """
+    A TimeEntryBatch read from a binary snapshot file through ``mmap``, so
+    nothing is parsed or copied when it is opened.
+
+    The snapshot is a fixed-size header followed by each field's column of
+    little-endian 64 bit integers, with the time entries sorted by start.
+    The batch's columns are memoryviews of the mapped file, so ``to_numpy``
+    gives NumPy arrays over the file itself, and a range of start times is
+    a slice of every column.
+
+    >>> import tempfile
+    >>> path = Path(tempfile.mkdtemp()) / "time_entries.bin"
+    >>> write_snapshot(
+    ...     path,
+    ...     TimeEntryBatch.from_dicts(
+    ...         {"id": index, "workspace_id": 1, "project_id": None,
+    ...          "duration": 60 * index, "start": f"2023-03-0{index}T00:00:00Z"}
+    ...         for index in [3, 1, 2]
+    ...     ),
+    ...     last_sync=1678000000,
+    ...     covered_from=datetime(2023, 3, 1, tzinfo=timezone.utc),
+    ... )
+    >>> batch = MappedTimeEntryBatch.open(path)
+    >>> list(batch.columns["id"])
+    [1, 2, 3]
+    >>> batch.between(
+    ...     datetime(2023, 3, 2, tzinfo=timezone.utc),
+    ...     datetime(2023, 3, 3, tzinfo=timezone.utc),
+    ... ).total_duration()
+    300
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, Sequence[int]],
+        last_sync: int,
+        covered_from: datetime,
+        mapping: Union[mmap.mmap, None] = None,
+    ):
+        self.columns = columns
+        self.last_sync = last_sync
+        self.covered_from = covered_from
+        self._mapping = mapping
+
+    @classmethod
+    def open(cls, path: Path) -> "MappedTimeEntryBatch":
+        """
+        Map a snapshot file, raising IncompatibleSnapshot if it was written
+        in another format or is truncated
+        """
+        with path.open("rb") as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # an empty file can't be mapped
+                raise IncompatibleSnapshot(f"{path} is empty")
+        if len(mapping) < _HEADER.size:
+            mapping.close()
+            raise IncompatibleSnapshot(f"{path} is truncated")
+        magic, version, n_fields, n_entries, last_sync, covered_from = (
+            _HEADER.unpack_from(mapping)
+        )
+        if (magic, version, n_fields) != (_MAGIC, SNAPSHOT_VERSION, len(cls.fields)):
+            mapping.close()
+            raise IncompatibleSnapshot(
+                f"{path} is not a version {SNAPSHOT_VERSION} time entry snapshot"
+            )
+        column_size = 8 * n_entries
+        if len(mapping) != _HEADER.size + len(cls.fields) * column_size:
+            mapping.close()
+            raise IncompatibleSnapshot(f"{path} is truncated")
+        buffer = memoryview(mapping)
+        columns = {}
+        for position, field in enumerate(cls.fields):
+            offset = _HEADER.size + position * column_size
+            column = buffer[offset : offset + column_size]
+            if sys.byteorder == "little":
+                columns[field] = column.cast("q")
+            else:
+                # not zero-copy on big-endian machines
+                columns[field] = array("q", column.tobytes())
+                columns[field].byteswap()
+        return cls(
+            columns,
+            last_sync=last_sync,
+            covered_from=_EPOCH + covered_from * _MICROSECOND,
+            mapping=mapping,
+        )
+
+    def close(self):
+        """
+        Unmap the file, once any slices and NumPy views of the columns are
+        gone
+        """
+        for column in self.columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def __enter__(self) -> "MappedTimeEntryBatch":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __reduce__(self):
+        # the mapping can't be sent to other processes, so send a copy
+        return _batch_from_columns, (self.to_batch().columns,)
+
+    def append(self, time_entry):
+        raise TypeError("Snapshots are read-only")
+
+    def is_fresh(self, max_age: float) -> bool:
+        return time.time() - self.last_sync <= max_age
+
+    def covers(self, start_date: datetime) -> bool:
+        return self.covered_from <= start_date
+
+    def between(
+        self, start_date: datetime, end_date: datetime
+    ) -> "MappedTimeEntryBatch":
+        """
+        The time entries starting between the dates inclusive, as views of
+        the same mapping, which stays open until this snapshot is closed
+        """
+        starts = self.columns["start"]
+        lower = bisect_left(starts, math.ceil(start_date.timestamp()))
+        upper = bisect_right(starts, math.floor(end_date.timestamp()))
+        return MappedTimeEntryBatch(
+            {field: column[lower:upper] for field, column in self.columns.items()},
+            last_sync=self.last_sync,
+            covered_from=self.covered_from,
+        )
+
+    def to_batch(self) -> TimeEntryBatch:
+        """
+        A copy of the time entries in memory
+        """
+        batch = TimeEntryBatch()
+        for field, column in self.columns.items():
+            batch.columns[field].frombytes(memoryview(column).cast("B"))
+        return batch
+
+
+def _batch_from_columns(columns: Dict[str, array]) -> TimeEntryBatch:
+    batch = TimeEntryBatch()
+    batch.columns = columns
+    return batch
+
+
+def write_snapshot(
+    path: Path, batch: TimeEntryBatch, last_sync: int, covered_from: datetime
+):
+    """
+    Write a batch of time entries to a snapshot file atomically, sorted by
+    start
+    """
+    starts = batch.columns["start"]
+    batch = batch.select(sorted(range(len(batch)), key=starts.__getitem__))
+    chunks = [
+        _HEADER.pack(
+            _MAGIC,
+            SNAPSHOT_VERSION,
+            len(batch.fields),
+            len(batch),
+            last_sync,
+            (covered_from - _EPOCH) // _MICROSECOND,
+        )
+    ]
+    for field in batch.fields:
+        column = batch.columns[field]
+        if sys.byteorder != "little":
+            column = array("q", column)
+            column.byteswap()
+        chunks.append(column.tobytes())
+    write_bytes_atomic(path, b"".join(chunks))
+
+
+def snapshot_path(cache_path: Path) -> Path:
+    """
+    Path of the binary snapshot kept next to a JSON time entry cache
+    """
+    return cache_path.with_suffix(".bin")
+
+
+def write_cache_snapshot(cache: TimeEntryCache):
+    write_snapshot(
+        snapshot_path(cache.path),
+        TimeEntryBatch.from_dicts(cache.entries.values()),
+        last_sync=cache.last_sync,
+        covered_from=cache.covered_from,
+    )
+
+
+def get_fresh_time_entry_batch(
+    api: TogglAPI,
+    start_date: datetime,
+    end_date: datetime,
+    max_age: float,
+    cache_dir: Union[Path, None] = None,
+    api_token: Union[str, None] = None,
+    timezone: Union[str, None] = None,
+) -> TimeEntryBatch:
+    """
+    As TimeEntryCache.get_fresh_time_entries_between, as a batch mapped from
+    the cache's binary snapshot if the snapshot is fresh and covers the
+    start date, without reading the JSON cache.
+
+    Otherwise the JSON cache is read (and synced if it is stale), and the
+    snapshot is rewritten from it. A cache created by the sync gets a daily
+    rollup in ``timezone``.
+    """
+    cache_path = TimeEntryCache.path_for_user(cache_dir, api_token)
+    try:
+        snapshot = MappedTimeEntryBatch.open(snapshot_path(cache_path))
+    except (FileNotFoundError, IncompatibleSnapshot):
+        snapshot = None
+    hit = (
+        snapshot is not None
+        and snapshot.is_fresh(max_age)
+        and snapshot.covers(start_date)
+    )
+    with span("cache.snapshot", hit=hit):
+        if hit:
+            return snapshot.between(start_date, end_date)
+        if snapshot is not None:
+            snapshot.close()
+        cache = TimeEntryCache(cache_path, timezone=timezone)
+        time_entries = cache.get_fresh_time_entries_between(
+            api, start_date=start_date, end_date=end_date, max_age=max_age
+        )
+        write_cache_snapshot(cache)
+        return TimeEntryBatch.from_dicts(time_entries)
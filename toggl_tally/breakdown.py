@@ -0,0 +1,124 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from toggl_tally.filter import TogglFilter
+    from toggl_tally.metadata import TogglMetadataIndex
+
+# (workspace id, project id), with a project id of 0 for time entries without
+# a project, as in DailyRollup
+GroupKey = Tuple[int, int]
+
+NO_CLIENT = "(no client)"
+NO_PROJECT = "(no project)"
+
+
+def totals_by_project(time_entries: Iterable[dict]) -> Dict[GroupKey, int]:
+    """
+    Total duration per (workspace id, project id), in a single pass over the
+    time entries, skipping running ones
+
+    >>> totals_by_project(
+    ...     [
+    ...         {"workspace_id": 1, "project_id": 10, "duration": 600},
+    ...         {"workspace_id": 1, "project_id": None, "duration": 300},
+    ...         {"workspace_id": 1, "project_id": 10, "duration": 60},
+    ...     ]
+    ... )
+    {(1, 10): 660, (1, 0): 300}
+    """
+    totals: Dict[GroupKey, int] = {}
+    for time_entry in time_entries:
+        duration = time_entry["duration"]
+        if duration < 0:
+            continue
+        key = (time_entry["workspace_id"], time_entry["project_id"] or 0)
+        totals[key] = totals.get(key, 0) + duration
+    return totals
+
+
+def filter_totals(
+    totals: Dict[GroupKey, int], toggl_filter: Union["TogglFilter", None]
+) -> Dict[GroupKey, int]:
+    if toggl_filter is None:
+        return totals
+    return {
+        key: seconds
+        for key, seconds in totals.items()
+        if toggl_filter.includes_ids(*key)
+    }
+
+
+def breakdown(totals: Dict[GroupKey, int], index: "TogglMetadataIndex") -> dict:
+    """
+    Totals per workspace, client and project, each level sorted by time
+    worked, from the totals per (workspace id, project id). Projects are
+    joined to their clients and workspaces through the metadata index.
+    """
+    workspaces: Dict[int, dict] = {}
+    for (workspace_id, project_id), seconds in totals.items():
+        project = index.entities_by_id["project"].get(project_id)
+        client_id = project.get("client_id") if project is not None else None
+        client = index.entities_by_id["client"].get(client_id)
+        workspace = workspaces.get(workspace_id)
+        if workspace is None:
+            workspace = workspaces[workspace_id] = _group(
+                workspace_id,
+                _name(index, "workspace", workspace_id, str(workspace_id)),
+                "clients",
+            )
+        client_group = workspace["clients"].get(client_id)
+        if client_group is None:
+            client_group = workspace["clients"][client_id] = _group(
+                client_id,
+                client["name"] if client is not None else NO_CLIENT,
+                "projects",
+            )
+        client_group["projects"][project_id] = dict(
+            id=project_id or None,
+            name=project["name"] if project is not None else NO_PROJECT,
+            seconds=seconds,
+        )
+        workspace["seconds"] += seconds
+        client_group["seconds"] += seconds
+    return dict(
+        seconds=sum(totals.values()),
+        workspaces=_sorted_groups(workspaces, "clients", "projects"),
+    )
+
+
+def iter_breakdown_rows(result: dict) -> Iterable[Tuple[int, str, int]]:
+    """
+    (depth, name, seconds) for each workspace, client and project, in order
+    """
+    for workspace in result["workspaces"]:
+        yield 0, workspace["name"], workspace["seconds"]
+        for client in workspace["clients"]:
+            yield 1, client["name"], client["seconds"]
+            for project in client["projects"]:
+                yield 2, project["name"], project["seconds"]
+
+
+def _group(group_id: Union[int, None], name: str, children: str) -> dict:
+    return {"id": group_id, "name": name, "seconds": 0, children: {}}
+
+
+def _name(
+    index: "TogglMetadataIndex", toggl_entity: str, entity_id: int, default: str
+) -> str:
+    entity = index.entities_by_id[toggl_entity].get(entity_id)
+    return entity["name"] if entity is not None else default
+
+
+def _sorted_groups(groups: Dict, *children: str) -> List[dict]:
+    """
+    The groups as lists, longest first, with their children sorted likewise
+    """
+    result = []
+    for group in sorted(groups.values(), key=lambda group: -group["seconds"]):
+        if children:
+            group = dict(
+                group,
+                **{children[0]: _sorted_groups(group[children[0]], *children[1:])},
+            )
+        result.append(group)
+    return result
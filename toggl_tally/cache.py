@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Union
+
+from toggl_tally.api import TogglAPI, get_api_token
+from toggl_tally.rollup import DailyRollup
+from toggl_tally.time_utils import get_current_datetime, parse_timestamp
+from toggl_tally.tracing import span
+
+
+def default_cache_dir() -> Path:
+    cache_dir = os.getenv("TOGGL_TALLY_CACHE_DIR")
+    if cache_dir is not None:
+        return Path(cache_dir)
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "toggl-tally"
+
+
+def user_cache_key(api_token: Union[str, None] = None) -> str:
+    """
+    Identify the Toggl user by their API token without making any requests
+
+    >>> user_cache_key("secret")
+    '2bb80d537b1da3e3'
+    """
+    if api_token is None:
+        api_token = get_api_token()
+    return hashlib.sha256(api_token.encode()).hexdigest()[:16]
+
+
+def write_json_atomic(path: Path, data: Union[dict, list]):
+    write_text_atomic(path, json.dumps(data))
+
+
+def write_text_atomic(path: Path, text: str):
+    write_bytes_atomic(path, text.encode())
+
+
+def write_bytes_atomic(path: Path, data: bytes):
+    """
+    Write to a temporary file and rename it over the path, so readers never
+    see a partly written file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class TimeEntryCache(object):
+    """
+    On-disk cache of a user's time entries.
+
+    The first sync downloads every entry from a start date onwards; later syncs
+    only ask the API for entries modified since the previous sync, including
+    deleted entries, which are dropped from the cache.
+
+    A daily rollup of the time entries (see DailyRollup) is kept up to date
+    alongside them, in the given timezone for a new cache. Once an invoice
+    period is closed, its raw time entries can be compacted away, leaving
+    only the rollup's totals.
+    """
+
+    version = 2
+
+    def __init__(self, path: Path, timezone: Union[str, None] = None):
+        self.path = path
+        self.entries: Dict[int, dict] = {}
+        self.last_sync: Union[int, None] = None
+        self.covered_from: Union[datetime, None] = None
+        self.rollup = DailyRollup(timezone=timezone)
+        self.load()
+
+    @classmethod
+    def for_user(
+        cls,
+        cache_dir: Union[Path, None] = None,
+        api_token: Union[str, None] = None,
+        timezone: Union[str, None] = None,
+    ) -> "TimeEntryCache":
+        return cls(cls.path_for_user(cache_dir, api_token), timezone=timezone)
+
+    @staticmethod
+    def path_for_user(
+        cache_dir: Union[Path, None] = None, api_token: Union[str, None] = None
+    ) -> Path:
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        return cache_dir / f"time_entries_{user_cache_key(api_token)}.json"
+
+    def load(self):
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") != self.version:
+            # incompatible cache, rebuild on the next sync
+            return
+        self.entries = {entry["id"]: entry for entry in data["entries"]}
+        self.last_sync = data["last_sync"]
+        self.covered_from = parse_timestamp(data["covered_from"])
+        self.rollup = DailyRollup.from_dict(data["rollup"])
+
+    def save(self):
+        write_json_atomic(
+            self.path,
+            dict(
+                version=self.version,
+                last_sync=self.last_sync,
+                covered_from=self.covered_from.isoformat(),
+                entries=list(self.entries.values()),
+                rollup=self.rollup.to_dict(),
+            ),
+        )
+
+    def is_fresh(self, max_age: float) -> bool:
+        if self.last_sync is None:
+            return False
+        return time.time() - self.last_sync <= max_age
+
+    def covers(self, start_date: datetime) -> bool:
+        return self.covered_from is not None and self.covered_from <= start_date
+
+    def sync(self, api: TogglAPI, start_date: datetime, full: bool = False) -> int:
+        """
+        Bring the cache up to date from ``start_date`` onwards.
+
+        Returns the number of time entries received from the API.
+        """
+        # record the sync time before the request so that edits made while
+        # the request is in flight are picked up by the next sync
+        sync_started = int(time.time())
+        if full or self.last_sync is None or not self.covers(start_date):
+            time_entries = api.get_time_entries_between(
+                start_date=start_date,
+                end_date=get_current_datetime(),
+            )
+            self.entries = {entry["id"]: entry for entry in time_entries}
+            self.covered_from = start_date
+            self.rollup.rebuild(time_entries, start_date=start_date)
+        else:
+            time_entries = api.get_time_entries_since(since=self.last_sync)
+            self.merge(time_entries)
+        self.last_sync = sync_started
+        return len(time_entries)
+
+    def merge(self, time_entries: List[dict]):
+        for time_entry in time_entries:
+            if time_entry.get("server_deleted_at"):
+                previous = self.entries.pop(time_entry["id"], None)
+            else:
+                previous = self.entries.get(time_entry["id"])
+                self.entries[time_entry["id"]] = time_entry
+                self.rollup.add(time_entry)
+            if previous is not None:
+                self.rollup.remove(previous)
+
+    def compact(self, until: date) -> int:
+        """
+        Drop the raw time entries of days before ``until`` (in the rollup's
+        timezone), keeping only their daily totals, and stop applying changes
+        to those days.
+
+        Returns the number of time entries dropped.
+        """
+        self.rollup.compact(until)
+        if self.rollup.compacted_until is None:
+            return 0
+        n_entries = len(self.entries)
+        self.entries = {
+            entry_id: entry
+            for entry_id, entry in self.entries.items()
+            if self.rollup.day_of(entry) >= self.rollup.compacted_until
+        }
+        self.covered_from = max(
+            self.covered_from, self.rollup.day_start(self.rollup.compacted_until)
+        )
+        return n_entries - len(self.entries)
+
+    def get_time_entries_between(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[dict]:
+        time_entries = [
+            entry
+            for entry in self.entries.values()
+            if start_date <= parse_timestamp(entry["start"]) <= end_date
+        ]
+        return sorted(time_entries, key=lambda entry: entry["start"])
+
+    def get_fresh_rollup(
+        self, api: TogglAPI, start_date: datetime, max_age: float
+    ) -> DailyRollup:
+        """
+        The daily rollup, syncing first if the cache is older than ``max_age``
+        seconds or the rollup does not reach back to ``start_date``
+        """
+        covered = self.rollup.covers(self.rollup.local_date(start_date))
+        hit = covered and self.is_fresh(max_age)
+        with span("cache.rollup", hit=hit):
+            if not hit:
+                if not covered and self.covered_from is not None:
+                    # never shrink the history an earlier sync downloaded
+                    start_date = min(start_date, self.covered_from)
+                self.sync(api, start_date=start_date, full=not covered)
+                self.save()
+            return self.rollup
+
+    def get_fresh_time_entries_between(
+        self,
+        api: TogglAPI,
+        start_date: datetime,
+        end_date: datetime,
+        max_age: Union[float, None] = None,
+    ) -> List[dict]:
+        """
+        Read time entries from the cache, syncing first if the cache is older
+        than ``max_age`` seconds or does not reach back to ``start_date``
+        """
+        hit = max_age is not None and self.is_fresh(max_age) and self.covers(start_date)
+        with span("cache.time_entries", hit=hit):
+            if not hit:
+                self.sync(api, start_date=start_date)
+                self.save()
+            return self.get_time_entries_between(start_date, end_date)
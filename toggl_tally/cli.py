@@ -1,19 +1,59 @@
 import ast
+import hashlib
+import json
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
 from pathlib import Path
-from typing import List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 import click
-import yaml
-from rich.console import Console
-from rich.traceback import install
 
-from toggl_tally import RichReport, TogglAPI, TogglFilter, TogglTally
+from toggl_tally.aggregate import DurationAggregator
+from toggl_tally.api import TOGGL_API_URL, TogglAPI
+from toggl_tally.cache import TimeEntryCache, default_cache_dir
+from toggl_tally.filter import TogglFilter
+from toggl_tally.metadata import MetadataCache
+from toggl_tally.time_utils import get_current_datetime
+from toggl_tally.tracing import span
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from toggl_tally.entries import TimeEntryBatch
+    from toggl_tally.metrics import TogglTallyMetrics
+    from toggl_tally.rollup import DailyRollup
+    from toggl_tally.sqlite_store import SQLiteStore
+    from toggl_tally.tracing import SpanRecorder
+
+# rich, yaml, holidays and dateutil.rrule are imported by the commands that use
+# them rather than at module level, to keep CLI startup (and --help) fast
 
 CONTEXT_SETTINGS = dict(
     help_option_names=["-h", "--help"], auto_envvar_prefix="TOGGL_TALLY"
 )
 
 
+def _rich_excepthook(exc_type, exc_value, traceback):
+    """
+    Install rich traceback handling only once there is a traceback to show
+    """
+    from rich.traceback import install
+
+    install(max_frames=1)
+    sys.excepthook(exc_type, exc_value, traceback)
+
+
 def _comma_separated_arg_split(ctx, param, value):
     """
     >>> _comma_separated_arg_split(None, None, 'foo,bar,baz')
@@ -48,6 +88,184 @@ def _comma_separated_arg_split(ctx, param, value):
     return options
 
 
+def _api_url() -> str:
+    """
+    The group's --api-url, or else the Toggl API's
+    """
+    ctx = click.get_current_context(silent=True)
+    params = ctx.find_root().params if ctx is not None else {}
+    if params.get("api_url") is None:
+        return TOGGL_API_URL
+    return params["api_url"].rstrip("/")
+
+
+def _cache_dir(api_url: str) -> Path:
+    """
+    The cache directory for an API: the default one for the Toggl API's, or
+    else a subdirectory of its own, so that e.g. a fake server's data never
+    mixes with the user's real caches
+    """
+    cache_dir = default_cache_dir()
+    if api_url == TOGGL_API_URL:
+        return cache_dir
+    return cache_dir / "api" / hashlib.sha256(api_url.encode()).hexdigest()[:16]
+
+
+class _Caches(NamedTuple):
+    """
+    Where commands keep local state, as chosen by the group's options
+    """
+
+    store: str
+    cache_dir: Path
+
+
+def _toggl_api() -> TogglAPI:
+    """
+    A TogglAPI for the group's --api-url, making conditional requests for
+    workspaces, clients and projects unless --no-conditional-requests is given
+    """
+    ctx = click.get_current_context(silent=True)
+    params = ctx.find_root().params if ctx is not None else {}
+    kwargs = dict(base_url=_api_url())
+    if params.get("conditional_requests", True):
+        from toggl_tally.http_cache import ValidatorCache
+
+        kwargs["validator_cache"] = ValidatorCache.for_user(_cache_dir(_api_url()))
+    return TogglAPI(**kwargs)
+
+
+def _metadata_cache(
+    api: TogglAPI, caches: _Caches, ttl: float = 24 * 60 * 60
+) -> MetadataCache:
+    if caches.store == "sqlite":
+        from toggl_tally.sqlite_store import SQLiteStore
+
+        return SQLiteStore.for_user(caches.cache_dir).metadata_cache(api, ttl=ttl)
+    return MetadataCache.for_user(api, caches.cache_dir, ttl=ttl)
+
+
+def _time_entries_fetch(
+    api: TogglAPI,
+    caches: _Caches,
+    start_date: datetime,
+    end_date: datetime,
+    max_cache_age: Optional[int],
+) -> "Callable[[], Iterable[dict]]":
+    """
+    Fetch time entries from the API, or from the local cache if a maximum
+    cache age is given
+    """
+    if max_cache_age is None:
+        return partial(
+            api.iter_time_entries_between, start_date=start_date, end_date=end_date
+        )
+    if caches.store == "sqlite":
+        from toggl_tally.sqlite_store import SQLiteStore
+
+        cache = SQLiteStore.for_user(caches.cache_dir)
+    else:
+        cache = TimeEntryCache.for_user(caches.cache_dir)
+    return partial(
+        cache.get_fresh_time_entries_between,
+        api=api,
+        start_date=start_date,
+        end_date=end_date,
+        max_age=max_cache_age,
+    )
+
+
+def _submit_time_entries(
+    executor: ThreadPoolExecutor,
+    api: TogglAPI,
+    caches: _Caches,
+    start_date: datetime,
+    end_date: datetime,
+    max_cache_age: Optional[int],
+) -> "Future[Iterable[dict]]":
+    return executor.submit(
+        _time_entries_fetch(api, caches, start_date, end_date, max_cache_age)
+    )
+
+
+def _submit_time_entry_batch(
+    executor: ThreadPoolExecutor,
+    api: TogglAPI,
+    caches: _Caches,
+    start_date: datetime,
+    end_date: datetime,
+    max_cache_age: Optional[int],
+    timezone: Optional[str],
+) -> "Future[TimeEntryBatch]":
+    """
+    As _submit_time_entries, as a columnar batch. Time entries in the JSON
+    cache are mapped from its binary snapshot while that is fresh, rather
+    than parsed. A JSON cache created here gets its daily rollup in the
+    timezone, as with _submit_rollup.
+    """
+    if max_cache_age is not None and caches.store == "json":
+        from toggl_tally.binary_snapshot import get_fresh_time_entry_batch
+
+        return executor.submit(
+            get_fresh_time_entry_batch,
+            api=api,
+            start_date=start_date,
+            end_date=end_date,
+            max_age=max_cache_age,
+            cache_dir=caches.cache_dir,
+            timezone=timezone,
+        )
+    from toggl_tally.entries import TimeEntryBatch
+
+    fetch = _time_entries_fetch(api, caches, start_date, end_date, max_cache_age)
+    return executor.submit(lambda: TimeEntryBatch.from_dicts(fetch()))
+
+
+def _submit_rollup(
+    executor: ThreadPoolExecutor,
+    api: TogglAPI,
+    caches: _Caches,
+    start_date: datetime,
+    max_cache_age: Optional[int],
+    timezone: Optional[str],
+) -> "Optional[Future[DailyRollup]]":
+    """
+    Read the local cache's daily rollup if a maximum cache age is given and
+    the rollup's days are in the timezone, or else return None
+    """
+    if max_cache_age is None or caches.store == "sqlite":
+        return None
+    cache = TimeEntryCache.for_user(caches.cache_dir, timezone=timezone)
+    if cache.rollup.timezone != timezone:
+        return None
+    return executor.submit(
+        cache.get_fresh_rollup, api=api, start_date=start_date, max_age=max_cache_age
+    )
+
+
+def _submit_store(
+    executor: ThreadPoolExecutor,
+    api: TogglAPI,
+    caches: _Caches,
+    start_date: datetime,
+    max_cache_age: Optional[int],
+) -> "Optional[Future[SQLiteStore]]":
+    """
+    Bring the SQLite store up to date if it is selected and a maximum cache
+    age is given, or else return None
+    """
+    if max_cache_age is None or caches.store != "sqlite":
+        return None
+    from toggl_tally.sqlite_store import SQLiteStore
+
+    return executor.submit(
+        SQLiteStore.for_user(caches.cache_dir).sync_if_stale,
+        api=api,
+        start_date=start_date,
+        max_age=max_cache_age,
+    )
+
+
 @click.group(
     context_settings=CONTEXT_SETTINGS,
     help="A rich CLI to track hours worked against monthly targets with toggl",
@@ -58,16 +276,116 @@ def _comma_separated_arg_split(ctx, param, value):
     type=click.Path(exists=True, path_type=Path),
     help="Path to optional yaml config with CLI option values",
 )
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print a breakdown of where the command's time went",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write timings to a Chrome trace event file (see chrome://tracing)",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help=(
+        "Write API, time entry and cache metrics to a Prometheus textfile, "
+        "e.g. for the node exporter's textfile collector"
+    ),
+)
+@click.option(
+    "--metrics-format",
+    type=click.Choice(["prometheus", "openmetrics"]),
+    default="prometheus",
+    show_default=True,
+    help="Format of the metrics file",
+)
+@click.option(
+    "--store",
+    type=click.Choice(["json", "sqlite"]),
+    default="json",
+    show_default=True,
+    help=(
+        "Local store for cached time entries and metadata; the SQLite store"
+        " sums time entries in SQL, for long histories"
+    ),
+)
+@click.option(
+    "--conditional-requests/--no-conditional-requests",
+    default=True,
+    show_default=True,
+    help=(
+        "Keep workspace, client and project responses with their ETag and"
+        " Last-Modified headers, and download them again only if they changed"
+    ),
+)
+@click.option(
+    "--api-url",
+    help="Base URL of the Toggl v9 API, e.g. of a local 'toggl-tally fake-server'",
+)
 @click.pass_context
-def toggl_tally(ctx: click.Context, config: Optional[Path]):
+def toggl_tally(
+    ctx: click.Context,
+    config: Optional[Path],
+    profile: bool,
+    trace: Optional[Path],
+    metrics_file: Optional[Path],
+    metrics_format: str,
+    store: str,
+    conditional_requests: bool,
+    api_url: Optional[str],
+):
     # rich traceback handling
-    install(max_frames=1)
+    sys.excepthook = _rich_excepthook
+    # commands read the local store they use from here, rather than each
+    # choosing a backend
+    ctx.obj = _Caches(store=store, cache_dir=_cache_dir(_api_url()))
+    if profile or trace is not None:
+        from toggl_tally.tracing import SpanRecorder, add_span_listener
+
+        recorder = SpanRecorder()
+        add_span_listener(recorder)
+        ctx.call_on_close(lambda: _report_profile(recorder, profile, trace))
+    if metrics_file is not None:
+        from toggl_tally.metrics import TogglTallyMetrics
+        from toggl_tally.tracing import add_span_listener
+
+        metrics = TogglTallyMetrics()
+        add_span_listener(metrics)
+        ctx.call_on_close(lambda: _write_metrics(metrics, metrics_file, metrics_format))
     if config is not None:
+        import yaml
+
         with config.open("r") as f:
             config_dict = yaml.safe_load(f)
         ctx.default_map = dict(hours=config_dict)
 
 
+def _write_metrics(metrics: "TogglTallyMetrics", path: Path, metrics_format: str):
+    from toggl_tally.tracing import remove_span_listener
+
+    remove_span_listener(metrics)
+    metrics.finish()
+    metrics.registry.write_textfile(path, openmetrics=metrics_format == "openmetrics")
+
+
+def _report_profile(recorder: "SpanRecorder", profile: bool, trace: Optional[Path]):
+    from rich.console import Console
+
+    from toggl_tally.report import RichReport
+    from toggl_tally.tracing import remove_span_listener
+
+    remove_span_listener(recorder)
+    console = Console(stderr=True)
+    if profile:
+        RichReport(console).profile_table(recorder)
+    if trace is not None:
+        recorder.write_chrome_trace(trace)
+        console.print(f"Wrote trace to {trace}")
+
+
 @toggl_tally.command(
     context_settings=CONTEXT_SETTINGS,
     help="Get remaining daily hours to hit monthly target",
@@ -140,6 +458,28 @@ def toggl_tally(ctx: click.Context, config: Optional[Path]):
     default=False,
     help="Show active filters and public holidays",
 )
+@click.option(
+    "--max-cache-age",
+    type=int,
+    help=(
+        "Read time entries from the local cache (see the sync command),"
+        " syncing first if it is older than this many seconds"
+    ),
+)
+@click.option(
+    "--metadata-ttl",
+    type=int,
+    help=(
+        "Cache workspaces, clients and projects locally, downloading them again"
+        " once the cache is older than this many seconds"
+    ),
+)
+@click.option(
+    "--daemon/--no-daemon",
+    default=True,
+    show_default=True,
+    help="Answer from a running 'toggl-tally serve' daemon, if there is one",
+)
 @click.pass_context
 def hours(
     ctx: click.Context,
@@ -154,53 +494,936 @@ def hours(
     country: str,
     exclude_public_holidays: bool,
     verbose: bool,
+    max_cache_age: Optional[int],
+    metadata_ttl: Optional[int],
+    daemon: bool,
 ):
+    from rich.console import Console
+
     console = Console()
-    api = TogglAPI()
-    tally = TogglTally(
-        invoice_day_of_month=invoice_day,
-        country=country,
-        skip_today=skip_today,
-        timezone=timezone,
-        working_days=working_days,
-        exclude_public_holidays=exclude_public_holidays,
+    caches = ctx.obj
+    filters = dict(workspaces=workspaces, clients=clients, projects=projects)
+    if daemon:
+        with span("hours.query_daemon"):
+            result = _query_daemon(
+                dict(
+                    hours_per_month=hours_per_month,
+                    invoice_day=invoice_day,
+                    country=country,
+                    skip_today=skip_today,
+                    timezone=timezone,
+                    working_days=working_days,
+                    exclude_public_holidays=exclude_public_holidays,
+                    **filters,
+                ),
+                caches=caches,
+                max_cache_age=max_cache_age,
+                metadata_ttl=metadata_ttl,
+            )
+        if result is not None:
+            _report_hours(
+                console,
+                hours_per_month=hours_per_month,
+                seconds_worked=result["seconds_worked"],
+                remaining_working_days=result["remaining_working_days"],
+                next_invoice_date=datetime.fromisoformat(result["next_invoice_date"]),
+                last_billable_date=datetime.fromisoformat(result["last_billable_date"]),
+                remaining_public_holidays=[
+                    (name, date.fromisoformat(holiday_date))
+                    for name, holiday_date in result["remaining_public_holidays"]
+                ],
+                filters=filters,
+                verbose=verbose,
+            )
+            return
+
+    with span("hours.setup"):
+        from toggl_tally.tally import TogglTally
+
+        api = _toggl_api()
+        tally = TogglTally(
+            invoice_day_of_month=invoice_day,
+            country=country,
+            skip_today=skip_today,
+            timezone=timezone,
+            working_days=working_days,
+            exclude_public_holidays=exclude_public_holidays,
+        )
+        snapshot = tally.snapshot()
+    with ThreadPoolExecutor(max_workers=4) as executor, console.status(
+        "[bold dark_cyan]Getting time entries, clients, projects and workspaces"
+    ):
+        store_future = _submit_store(
+            executor,
+            api,
+            caches,
+            start_date=snapshot.first_billable_date,
+            max_cache_age=max_cache_age,
+        )
+        rollup_future = _submit_rollup(
+            executor,
+            api,
+            caches,
+            start_date=snapshot.first_billable_date,
+            max_cache_age=max_cache_age,
+            timezone=timezone,
+        )
+        if store_future is None and rollup_future is None:
+            # the response body is streamed as the time entries are summed
+            time_entries_future = _submit_time_entries(
+                executor,
+                api,
+                caches,
+                start_date=snapshot.first_billable_date,
+                end_date=snapshot.now,
+                max_cache_age=max_cache_age,
+            )
+        if metadata_ttl is None:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                user_projects=executor.submit(api.get_user_projects),
+                user_clients=executor.submit(api.get_user_clients),
+                user_workspaces=executor.submit(api.get_user_workspaces),
+            )
+        else:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                metadata_cache=_metadata_cache(api, caches, ttl=metadata_ttl),
+            )
+        if store_future is not None:
+            with span("hours.wait_for_store"):
+                store = store_future.result()
+            seconds_worked = store.seconds_worked(
+                snapshot.first_billable_date, snapshot.now, filter
+            )
+        elif rollup_future is not None:
+            with span("hours.wait_for_rollup"):
+                rollup = rollup_future.result()
+            with span("hours.sum_rollup"):
+                seconds_worked = rollup.seconds_between(
+                    snapshot.first_billable_date.date(), snapshot.now.date(), filter
+                )
+        else:
+            with span("hours.wait_for_time_entries"):
+                unfiltered_time_entries = time_entries_future.result()
+            with span("hours.filter_and_sum") as filter_span:
+                fetched = DurationAggregator()
+                retained = DurationAggregator()
+                seconds_worked = retained.consume(
+                    filter.iter_time_entries(
+                        fetched.iter_through(unfiltered_time_entries)
+                    )
+                )
+                filter_span.attributes.update(
+                    fetched=fetched.n_entries, retained=retained.n_entries
+                )
+    _report_hours(
+        console,
+        hours_per_month=hours_per_month,
+        seconds_worked=seconds_worked,
+        remaining_working_days=snapshot.remaining_working_days,
+        next_invoice_date=snapshot.next_invoice_date,
+        last_billable_date=snapshot.last_billable_date,
+        remaining_public_holidays=snapshot.remaining_public_holidays,
+        filters=filters,
+        verbose=verbose,
     )
-    with console.status("[bold dark_cyan]Getting clients, projects and workspaces"):
-        filter = TogglFilter(
-            api=api,
-            projects=projects,
-            clients=clients,
-            workspaces=workspaces,
+
+
+def _query_daemon(
+    config: dict,
+    caches: _Caches,
+    max_cache_age: Optional[int],
+    metadata_ttl: Optional[int],
+) -> Optional[dict]:
+    """
+    The hours figures from a running serve daemon, or None if there isn't one
+    or it reads from a different API or store than this command would. Without
+    a cache option the daemon syncs before answering, as the command would
+    otherwise fetch live data
+    """
+    from toggl_tally.daemon import DaemonClient, DaemonUnavailable
+
+    try:
+        return DaemonClient.for_user(caches.cache_dir).hours(
+            config,
+            max_age=0 if max_cache_age is None else max_cache_age,
+            metadata_ttl=0 if metadata_ttl is None else metadata_ttl,
+            api_url=_api_url(),
+            store=caches.store,
         )
-    with console.status("[bold dark_cyan]Getting time entries"):
-        unfiltered_time_entries = api.get_time_entries_between(
-            start_date=tally.first_billable_date,
-            end_date=tally.now,
+    except DaemonUnavailable:
+        return None
+
+
+def _report_hours(
+    console: "Console",
+    hours_per_month: int,
+    seconds_worked: int,
+    remaining_working_days: int,
+    next_invoice_date: datetime,
+    last_billable_date: datetime,
+    remaining_public_holidays: List[Tuple[str, date]],
+    filters: Dict[str, List[str]],
+    verbose: bool,
+):
+    with span("hours.report"):
+        _render_hours_report(
+            console,
+            hours_per_month=hours_per_month,
+            seconds_worked=seconds_worked,
+            remaining_working_days=remaining_working_days,
+            next_invoice_date=next_invoice_date,
+            last_billable_date=last_billable_date,
+            remaining_public_holidays=remaining_public_holidays,
+            filters=filters,
+            verbose=verbose,
         )
-    filtered_time_entries = filter.filter_time_entries(response=unfiltered_time_entries)
-    seconds_worked = sum(entry["duration"] for entry in filtered_time_entries)
+
+
+def _render_hours_report(
+    console: "Console",
+    hours_per_month: int,
+    seconds_worked: int,
+    remaining_working_days: int,
+    next_invoice_date: datetime,
+    last_billable_date: datetime,
+    remaining_public_holidays: List[Tuple[str, date]],
+    filters: Dict[str, List[str]],
+    verbose: bool,
+):
+    from toggl_tally.report import RichReport
+
     target_seconds = hours_per_month * 60 * 60
     seconds_outstanding = max(target_seconds - seconds_worked, 0)
     reporter = RichReport(console)
     reporter.report_remaining_working_days(
-        remaining_working_days=tally.remaining_working_days,
-        next_invoice_date=tally.next_invoice_date,
+        remaining_working_days=remaining_working_days,
+        next_invoice_date=next_invoice_date,
     )
     reporter.report_hours_per_day(
         seconds_outstanding=seconds_outstanding,
-        remaining_working_days=tally.remaining_working_days,
+        remaining_working_days=remaining_working_days,
         hours_per_month=hours_per_month,
-        last_billable_date=tally.last_billable_date,
+        last_billable_date=last_billable_date,
     )
     reporter.report_hours_worked(seconds_worked)
     reporter.month_progress_bar(
         seconds_worked=seconds_worked, target_seconds=target_seconds
     )
     if verbose:
-        reporter.filters_table(
-            workspaces=workspaces,
-            clients=clients,
-            projects=projects,
+        reporter.filters_table(**filters)
+        if remaining_public_holidays:
+            reporter.holidays_table(holidays=remaining_public_holidays)
+
+
+@toggl_tally.command(
+    context_settings=CONTEXT_SETTINGS,
+    help="Split hours worked this invoice period by workspace, client and project",
+)
+@click.option(
+    "--invoice-day",
+    type=int,
+    required=True,
+    help="Invoicing day of month",
+)
+@click.option(
+    "--workspaces",
+    "-w",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated workspace(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--clients",
+    "-c",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated client(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--projects",
+    "-p",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated project(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--timezone",
+    "-tz",
+    help="Timezone for time entries",
+)
+@click.option(
+    "--country",
+    required=True,
+    help="Your country code (used to determine holiday dates)",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    default=False,
+    help="Print results as a JSON document instead of a table",
+)
+@click.option(
+    "--max-cache-age",
+    type=int,
+    help=(
+        "Read time entries from the local cache (see the sync command),"
+        " syncing first if it is older than this many seconds"
+    ),
+)
+@click.option(
+    "--metadata-ttl",
+    type=int,
+    help=(
+        "Cache workspaces, clients and projects locally, downloading them again"
+        " once the cache is older than this many seconds"
+    ),
+)
+@click.pass_context
+def breakdown(
+    ctx: click.Context,
+    invoice_day: int,
+    workspaces: List[str],
+    clients: List[str],
+    projects: List[str],
+    timezone: Optional[str],
+    country: str,
+    as_json: bool,
+    max_cache_age: Optional[int],
+    metadata_ttl: Optional[int],
+):
+    from rich.console import Console
+
+    from toggl_tally import breakdown as breakdowns
+    from toggl_tally.report import RichReport
+    from toggl_tally.tally import TogglTally
+
+    console = Console(stderr=as_json)
+    api = _toggl_api()
+    caches = ctx.obj
+    snapshot = TogglTally(
+        invoice_day_of_month=invoice_day, country=country, timezone=timezone
+    ).snapshot()
+    with ThreadPoolExecutor(max_workers=4) as executor, console.status(
+        "[bold dark_cyan]Getting time entries, clients, projects and workspaces"
+    ):
+        store_future = _submit_store(
+            executor,
+            api,
+            caches,
+            start_date=snapshot.first_billable_date,
+            max_cache_age=max_cache_age,
+        )
+        rollup_future = _submit_rollup(
+            executor,
+            api,
+            caches,
+            start_date=snapshot.first_billable_date,
+            max_cache_age=max_cache_age,
+            timezone=timezone,
         )
-        if tally.remaining_public_holidays:
-            reporter.holidays_table(holidays=tally.remaining_public_holidays)
+        if store_future is None and rollup_future is None:
+            time_entries_future = _submit_time_entries(
+                executor,
+                api,
+                caches,
+                start_date=snapshot.first_billable_date,
+                end_date=snapshot.now,
+                max_cache_age=max_cache_age,
+            )
+        if metadata_ttl is None:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                user_projects=executor.submit(api.get_user_projects),
+                user_clients=executor.submit(api.get_user_clients),
+                user_workspaces=executor.submit(api.get_user_workspaces),
+            )
+        else:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                metadata_cache=_metadata_cache(api, caches, ttl=metadata_ttl),
+            )
+        if store_future is not None:
+            totals = store_future.result().totals_by_project(
+                snapshot.first_billable_date,
+                snapshot.now,
+                filter if workspaces or clients or projects else None,
+            )
+        elif rollup_future is not None:
+            totals = rollup_future.result().totals_between(
+                snapshot.first_billable_date.date(), snapshot.now.date()
+            )
+        else:
+            totals = breakdowns.totals_by_project(time_entries_future.result())
+    # without filters, break down every time entry
+    if workspaces or clients or projects:
+        totals = breakdowns.filter_totals(totals, filter)
+    result = breakdowns.breakdown(totals, filter.index)
+    if as_json:
+        click.echo(
+            json.dumps(
+                dict(
+                    first_billable_date=snapshot.first_billable_date.isoformat(),
+                    **result,
+                ),
+                indent=2,
+            )
+        )
+    else:
+        RichReport(console).breakdown_table(result)
+
+
+@toggl_tally.command(
+    context_settings=CONTEXT_SETTINGS,
+    help="Get hours worked against the monthly target over past invoice periods",
+)
+@click.option(
+    "--hours-per-month",
+    type=int,
+    required=True,
+    help="Target working hours per month",
+)
+@click.option(
+    "--invoice-day",
+    type=int,
+    required=True,
+    help="Invoicing day of month",
+)
+@click.option(
+    "--periods",
+    "-n",
+    type=click.IntRange(min=1),
+    default=6,
+    show_default=True,
+    help="Number of invoice periods, including the current one",
+)
+@click.option(
+    "--workspaces",
+    "-w",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated workspace(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--clients",
+    "-c",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated client(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--projects",
+    "-p",
+    callback=_comma_separated_arg_split,
+    help="Comma-separated project(s) to filter time entries by (e.g. 'foo, bar')",
+)
+@click.option(
+    "--timezone",
+    "-tz",
+    help="Timezone for time entries",
+)
+@click.option(
+    "--country",
+    required=True,
+    help="Your country code (used to determine holiday dates)",
+)
+@click.option(
+    "--exclude-public-holidays",
+    is_flag=True,
+    show_default=True,
+    default=True,
+    help="Whether to assume public holidays are not working days",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    default=False,
+    help="Print results as a JSON document instead of a table",
+)
+@click.option(
+    "--max-cache-age",
+    type=int,
+    help=(
+        "Read time entries from the local cache (see the sync command),"
+        " syncing first if it is older than this many seconds"
+    ),
+)
+@click.option(
+    "--metadata-ttl",
+    type=int,
+    help=(
+        "Cache workspaces, clients and projects locally, downloading them again"
+        " once the cache is older than this many seconds"
+    ),
+)
+@click.pass_context
+def history(
+    ctx: click.Context,
+    hours_per_month: int,
+    invoice_day: int,
+    periods: int,
+    workspaces: List[str],
+    clients: List[str],
+    projects: List[str],
+    timezone: Optional[str],
+    country: str,
+    exclude_public_holidays: bool,
+    as_json: bool,
+    max_cache_age: Optional[int],
+    metadata_ttl: Optional[int],
+):
+    from rich.console import Console
+
+    from toggl_tally.history import invoice_periods, period_history
+    from toggl_tally.report import RichReport
+    from toggl_tally.tally import TogglTally
+
+    console = Console(stderr=as_json)
+    api = _toggl_api()
+    caches = ctx.obj
+    tally = TogglTally(
+        invoice_day_of_month=invoice_day,
+        country=country,
+        timezone=timezone,
+        exclude_public_holidays=exclude_public_holidays,
+    )
+    snapshots = invoice_periods(tally.snapshot(), periods)
+    with ThreadPoolExecutor(max_workers=4) as executor, console.status(
+        "[bold dark_cyan]Getting time entries, clients, projects and workspaces"
+    ):
+        # one fetch covering every period, in parallel windows if it is long
+        batch_future = _submit_time_entry_batch(
+            executor,
+            api,
+            caches,
+            start_date=snapshots[0].first_billable_date,
+            end_date=snapshots[-1].now,
+            max_cache_age=max_cache_age,
+            timezone=timezone,
+        )
+        if metadata_ttl is None:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                user_projects=executor.submit(api.get_user_projects),
+                user_clients=executor.submit(api.get_user_clients),
+                user_workspaces=executor.submit(api.get_user_workspaces),
+            )
+        else:
+            filter = TogglFilter(
+                api=api,
+                projects=projects,
+                clients=clients,
+                workspaces=workspaces,
+                metadata_cache=_metadata_cache(api, caches, ttl=metadata_ttl),
+            )
+        batch = filter.filter_batch(batch_future.result())
+    results = period_history(snapshots, batch, hours_per_month=hours_per_month)
+    if as_json:
+        click.echo(json.dumps({"periods": results}, indent=2))
+    else:
+        RichReport(console).history_table(results)
+
+
+@toggl_tally.command(
+    context_settings=CONTEXT_SETTINGS,
+    help="Get hours for each config in a yaml batch file, from one shared fetch",
+)
+@click.argument("batch_file", type=click.Path(exists=True, path_type=Path))
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    default=False,
+    help="Print results as a JSON document instead of a table",
+)
+@click.option(
+    "--processes",
+    type=int,
+    help="Evaluate configs in this many worker processes",
+)
+@click.option(
+    "--max-cache-age",
+    type=int,
+    help=(
+        "Read time entries from the local cache (see the sync command),"
+        " syncing first if it is older than this many seconds"
+    ),
+)
+@click.option(
+    "--metadata-ttl",
+    type=int,
+    help=(
+        "Cache workspaces, clients and projects locally, downloading them again"
+        " once the cache is older than this many seconds"
+    ),
+)
+@click.pass_context
+def batch(
+    ctx: click.Context,
+    batch_file: Path,
+    as_json: bool,
+    processes: Optional[int],
+    max_cache_age: Optional[int],
+    metadata_ttl: Optional[int],
+):
+    import yaml
+    from rich.console import Console
+
+    from toggl_tally.batch import (
+        SharedData,
+        evaluate_configs,
+        get_batch_index,
+        load_batch_configs,
+    )
+    from toggl_tally.report import RichReport
+
+    with batch_file.open("r") as f:
+        configs = load_batch_configs(yaml.safe_load(f))
+    console = Console(stderr=as_json)
+    api = _toggl_api()
+    caches = ctx.obj
+    snapshots = [config.make_tally().snapshot() for config in configs]
+    with ThreadPoolExecutor(max_workers=4) as executor, console.status(
+        "[bold dark_cyan]Getting time entries, clients, projects and workspaces"
+    ):
+        # one fetch covering every config's billable period, in parallel
+        # windows if it is long
+        time_entries_future = _submit_time_entry_batch(
+            executor,
+            api,
+            caches,
+            start_date=min(snapshot.first_billable_date for snapshot in snapshots),
+            end_date=max(snapshot.now for snapshot in snapshots),
+            max_cache_age=max_cache_age,
+            # the rollup can only be in one timezone
+            timezone=(
+                configs[0].timezone
+                if len({config.timezone for config in configs}) == 1
+                else None
+            ),
+        )
+        if metadata_ttl is None:
+            user_projects = executor.submit(api.get_user_projects)
+            user_clients = executor.submit(api.get_user_clients)
+            user_workspaces = executor.submit(api.get_user_workspaces)
+            index = None
+        else:
+            index = get_batch_index(
+                configs, _metadata_cache(api, caches, ttl=metadata_ttl)
+            )
+        time_entries = time_entries_future.result()
+        shared = SharedData(
+            time_entries=time_entries,
+            user_projects=index.user_projects if index else user_projects.result(),
+            user_clients=index.user_clients if index else user_clients.result(),
+            user_workspaces=(
+                index.user_workspaces if index else user_workspaces.result()
+            ),
+        )
+    results = evaluate_configs(
+        configs,
+        nows=[snapshot.now for snapshot in snapshots],
+        shared=shared,
+        processes=processes,
+    )
+    if as_json:
+        click.echo(json.dumps(dict(configs=results), indent=2))
+    else:
+        RichReport(console).batch_table(results)
+
+
+@toggl_tally.command(
+    context_settings=CONTEXT_SETTINGS,
+    help="Serve hours queries from warm caches over a Unix socket",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(path_type=Path),
+    help="Path of the Unix socket (default: in the cache directory)",
+)
+@click.option(
+    "--refresh-interval",
+    type=float,
+    default=5 * 60,
+    show_default=True,
+    help="Seconds between background syncs of time entries",
+)
+@click.option(
+    "--days",
+    type=int,
+    default=62,
+    show_default=True,
+    help="Days of time entry history to keep warm",
+)
+@click.option(
+    "--metadata-ttl",
+    type=int,
+    default=60 * 60,
+    show_default=True,
+    help="Seconds before workspaces, clients and projects are downloaded again",
+)
+@click.option(
+    "--timezone",
+    "-tz",
+    help="Timezone of the days in the cache's daily rollup, when it is created",
+)
+@click.pass_context
+def serve(
+    ctx: click.Context,
+    socket_path: Optional[Path],
+    refresh_interval: float,
+    days: int,
+    metadata_ttl: int,
+    timezone: Optional[str],
+):
+    from toggl_tally.daemon import TallyDaemon
+
+    tally_daemon = TallyDaemon.for_user(
+        _toggl_api(),
+        store=ctx.obj.store,
+        cache_dir=ctx.obj.cache_dir,
+        timezone=timezone,
+        socket_path=socket_path,
+        metadata_ttl=metadata_ttl,
+        days=days,
+        refresh_interval=refresh_interval,
+    )
+    click.echo(f"Serving hours queries on {tally_daemon.socket_path}")
+    try:
+        tally_daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+@toggl_tally.command(
+    context_settings=CONTEXT_SETTINGS,
+    help="Sync time entries to the local cache used by 'hours --max-cache-age'",
+)
+@click.option(
+    "--days",
+    type=int,
+    default=62,
+    show_default=True,
+    help="Days of history to download when the cache is empty or rebuilt",
+)
+@click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Rebuild the cache instead of fetching changes since the last sync",
+)
+@click.option(
+    "--refresh-metadata",
+    is_flag=True,
+    default=False,
+    help="Also download workspaces, clients and projects again",
+)
+@click.option(
+    "--timezone",
+    "-tz",
+    help="Timezone of the days in the cache's daily rollup, when it is created",
+)
+@click.option(
+    "--compact-before",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help=(
+        "Drop cached time entries before this date (e.g. of invoice periods"
+        " already billed), keeping only their daily totals"
+    ),
+)
+@click.pass_context
+def sync(
+    ctx: click.Context,
+    days: int,
+    full: bool,
+    refresh_metadata: bool,
+    timezone: Optional[str],
+    compact_before: Optional[datetime],
+):
+    from rich.console import Console
+
+    from toggl_tally.binary_snapshot import write_cache_snapshot
+
+    console = Console()
+    api = _toggl_api()
+    caches = ctx.obj
+    start_date = get_current_datetime() - timedelta(days=days)
+    if caches.store == "sqlite":
+        if compact_before is not None:
+            raise click.UsageError(
+                "--compact-before applies to the JSON cache; the SQLite store"
+                " keeps every time entry"
+            )
+        _sync_store(console, api, caches.cache_dir, start_date, full, refresh_metadata)
+        return
+    cache = TimeEntryCache.for_user(caches.cache_dir, timezone=timezone)
+    if cache.rollup.compacted_until is not None:
+        # compacted days are kept as daily totals only
+        start_date = max(
+            start_date, cache.rollup.day_start(cache.rollup.compacted_until)
+        )
+    if cache.covers(start_date):
+        # never shrink the history an earlier sync downloaded
+        start_date = cache.covered_from
+    with console.status("[bold dark_cyan]Syncing time entries"):
+        n_received = cache.sync(api, start_date=start_date, full=full)
+        if compact_before is not None:
+            n_compacted = cache.compact(compact_before.date())
+            console.print(
+                f"Compacted [bold blue]{n_compacted}[/bold blue] time entries"
+                f" before {cache.rollup.compacted_until} into daily totals."
+            )
+        cache.save()
+        write_cache_snapshot(cache)
+        if refresh_metadata:
+            MetadataCache.for_user(api, caches.cache_dir).refresh()
+    console.print(
+        f"Received [bold blue]{n_received}[/bold blue] changed time entries;"
+        f" [bold blue]{len(cache.entries)}[/bold blue] time entries cached."
+    )
+
+
+def _sync_store(
+    console: "Console",
+    api: TogglAPI,
+    cache_dir: Path,
+    start_date: datetime,
+    full: bool,
+    refresh_metadata: bool,
+):
+    from toggl_tally.sqlite_store import SQLiteStore
+
+    store = SQLiteStore.for_user(cache_dir)
+    if store.covers(start_date):
+        # never shrink the history an earlier sync downloaded
+        start_date = store.covered_from
+    with console.status("[bold dark_cyan]Syncing time entries"):
+        n_received = store.sync(api, start_date=start_date, full=full)
+        if refresh_metadata:
+            store.metadata_cache(api).refresh()
+    console.print(
+        f"Received [bold blue]{n_received}[/bold blue] changed time entries;"
+        f" [bold blue]{len(store)}[/bold blue] time entries stored."
+    )
+
+
+def _parse_faults(ctx, param, values: Tuple[str, ...]) -> Dict[int, float]:
+    """
+    >>> _parse_faults(None, None, ("429=0.1", "503=0.05"))
+    {429: 0.1, 503: 0.05}
+    """
+    faults = {}
+    for value in values:
+        status, _, rate = value.partition("=")
+        try:
+            faults[int(status)] = float(rate)
+        except ValueError:
+            raise click.BadParameter(f"Expected STATUS=RATE but got {value}")
+    return faults
+
+
+@toggl_tally.command(
+    "fake-server",
+    context_settings=CONTEXT_SETTINGS,
+    help=(
+        "Serve a generated dataset from a local stand-in for the Toggl API, "
+        "for testing and benchmarking without a network"
+    ),
+)
+@click.option("--port", type=int, default=8080, show_default=True)
+@click.option(
+    "--time-entries", "n_time_entries", type=int, default=10000, show_default=True
+)
+@click.option("--projects", "n_projects", type=int, default=20, show_default=True)
+@click.option("--clients", "n_clients", type=int, default=5, show_default=True)
+@click.option("--workspaces", "n_workspaces", type=int, default=1, show_default=True)
+@click.option(
+    "--days",
+    type=int,
+    default=365,
+    show_default=True,
+    help="Spread the time entries over this many days up to now",
+)
+@click.option(
+    "--latency",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Delay each response by this many seconds",
+)
+@click.option(
+    "--jitter",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Delay each response by up to this many more seconds, at random",
+)
+@click.option(
+    "--fault",
+    "faults",
+    multiple=True,
+    callback=_parse_faults,
+    help="Fail a fraction of requests with a status, e.g. '429=0.1' (repeatable)",
+)
+@click.option(
+    "--retry-after",
+    type=float,
+    help="Retry-After seconds to send with 429 responses",
+)
+@click.option("--gzip/--no-gzip", default=True, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+def fake_server(
+    port: int,
+    n_time_entries: int,
+    n_projects: int,
+    n_clients: int,
+    n_workspaces: int,
+    days: int,
+    latency: float,
+    jitter: float,
+    faults: Dict[int, float],
+    retry_after: Optional[float],
+    gzip: bool,
+    seed: int,
+):
+    from toggl_tally.fake_toggl import FakeTogglServer, generate_dataset
+
+    server = FakeTogglServer(
+        generate_dataset(
+            n_time_entries=n_time_entries,
+            n_workspaces=n_workspaces,
+            n_clients=n_clients,
+            n_projects=n_projects,
+            days=days,
+            seed=seed,
+        ),
+        latency=latency,
+        jitter=jitter,
+        faults=faults,
+        retry_after=retry_after,
+        gzip=gzip,
+        port=port,
+        seed=seed,
+    )
+    click.echo(f"Serving {n_time_entries} time entries on {server.base_url}")
+    click.echo(
+        f"e.g. TOGGL_API_TOKEN=any toggl-tally --api-url {server.base_url} hours"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
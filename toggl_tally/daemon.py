@@ -0,0 +1,365 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Tuple, Union
+
+from toggl_tally.api import TogglAPI, get_api_token
+from toggl_tally.batch import HoursConfig, compute_hours
+from toggl_tally.cache import TimeEntryCache, default_cache_dir, user_cache_key
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.filter import TogglFilter
+from toggl_tally.metadata import MetadataCache, TogglMetadataIndex
+from toggl_tally.time_utils import get_current_datetime
+
+if TYPE_CHECKING:
+    from toggl_tally.sqlite_store import SQLiteStore
+    from toggl_tally.tally import TogglTally
+
+logger = logging.getLogger(__name__)
+
+
+def default_socket_path(
+    cache_dir: Union[Path, None] = None, api_token: Union[str, None] = None
+) -> Path:
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    return cache_dir / f"serve_{user_cache_key(api_token)}.sock"
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+class TallyDaemon(object):
+    """
+    Answers hours queries from warm state: a TogglAPI session, the user's
+    metadata, recent time entries and the holiday calendars of every tally
+    queried so far. Time entries and metadata are refreshed in a background
+    thread, so queries never wait on the network unless they reach back
+    further than the time entries held.
+
+    Requests and responses are newline-delimited JSON over a Unix socket,
+    e.g. ``{"command": "hours", "config": {...}}`` where the config has the
+    keys of a config.yml. An hours request may also give the ``max_age`` of
+    time entries and the ``metadata_ttl`` it accepts, which are refreshed
+    first if they are older, and the ``api_url`` and ``store`` its answer
+    should come from; a daemon reading from elsewhere answers with
+    ``{"unavailable": ...}`` rather than a result.
+    """
+
+    # seconds before a filter name that isn't found triggers a metadata refresh
+    min_metadata_age = 60
+
+    def __init__(
+        self,
+        api: TogglAPI,
+        socket_path: Path,
+        time_entry_cache: Union[TimeEntryCache, "SQLiteStore"],
+        metadata_cache: MetadataCache,
+        days: int = 62,
+        refresh_interval: float = 5 * 60,
+        store: str = "json",
+    ):
+        self.api = api
+        self.socket_path = socket_path
+        self.time_entry_cache = time_entry_cache
+        self.metadata_cache = metadata_cache
+        self.days = days
+        self.refresh_interval = refresh_interval
+        self.store = store
+        self.time_entries = TimeEntryBatch()
+        self.index: Union[TogglMetadataIndex, None] = None
+        self._tallies: Dict[tuple, "TogglTally"] = {}
+        self._filters: Dict[Tuple[tuple, tuple, tuple], TogglFilter] = {}
+        # held while answering queries, since holiday calendars and filters
+        # fill in lazily, and while swapping in refreshed state
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server: Union[socketserver.BaseServer, None] = None
+
+    @classmethod
+    def for_user(
+        cls,
+        api: TogglAPI,
+        socket_path: Union[Path, None] = None,
+        cache_dir: Union[Path, None] = None,
+        metadata_ttl: float = 60 * 60,
+        store: str = "json",
+        timezone: Union[str, None] = None,
+        **kwargs,
+    ) -> "TallyDaemon":
+        """
+        A daemon for the user's caches in the JSON or SQLite ``store``. A JSON
+        cache created by the daemon gets its daily rollup in ``timezone``.
+        """
+        if store == "sqlite":
+            from toggl_tally.sqlite_store import SQLiteStore
+
+            time_entry_cache = SQLiteStore.for_user(cache_dir)
+            metadata_cache = time_entry_cache.metadata_cache(api, ttl=metadata_ttl)
+        else:
+            time_entry_cache = TimeEntryCache.for_user(cache_dir, timezone=timezone)
+            metadata_cache = MetadataCache.for_user(api, cache_dir, ttl=metadata_ttl)
+        return cls(
+            api,
+            socket_path=socket_path or default_socket_path(cache_dir),
+            time_entry_cache=time_entry_cache,
+            metadata_cache=metadata_cache,
+            store=store,
+            **kwargs,
+        )
+
+    def refresh(
+        self,
+        start_date: Union[datetime, None] = None,
+        refresh_metadata: bool = False,
+    ):
+        """
+        Sync time entries from ``start_date`` (by default ``days`` ago, or
+        from as far back as the time entries already reach) and refresh the
+        metadata if it has expired
+        """
+        if start_date is None:
+            start_date = get_current_datetime() - timedelta(days=self.days)
+        with self._refresh_lock:
+            if self.time_entry_cache.covers(start_date):
+                start_date = self.time_entry_cache.covered_from
+            self.time_entry_cache.sync(self.api, start_date=start_date)
+            time_entries = self._load_time_entries()
+            if refresh_metadata:
+                index = self.metadata_cache.refresh()
+            else:
+                index = self.metadata_cache.get_index()
+            # queries carry on with the previous state until now
+            with self._lock:
+                self.time_entries = time_entries
+                self._set_index(index)
+
+    def _load_time_entries(self) -> TimeEntryBatch:
+        if isinstance(self.time_entry_cache, TimeEntryCache):
+            self.time_entry_cache.save()
+            return TimeEntryBatch.from_dicts(self.time_entry_cache.entries.values())
+        # the SQLite store is written as it syncs
+        return TimeEntryBatch.from_dicts(self.time_entry_cache.iter_time_entries())
+
+    def hours(
+        self,
+        config: dict,
+        max_age: Union[float, None] = None,
+        metadata_ttl: Union[float, None] = None,
+    ) -> dict:
+        hours_config = HoursConfig.from_dict("hours", config)
+        with self._lock:
+            snapshot = self._get_tally(hours_config).snapshot()
+        if not self.time_entry_cache.covers(snapshot.first_billable_date) or (
+            max_age is not None and not self.time_entry_cache.is_fresh(max_age)
+        ):
+            self.refresh(start_date=snapshot.first_billable_date)
+        with self._lock:
+            if (
+                metadata_ttl is not None
+                and time.time() - self.metadata_cache.fetched_at > metadata_ttl
+            ):
+                self._set_index(self.metadata_cache.refresh())
+            return compute_hours(
+                hours_config,
+                snapshot=snapshot,
+                toggl_filter=self._get_filter(hours_config),
+                time_entries=self.time_entries,
+            )
+
+    def handle(self, request: dict) -> dict:
+        command = request.get("command")
+        try:
+            if command == "ping":
+                return dict(result="pong")
+            if command == "hours":
+                unavailable = self._unavailable_reason(request)
+                if unavailable is not None:
+                    return dict(unavailable=unavailable)
+                return dict(
+                    result=self.hours(
+                        request["config"],
+                        max_age=request.get("max_age"),
+                        metadata_ttl=request.get("metadata_ttl"),
+                    )
+                )
+            if command == "refresh":
+                self.refresh(refresh_metadata=True)
+                return dict(result=len(self.time_entries))
+            return dict(error=f"Unknown command {command}")
+        except (KeyError, TypeError, ValueError) as error:
+            return dict(error=str(error))
+
+    def _unavailable_reason(self, request: dict) -> Union[str, None]:
+        """
+        Why the daemon can't answer the request as it asks, if it can't
+        """
+        api_url = request.get("api_url")
+        if api_url is not None and api_url != self.api.base_url:
+            return f"Daemon reads from {self.api.base_url}, not {api_url}"
+        store = request.get("store")
+        if store is not None and store != self.store:
+            return f"Daemon reads from the {self.store} store, not {store}"
+        return None
+
+    def serve_forever(self):
+        """
+        Refresh, then serve queries until ``shutdown`` is called
+        """
+        self.refresh()
+        _remove_stale_socket(self.socket_path)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # a client may send any number of requests on one connection
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle(json.loads(line))
+                    except json.JSONDecodeError as error:
+                        response = dict(error=f"Invalid request: {error}")
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+
+        # bind with an owner-only umask, so that the socket never exists with
+        # permissions that let other users connect to it
+        umask = os.umask(0o077)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(
+                str(self.socket_path), Handler
+            )
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        refresher = threading.Thread(target=self._refresh_periodically, daemon=True)
+        refresher.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+            self.socket_path.unlink()
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _refresh_periodically(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                # keep serving what we have until the next refresh succeeds
+                logger.exception("Background refresh failed")
+
+    def _get_tally(self, config: HoursConfig) -> "TogglTally":
+        key = (
+            config.invoice_day,
+            config.country,
+            config.skip_today,
+            config.timezone,
+            tuple(config.working_days),
+            config.exclude_public_holidays,
+        )
+        if key not in self._tallies:
+            self._tallies[key] = config.make_tally()
+        return self._tallies[key]
+
+    def _get_filter(self, config: HoursConfig) -> TogglFilter:
+        key = (tuple(config.projects), tuple(config.clients), tuple(config.workspaces))
+        if key not in self._filters:
+            try:
+                self._filters[key] = self._make_filter(config)
+            except ValueError:
+                if time.time() - self.metadata_cache.fetched_at < self.min_metadata_age:
+                    raise
+                # the name may belong to an entity created since the last refresh
+                self._set_index(self.metadata_cache.refresh())
+                self._filters[key] = self._make_filter(config)
+        return self._filters[key]
+
+    def _make_filter(self, config: HoursConfig) -> TogglFilter:
+        return TogglFilter(
+            api=self.api,
+            projects=config.projects,
+            clients=config.clients,
+            workspaces=config.workspaces,
+            user_projects=self.index.user_projects,
+            user_clients=self.index.user_clients,
+            user_workspaces=self.index.user_workspaces,
+        )
+
+    def _set_index(self, index: TogglMetadataIndex):
+        if index is not self.index:
+            self.index = index
+            self._filters.clear()
+
+
+class DaemonClient(object):
+    """
+    Thin client for a running TallyDaemon. Raises DaemonUnavailable if no
+    daemon is listening.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    @classmethod
+    def for_user(cls, cache_dir: Union[Path, None] = None, **kwargs) -> "DaemonClient":
+        try:
+            api_token = get_api_token()
+        except KeyError:
+            raise DaemonUnavailable("TOGGL_API_TOKEN is not set")
+        return cls(default_socket_path(cache_dir, api_token), **kwargs)
+
+    def request(self, request: dict) -> dict:
+        if not self.socket_path.exists():
+            raise DaemonUnavailable(f"No daemon socket at {self.socket_path}")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(str(self.socket_path))
+                sock.sendall(json.dumps(request).encode() + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+        except OSError as error:
+            # including a daemon that stopped answering within the timeout
+            raise DaemonUnavailable(str(error))
+        if not line:
+            raise DaemonUnavailable("Daemon closed the connection")
+        response = json.loads(line)
+        if "unavailable" in response:
+            raise DaemonUnavailable(response["unavailable"])
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    def hours(self, config: dict, **options) -> dict:
+        """
+        Options are the optional keys of an hours request (see TallyDaemon)
+        """
+        return self.request(dict(command="hours", config=config, **options))
+
+    def ping(self) -> bool:
+        try:
+            return self.request(dict(command="ping")) == "pong"
+        except DaemonUnavailable:
+            return False
+
+
+def _remove_stale_socket(socket_path: Path):
+    if DaemonClient(socket_path).ping():
+        raise RuntimeError(f"A daemon is already listening on {socket_path}")
+    if socket_path.exists():
+        socket_path.unlink()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
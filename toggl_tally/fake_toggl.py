@@ -0,0 +1,281 @@
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from toggl_tally.time_utils import parse_timestamp
+
+API_PREFIX = "/api/v9"
+
+
+def generate_dataset(
+    n_time_entries: int = 1000,
+    n_workspaces: int = 1,
+    n_clients: int = 5,
+    n_projects: int = 20,
+    days: int = 365,
+    end_date: Union[datetime, None] = None,
+    running: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Workspaces, clients, projects and time entries shaped like the Toggl v9
+    API's, with the time entries spread over the ``days`` before
+    ``end_date`` (by default now), in order of start. The last time entry
+    is still running if ``running`` is set.
+
+    >>> dataset = generate_dataset(n_time_entries=10, n_clients=2, n_projects=3)
+    >>> [len(dataset[name]) for name in ["workspaces", "clients", "projects"]]
+    [1, 2, 3]
+    >>> [time_entry["duration"] >= 0 for time_entry in dataset["time_entries"]][-2:]
+    [True, False]
+    """
+    rng = random.Random(seed)
+    if end_date is None:
+        end_date = datetime.now(timezone.utc).replace(microsecond=0)
+    workspaces = [
+        {"id": 1000 + index, "name": f"Workspace {index}"}
+        for index in range(n_workspaces)
+    ]
+    clients = [
+        {
+            "id": 2000 + index,
+            "name": f"Client {index}",
+            "wid": workspaces[index % n_workspaces]["id"],
+        }
+        for index in range(n_clients)
+    ]
+    projects = []
+    for index in range(n_projects):
+        workspace_id = workspaces[index % n_workspaces]["id"]
+        workspace_clients = [
+            client["id"] for client in clients if client["wid"] == workspace_id
+        ]
+        projects.append(
+            {
+                "id": 3000 + index,
+                "name": f"Project {index}",
+                "workspace_id": workspace_id,
+                "client_id": rng.choice(workspace_clients + [None]),
+            }
+        )
+    start_date = end_date - timedelta(days=days)
+    step = (end_date - start_date) / max(n_time_entries, 1)
+    time_entries = []
+    for index in range(n_time_entries):
+        project = rng.choice(projects) if projects and rng.random() > 0.1 else None
+        start = start_date + step * index
+        # no longer than the gap to the next time entry
+        max_duration = max(1, min(4 * 60 * 60, int(step.total_seconds())))
+        duration = rng.randint(min(5 * 60, max_duration), max_duration)
+        time_entries.append(
+            {
+                "id": 4000000 + index,
+                "workspace_id": (
+                    project["workspace_id"]
+                    if project is not None
+                    else rng.choice(workspaces)["id"]
+                ),
+                "project_id": project["id"] if project is not None else None,
+                "description": f"Time entry {index}",
+                "start": start.isoformat(),
+                "stop": (start + timedelta(seconds=duration)).isoformat(),
+                "duration": duration,
+                "at": (start + timedelta(seconds=duration)).isoformat(),
+            }
+        )
+    if running and time_entries:
+        # running time entries have minus their start timestamp as duration
+        time_entries[-1].update(
+            stop=None,
+            duration=-int(parse_timestamp(time_entries[-1]["start"]).timestamp()),
+        )
+    return dict(
+        workspaces=workspaces,
+        clients=clients,
+        projects=projects,
+        time_entries=time_entries,
+    )
+
+
+class FakeTogglServer(object):
+    """
+    A local HTTP server answering the Toggl v9 endpoints toggl-tally uses
+    from a dataset (see generate_dataset), for testing and benchmarking
+    TogglAPI and the CLI without a network.
+
+    Every response is delayed by ``latency`` seconds plus up to ``jitter``
+    seconds. ``faults`` maps status codes (e.g. 429 or 503) to the fraction
+    of requests to fail with them; 429 responses carry ``retry_after`` as a
+    Retry-After header if it is given. Bodies are gzipped for clients that
+    accept it if ``gzip`` is set, and responses carry an ETag, answering a
+    matching If-None-Match with 304 Not Modified. Any API token is accepted.
+
+    The number of responses per (endpoint, status) is kept in ``responses``.
+    """
+
+    def __init__(
+        self,
+        dataset: Union[dict, None] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        faults: Union[Dict[int, float], None] = None,
+        retry_after: Union[float, None] = None,
+        gzip: bool = True,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Union[int, None] = None,
+    ):
+        self.dataset = dataset if dataset is not None else generate_dataset()
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = faults or {}
+        self.retry_after = retry_after
+        self.gzip = gzip
+        self.responses: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._time_entries = sorted(
+            self.dataset["time_entries"],
+            key=lambda time_entry: parse_timestamp(time_entry["start"]),
+        )
+        self._starts = [
+            parse_timestamp(time_entry["start"]) for time_entry in self._time_entries
+        ]
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Union[threading.Thread, None] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> "FakeTogglServer":
+        """
+        Serve from a background thread
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeTogglServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def respond(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, object]:
+        """
+        Status and JSON document for a request, before faults
+        """
+        endpoint = path[len(API_PREFIX) :] if path.startswith(API_PREFIX) else path
+        if endpoint == "/me/workspaces":
+            return 200, self.dataset["workspaces"]
+        if endpoint == "/me/clients":
+            return 200, self.dataset["clients"]
+        if endpoint == "/me/projects":
+            return 200, self.dataset["projects"]
+        if endpoint == "/me/time_entries":
+            try:
+                return 200, self._query_time_entries(query)
+            except (KeyError, ValueError) as error:
+                return 400, f"Invalid time entry query: {error}"
+        return 404, "Not found"
+
+    def _query_time_entries(self, query: Dict[str, List[str]]) -> List[dict]:
+        if "since" in query:
+            since = int(query["since"][0])
+            return [
+                time_entry
+                for time_entry in self._time_entries
+                if parse_timestamp(time_entry["at"]).timestamp() >= since
+            ]
+        if "before" in query:
+            before = parse_timestamp(query["before"][0])
+            return self._time_entries[: bisect_left(self._starts, before)]
+        # both ends of the range are inclusive, like the Toggl API
+        start_date = parse_timestamp(query["start_date"][0])
+        end_date = parse_timestamp(query["end_date"][0])
+        return self._time_entries[
+            bisect_left(self._starts, start_date) : bisect_right(self._starts, end_date)
+        ]
+
+    def _fault(self) -> Union[int, None]:
+        with self._lock:
+            draw = self._rng.random()
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        time.sleep(delay)
+        for status, rate in self.faults.items():
+            if draw < rate:
+                return status
+            draw -= rate
+        return None
+
+    def _count(self, path: str, status: int):
+        with self._lock:
+            self.responses[path[len(API_PREFIX) :], status] += 1
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep connections alive, as the Toggl API does
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                headers = {"Content-Type": "application/json"}
+                status = fake._fault()
+                if status is not None:
+                    document = f"Injected {status} fault"
+                    if status == 429 and fake.retry_after is not None:
+                        headers["Retry-After"] = str(fake.retry_after)
+                elif not self.headers.get("Authorization", "").startswith("Basic "):
+                    status, document = 403, "Missing API token"
+                else:
+                    status, document = fake.respond(url.path, parse_qs(url.query))
+                body = json.dumps(document).encode()
+                if status == 200:
+                    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                    headers["ETag"] = etag
+                    if self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                if (
+                    fake.gzip
+                    and body
+                    and "gzip" in self.headers.get("Accept-Encoding", "")
+                ):
+                    body = gzip.compress(body, compresslevel=1)
+                    headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(len(body))
+                fake._count(url.path, status)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
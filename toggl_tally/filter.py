@@ -1,8 +1,22 @@
 import logging
+from concurrent.futures import Future
 from dataclasses import dataclass, field
-from typing import List, NamedTuple, Set
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Set,
+    Union,
+)
 
-from toggl_tally import TogglAPI
+from toggl_tally.api import TogglAPI
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.metadata import MetadataCache, TogglMetadataIndex
+from toggl_tally.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -30,15 +44,71 @@ class TogglFilter(object):
         projects: List[str] = [],
         clients: List[str] = [],
         workspaces: List[str] = [],
+        user_projects: Union[List[dict], "Future[List[dict]]", None] = None,
+        user_clients: Union[List[dict], "Future[List[dict]]", None] = None,
+        user_workspaces: Union[List[dict], "Future[List[dict]]", None] = None,
+        metadata_cache: Union[MetadataCache, None] = None,
     ):
+        """
+        User projects, clients and workspaces are read from the metadata cache
+        if one is given, or else fetched from the API unless they are passed
+        in, either already fetched or as futures of requests issued
+        concurrently.
+
+        With a metadata cache, a filter name that isn't found triggers a
+        refresh of the cache before a ValueError is raised.
+        """
         self.api = api
-        self.user_projects: List[dict] = self.api.get_user_projects()
-        self.user_clients: List[dict] = self.api.get_user_clients()
-        self.user_workspaces: List[dict] = self.api.get_user_workspaces()
+        self.metadata_cache = metadata_cache
+        # includes waiting for metadata requests issued concurrently
+        with span("filter.resolve_metadata"):
+            if metadata_cache is not None:
+                self._set_index(metadata_cache.get_index())
+            else:
+                self._set_index(
+                    TogglMetadataIndex(
+                        user_projects=_resolve(
+                            user_projects, self.api.get_user_projects
+                        ),
+                        user_clients=_resolve(user_clients, self.api.get_user_clients),
+                        user_workspaces=_resolve(
+                            user_workspaces, self.api.get_user_workspaces
+                        ),
+                    )
+                )
+        with span("filter.apply_filters"):
+            try:
+                self._apply_filters(projects, clients, workspaces)
+            except ValueError:
+                if metadata_cache is None or metadata_cache.is_refreshed:
+                    raise
+                # the name may belong to an entity created since the cache was
+                # filled
+                self._set_index(metadata_cache.refresh())
+                self._apply_filters(projects, clients, workspaces)
+
+    def _set_index(self, index: TogglMetadataIndex):
+        self.index = index
+        self.user_projects: List[dict] = index.user_projects
+        self.user_clients: List[dict] = index.user_clients
+        self.user_workspaces: List[dict] = index.user_workspaces
+
+    def _apply_filters(
+        self, projects: List[str], clients: List[str], workspaces: List[str]
+    ):
         self.filtered_projects: TogglEntities = self._filter_projects(projects)
         self.filtered_clients: TogglEntities = self._filter_clients(clients)
         self.filtered_workspaces: TogglEntities = self._filter_workspaces(workspaces)
         self.filtered_client_projects = self._filter_client_projects()
+        # compile the filters into the id sets checked for each time entry
+        self.included_workspace_ids: FrozenSet[int] = frozenset(
+            self._get_entity_ids_set(self.filtered_workspaces)
+        )
+        self.included_project_ids: FrozenSet[int] = frozenset(
+            self._get_entity_ids_set(self.filtered_client_projects)
+            | self._get_entity_ids_set(self.filtered_projects)
+        )
+        self._included_id_arrays = None
 
     def filter_time_entries(
         self, response: List[dict], exclude_running_entries: bool = True
@@ -53,29 +123,83 @@ class TogglFilter(object):
         i.e. a time entry is included if it belongs to any of the
         listed workspaces, clients or projects
         """
-        workspace_ids_set = self._get_entity_ids_set(self.filtered_workspaces)
-        client_project_ids_set = self._get_entity_ids_set(self.filtered_client_projects)
-        project_ids_set = self._get_entity_ids_set(self.filtered_projects)
+        return list(
+            self.iter_time_entries(
+                response, exclude_running_entries=exclude_running_entries
+            )
+        )
 
-        return [
-            time_entry
-            for time_entry in response
+    def iter_time_entries(
+        self, time_entries: Iterable[dict], exclude_running_entries: bool = True
+    ) -> Iterator[dict]:
+        """
+        Lazily filter time entries as in filter_time_entries, e.g. as they are
+        streamed from the API
+        """
+        for time_entry in time_entries:
             if self._is_valid_time_entry(
-                time_entry,
-                exclude_running_entries=exclude_running_entries,
-                workspace_ids_set=workspace_ids_set,
-                client_project_ids_set=client_project_ids_set,
-                project_ids_set=project_ids_set,
+                time_entry, exclude_running_entries=exclude_running_entries
+            ):
+                yield time_entry
+
+    def filter_batch(
+        self, batch: TimeEntryBatch, exclude_running_entries: bool = True
+    ) -> TimeEntryBatch:
+        """
+        Filter a columnar batch of time entries, with NumPy if it is installed
+        """
+        with span("filter.filter_batch", fetched=len(batch)) as filter_span:
+            try:
+                columns = batch.to_numpy()
+            except ImportError:
+                indices = [
+                    index
+                    for index, time_entry in enumerate(batch)
+                    if self._is_valid_time_entry(
+                        time_entry, exclude_running_entries=exclude_running_entries
+                    )
+                ]
+            else:
+                mask = self.inclusion_mask(
+                    workspace_ids=columns["workspace_id"],
+                    project_ids=columns["project_id"],
+                    durations=columns["duration"],
+                    exclude_running_entries=exclude_running_entries,
+                )
+                indices = mask.nonzero()[0].tolist()
+            filter_span.attributes["retained"] = len(indices)
+            return batch.select(indices)
+
+    def inclusion_mask(
+        self,
+        workspace_ids,
+        project_ids,
+        durations,
+        exclude_running_entries: bool = True,
+    ):
+        """
+        Vectorised counterpart to filter_time_entries over NumPy arrays of
+        time entry fields, returning a boolean mask of included time entries.
+
+        Time entries without a project should have a project id of 0.
+        Requires NumPy (``pip install toggl-tally[numpy]``).
+        """
+        import numpy as np
+
+        if self._included_id_arrays is None:
+            self._included_id_arrays = (
+                np.fromiter(self.included_workspace_ids, dtype=np.int64),
+                np.fromiter(self.included_project_ids, dtype=np.int64),
             )
-        ]
+        included_workspace_ids, included_project_ids = self._included_id_arrays
+        mask = np.isin(workspace_ids, included_workspace_ids)
+        mask |= np.isin(project_ids, included_project_ids)
+        if exclude_running_entries:
+            mask &= durations >= 0
+        return mask
 
     def _is_valid_time_entry(
-        self,
-        time_entry: dict,
-        exclude_running_entries: bool,
-        workspace_ids_set: Set[int],
-        client_project_ids_set: Set[int],
-        project_ids_set: Set[int],
+        self, time_entry: dict, exclude_running_entries: bool
     ) -> bool:
         """
         Take the UNION across workspace, client and project filters.
@@ -84,12 +208,22 @@ class TogglFilter(object):
         """
         if exclude_running_entries and self._is_running_time_entry(time_entry):
             return False
-        if time_entry["workspace_id"] in workspace_ids_set:
+        if time_entry["workspace_id"] in self.included_workspace_ids:
             return True
-        if time_entry["project_id"] in client_project_ids_set.union(project_ids_set):
+        if time_entry["project_id"] in self.included_project_ids:
             return True
         return False
 
+    def includes_ids(self, workspace_id: int, project_id: Union[int, None]) -> bool:
+        """
+        Whether time entries in the workspace and project pass the filter, e.g.
+        for totals already grouped by workspace and project
+        """
+        return (
+            workspace_id in self.included_workspace_ids
+            or project_id in self.included_project_ids
+        )
+
     def _get_entity_ids_set(self, filtered_entities: TogglEntities) -> Set[int]:
         if filtered_entities:
             return set(filtered_entities.entity_ids)
@@ -106,26 +240,10 @@ class TogglFilter(object):
         toggl_entity: str,
         entity_names: List[str],
     ) -> TogglEntities:
-        if toggl_entity not in TOGGL_ENTITIES:
-            raise ValueError(f"toggl_entity_name should be one of {TOGGL_ENTITIES}")
-        if not entity_names:
-            return TogglEntities(entity_names)
         names_to_ids = {
             entity_dict["name"]: entity_dict["id"] for entity_dict in response
         }
-        entities = []
-        for entity_name in entity_names:
-            try:
-                entity_id = names_to_ids[entity_name]
-            except KeyError:
-                raise ValueError(
-                    f"{toggl_entity.title()} name {entity_name} not found in"
-                    f" user {toggl_entity}s"
-                )
-            entities.append(
-                TogglEntity(id=entity_id, name=entity_name, type=toggl_entity)
-            )
-        return TogglEntities(entities)
+        return _get_toggl_entities(names_to_ids, toggl_entity, entity_names)
 
     def _filter_client_projects(
         self,
@@ -134,32 +252,60 @@ class TogglFilter(object):
         Time entries are only associated with clients by way of projects.
         """
         client_projects_entities = []
-        for project_dict in self.user_projects:
-            if project_dict["client_id"] in self.filtered_clients.entity_ids:
+        for client_id in self.filtered_clients.entity_ids:
+            for project_id in self.index.get_client_project_ids(client_id):
+                project_dict = self.index.get_entity("project", project_id)
                 client_projects_entities.append(
                     TogglEntity(
-                        id=project_dict["id"], name=project_dict["name"], type="project"
+                        id=project_id, name=project_dict["name"], type="project"
                     )
                 )
         return TogglEntities(client_projects_entities)
 
     def _filter_projects(self, project_names: List[str]) -> TogglEntities:
-        return self.get_toggl_entities(
-            response=self.user_projects,
-            toggl_entity="project",
-            entity_names=project_names,
+        return _get_toggl_entities(
+            self.index.ids_by_name["project"], "project", project_names
         )
 
     def _filter_clients(self, client_names: List[str]) -> TogglEntities:
-        return self.get_toggl_entities(
-            response=self.user_clients,
-            toggl_entity="client",
-            entity_names=client_names,
+        return _get_toggl_entities(
+            self.index.ids_by_name["client"], "client", client_names
         )
 
     def _filter_workspaces(self, workspace_names: List[str]) -> TogglEntities:
-        return self.get_toggl_entities(
-            response=self.user_workspaces,
-            toggl_entity="workspace",
-            entity_names=workspace_names,
+        return _get_toggl_entities(
+            self.index.ids_by_name["workspace"], "workspace", workspace_names
         )
+
+
+def _get_toggl_entities(
+    names_to_ids: Dict[str, int],
+    toggl_entity: str,
+    entity_names: List[str],
+) -> TogglEntities:
+    if toggl_entity not in TOGGL_ENTITIES:
+        raise ValueError(f"toggl_entity_name should be one of {TOGGL_ENTITIES}")
+    if not entity_names:
+        return TogglEntities(entity_names)
+    entities = []
+    for entity_name in entity_names:
+        try:
+            entity_id = names_to_ids[entity_name]
+        except KeyError:
+            raise ValueError(
+                f"{toggl_entity.title()} name {entity_name} not found in"
+                f" user {toggl_entity}s"
+            )
+        entities.append(TogglEntity(id=entity_id, name=entity_name, type=toggl_entity))
+    return TogglEntities(entities)
+
+
+def _resolve(
+    prefetched: Union[List[dict], "Future[List[dict]]", None],
+    fetch: Callable[[], List[dict]],
+) -> List[dict]:
+    if prefetched is None:
+        return fetch()
+    if isinstance(prefetched, Future):
+        return prefetched.result()
+    return prefetched
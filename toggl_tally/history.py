@@ -0,0 +1,84 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import TYPE_CHECKING, List
+
+from toggl_tally.entries import TimeEntryBatch
+
+if TYPE_CHECKING:
+    from toggl_tally.tally import TallySnapshot
+
+
+def invoice_periods(snapshot: "TallySnapshot", n_periods: int) -> List["TallySnapshot"]:
+    """
+    Snapshots of the current invoice period and the ``n_periods - 1`` before
+    it, oldest first
+    """
+    if n_periods < 1:
+        raise ValueError("The number of invoice periods should be at least 1")
+    periods = [snapshot]
+    while len(periods) < n_periods:
+        periods.append(periods[-1].previous_period())
+    return periods[::-1]
+
+
+def seconds_per_period(
+    period_starts: List[int], end: int, batch: TimeEntryBatch
+) -> List[int]:
+    """
+    Total duration of the time entries starting in each period, where the
+    periods run from each start timestamp up to the next, and the last one up
+    to ``end`` inclusive. The batch should already be filtered.
+
+    The time entries are sorted by start once, and each period boundary is
+    found by bisecting their start times.
+
+    >>> batch = TimeEntryBatch.from_dicts(
+    ...     {"id": index, "workspace_id": 1, "project_id": None, "duration": 60,
+    ...      "start": f"2023-03-0{index}T00:00:00Z"}
+    ...     for index in [4, 1, 2, 3]
+    ... )
+    >>> march = 1677628800  # 2023-03-01
+    >>> day = 24 * 60 * 60
+    >>> seconds_per_period([march, march + 2 * day], end=march + 3 * day, batch=batch)
+    [120, 120]
+    """
+    time_entries = sorted(
+        zip(batch.columns["start"], batch.columns["duration"]),
+        key=lambda time_entry: time_entry[0],
+    )
+    starts = [start for start, _ in time_entries]
+    # cumulative[i] is the total duration of the first i time entries
+    cumulative = [0, *accumulate(duration for _, duration in time_entries)]
+    boundaries = [bisect_left(starts, period_start) for period_start in period_starts]
+    boundaries.append(bisect_right(starts, end))
+    return [
+        cumulative[period_end] - cumulative[period_start]
+        for period_start, period_end in zip(boundaries, boundaries[1:])
+    ]
+
+
+def period_history(
+    periods: List["TallySnapshot"], batch: TimeEntryBatch, hours_per_month: int
+) -> List[dict]:
+    """
+    Hours worked against the target in each invoice period, from a filtered
+    batch of time entries covering every period
+    """
+    current = periods[-1]
+    seconds = seconds_per_period(
+        [int(period.first_billable_date.timestamp()) for period in periods],
+        end=int(current.now.timestamp()),
+        batch=batch,
+    )
+    target_seconds = hours_per_month * 60 * 60
+    return [
+        dict(
+            first_billable_date=period.first_billable_date.isoformat(),
+            last_billable_date=period.last_billable_date.isoformat(),
+            seconds_worked=seconds_worked,
+            target_seconds=target_seconds,
+            utilisation=seconds_worked / target_seconds if target_seconds else None,
+            current=period is current,
+        )
+        for period, seconds_worked in zip(periods, seconds)
+    ]
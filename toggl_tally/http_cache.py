@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+from typing import FrozenSet, Iterable, Union
+
+from toggl_tally.cache import default_cache_dir, write_json_atomic
+
+# the endpoints whose responses rarely change between runs
+METADATA_ENDPOINTS = frozenset(["/me/workspaces", "/me/clients", "/me/projects"])
+
+
+class CachedResponse(object):
+    """
+    A response body with the validators the server sent with it
+    """
+
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(
+        self,
+        body: str,
+        etag: Union[str, None] = None,
+        last_modified: Union[str, None] = None,
+    ):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def conditional_headers(self) -> dict:
+        """
+        >>> CachedResponse("[]", etag='"abc"').conditional_headers()
+        {'If-None-Match': '"abc"'}
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ValidatorCache(object):
+    """
+    On-disk cache of response bodies and their ETag and Last-Modified
+    validators, for TogglAPI to make conditional requests with.
+
+    Only responses from the endpoints in ``endpoints`` are cached; by default
+    the workspace, client and project endpoints. A response without either
+    validator isn't cached, since it can't be revalidated.
+    """
+
+    def __init__(self, directory: Path, endpoints: Iterable[str] = METADATA_ENDPOINTS):
+        self.directory = directory
+        self.endpoints: FrozenSet[str] = frozenset(endpoints)
+
+    @classmethod
+    def for_user(
+        cls,
+        cache_dir: Union[Path, None] = None,
+        endpoints: Iterable[str] = METADATA_ENDPOINTS,
+    ) -> "ValidatorCache":
+        # responses are keyed by the user's credentials as well as the URL,
+        # so users can share the directory
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        return cls(cache_dir / "responses", endpoints=endpoints)
+
+    def is_eligible(self, endpoint: str) -> bool:
+        return endpoint in self.endpoints
+
+    def get(self, key: str) -> Union[CachedResponse, None]:
+        try:
+            with self._path(key).open("r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return CachedResponse(
+            data["body"], etag=data["etag"], last_modified=data["last_modified"]
+        )
+
+    def put(self, key: str, cached_response: CachedResponse):
+        write_json_atomic(
+            self._path(key),
+            dict(
+                body=cached_response.body,
+                etag=cached_response.etag,
+                last_modified=cached_response.last_modified,
+            ),
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
@@ -0,0 +1,166 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Union
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.cache import default_cache_dir, user_cache_key, write_json_atomic
+from toggl_tally.tracing import span
+
+
+class TogglMetadataIndex(object):
+    """
+    Hierarchical index of a user's workspaces, clients and projects.
+
+    workspace -> clients -> projects, with name -> id and id -> entity maps
+    for each entity type. Clients without a workspace and projects without a
+    client are indexed by id and name but do not appear in the hierarchy.
+    """
+
+    def __init__(
+        self,
+        user_projects: List[dict],
+        user_clients: List[dict],
+        user_workspaces: List[dict],
+    ):
+        self.user_projects = user_projects
+        self.user_clients = user_clients
+        self.user_workspaces = user_workspaces
+        self.entities_by_id: Dict[str, Dict[int, dict]] = {
+            "project": {entity["id"]: entity for entity in user_projects},
+            "client": {entity["id"]: entity for entity in user_clients},
+            "workspace": {entity["id"]: entity for entity in user_workspaces},
+        }
+        # later entities with a duplicate name shadow earlier ones
+        self.ids_by_name: Dict[str, Dict[str, int]] = {
+            toggl_entity: {entity["name"]: entity["id"] for entity in entities}
+            for toggl_entity, entities in [
+                ("project", user_projects),
+                ("client", user_clients),
+                ("workspace", user_workspaces),
+            ]
+        }
+        self.workspace_client_ids: Dict[int, List[int]] = {
+            workspace["id"]: [] for workspace in user_workspaces
+        }
+        for client in user_clients:
+            self.workspace_client_ids.setdefault(client.get("wid"), []).append(
+                client["id"]
+            )
+        self.client_project_ids: Dict[int, List[int]] = {
+            client["id"]: [] for client in user_clients
+        }
+        for project in user_projects:
+            self.client_project_ids.setdefault(project["client_id"], []).append(
+                project["id"]
+            )
+
+    def get_id(self, toggl_entity: str, name: str) -> int:
+        """
+        Raises KeyError for unknown names
+        """
+        return self.ids_by_name[toggl_entity][name]
+
+    def get_entity(self, toggl_entity: str, entity_id: int) -> dict:
+        return self.entities_by_id[toggl_entity][entity_id]
+
+    def get_client_project_ids(self, client_id: int) -> List[int]:
+        return self.client_project_ids.get(client_id, [])
+
+    def get_workspace_client_ids(self, workspace_id: int) -> List[int]:
+        return self.workspace_client_ids.get(workspace_id, [])
+
+
+class MetadataCache(object):
+    """
+    On-disk cache of a user's workspaces, clients and projects, which expires
+    ``ttl`` seconds after it was downloaded
+    """
+
+    version = 1
+
+    def __init__(self, api: TogglAPI, path: Path, ttl: float = 24 * 60 * 60):
+        self.api = api
+        self.path = path
+        self.ttl = ttl
+        self.index: Union[TogglMetadataIndex, None] = None
+        self.fetched_at: Union[float, None] = None
+        # whether the index was downloaded by this process, in which case
+        # refreshing it again cannot turn up anything new
+        self.is_refreshed = False
+
+    @classmethod
+    def for_user(
+        cls,
+        api: TogglAPI,
+        cache_dir: Union[Path, None] = None,
+        ttl: float = 24 * 60 * 60,
+    ) -> "MetadataCache":
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        return cls(api, cache_dir / f"metadata_{user_cache_key()}.json", ttl=ttl)
+
+    def is_fresh(self) -> bool:
+        if self.fetched_at is None:
+            return False
+        return time.time() - self.fetched_at <= self.ttl
+
+    def get_index(self) -> TogglMetadataIndex:
+        if self.index is None:
+            self.load()
+        hit = self.index is not None and self.is_fresh()
+        with span("cache.metadata", hit=hit):
+            return self.index if hit else self.refresh()
+
+    def load(self):
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") != self.version:
+            return
+        self.fetched_at = data["fetched_at"]
+        self.index = TogglMetadataIndex(
+            user_projects=data["projects"],
+            user_clients=data["clients"],
+            user_workspaces=data["workspaces"],
+        )
+
+    def refresh(self) -> TogglMetadataIndex:
+        fetched_at = time.time()
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            user_projects = executor.submit(self.api.get_user_projects)
+            user_clients = executor.submit(self.api.get_user_clients)
+            user_workspaces = executor.submit(self.api.get_user_workspaces)
+            self.index = TogglMetadataIndex(
+                user_projects=user_projects.result(),
+                user_clients=user_clients.result(),
+                user_workspaces=user_workspaces.result(),
+            )
+        self.fetched_at = fetched_at
+        self.is_refreshed = True
+        self.save()
+        return self.index
+
+    def save(self):
+        write_json_atomic(
+            self.path,
+            dict(
+                version=self.version,
+                fetched_at=self.fetched_at,
+                projects=self.index.user_projects,
+                clients=self.index.user_clients,
+                workspaces=self.index.user_workspaces,
+            ),
+        )
+
+    def invalidate(self):
+        self.index = None
+        self.fetched_at = None
+        self.is_refreshed = False
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
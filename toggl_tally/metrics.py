@@ -0,0 +1,250 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+from toggl_tally.tracing import Span
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self, openmetrics: bool) -> Iterator[Tuple[str, Labels, float]]:
+        """
+        (name suffix, labels, value) for each sample of the metric
+        """
+
+    def render(self, openmetrics: bool = False) -> List[str]:
+        # Prometheus' text format names counters by their samples, while
+        # OpenMetrics names them without the _total suffix
+        family = self.name
+        if self.type == "counter" and not openmetrics:
+            family = f"{self.name}_total"
+        lines = [f"# HELP {family} {self.help}", f"# TYPE {family} {self.type}"]
+        for suffix, labels, value in self.samples(openmetrics):
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(labels)} {_format(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, openmetrics: bool) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, value in sorted(self.values.items()):
+            yield "_total", labels, value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self.values[_labels_key(labels)] = value
+
+    def samples(self, openmetrics: bool) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, value in sorted(self.values.items()):
+            yield "", labels, value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # per label set, observation counts per bucket (not cumulative) and
+        # the sum of observations
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _labels_key(labels)
+        index = next(
+            index for index, bound in enumerate(self.buckets) if value <= bound
+        )
+        with self._lock:
+            counts = self.counts.setdefault(key, [0] * len(self.buckets))
+            counts[index] += 1
+            self.sums[key] = self.sums.get(key, 0) + value
+
+    def samples(self, openmetrics: bool) -> Iterator[Tuple[str, Labels, float]]:
+        for labels, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", labels + (("le", _format(bound)),), cumulative
+            yield "_count", labels, cumulative
+            yield "_sum", labels, self.sums[labels]
+
+
+class MetricsRegistry(object):
+    """
+    A minimal set of Prometheus metrics, rendered in the Prometheus text
+    format or as OpenMetrics
+
+    >>> registry = MetricsRegistry()
+    >>> requests = registry.counter("requests", "Requests made")
+    >>> requests.inc(endpoint="/me")
+    >>> print(registry.render())
+    # HELP requests_total Requests made
+    # TYPE requests_total counter
+    requests_total{endpoint="/me"} 1
+    <BLANKLINE>
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(Gauge(name, help))
+
+    def histogram(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self, openmetrics: bool = False) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path, openmetrics: bool = False):
+        """
+        Write the metrics atomically, as the node exporter's textfile
+        collector expects
+        """
+        from toggl_tally.cache import write_text_atomic
+
+        write_text_atomic(Path(path), self.render(openmetrics))
+
+
+class TogglTallyMetrics(object):
+    """
+    A span listener (see toggl_tally.tracing) turning the spans of a run into
+    API, time entry and cache metrics
+    """
+
+    def __init__(self, registry: Union[MetricsRegistry, None] = None):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.started_at = time.time()
+        self.requests = self.registry.counter(
+            "toggl_tally_api_requests", "Toggl API requests, after any retries"
+        )
+        self.request_duration = self.registry.histogram(
+            "toggl_tally_api_request_duration_seconds",
+            "Time to a Toggl API response's headers, including retries",
+        )
+        self.response_bytes = self.registry.histogram(
+            "toggl_tally_api_response_bytes",
+            "Size of Toggl API response bodies",
+            buckets=SIZE_BUCKETS,
+        )
+        self.retries = self.registry.counter(
+            "toggl_tally_api_retries", "Toggl API requests retried"
+        )
+        self.time_entries_fetched = self.registry.counter(
+            "toggl_tally_time_entries_fetched", "Time entries considered by filters"
+        )
+        self.time_entries_retained = self.registry.counter(
+            "toggl_tally_time_entries_retained", "Time entries passing filters"
+        )
+        self.cache_requests = self.registry.counter(
+            "toggl_tally_cache_requests", "Cache lookups, by cache and result"
+        )
+        self.run_started = self.registry.gauge(
+            "toggl_tally_run_start_timestamp_seconds", "When the run started"
+        )
+        self.run_duration = self.registry.gauge(
+            "toggl_tally_run_duration_seconds", "How long the run took"
+        )
+        self.run_started.set(self.started_at)
+
+    def __call__(self, span: Span):
+        attributes = span.attributes
+        if span.name == "api.request":
+            endpoint = str(attributes.get("endpoint", ""))
+            self.requests.inc(
+                endpoint=endpoint, status=str(attributes.get("status", "error"))
+            )
+            self.request_duration.observe(span.duration_ns / 1e9, endpoint=endpoint)
+        elif span.name == "api.retry_wait":
+            self.retries.inc(reason=str(attributes.get("reason", "")))
+        elif "bytes" in attributes:
+            self.response_bytes.observe(
+                attributes["bytes"], endpoint=str(attributes.get("endpoint", ""))
+            )
+        if "fetched" in attributes:
+            self.time_entries_fetched.inc(attributes["fetched"])
+            self.time_entries_retained.inc(attributes["retained"])
+        if span.name.startswith("cache."):
+            self.cache_requests.inc(
+                cache=span.name[len("cache.") :],
+                result="hit" if attributes.get("hit") else "miss",
+            )
+
+    def finish(self):
+        self.run_duration.set(time.time() - self.started_at)
+
+
+def _labels_key(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format(value: float) -> str:
+    """
+    >>> [_format(value) for value in [1, 0.5, 1e6, math.inf]]
+    ['1', '0.5', '1000000', '+Inf']
+    """
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -1,5 +1,6 @@
+import time
 from datetime import date, datetime
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 
 from rich.console import Console
 from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn
@@ -7,6 +8,9 @@ from rich.table import Table
 
 from toggl_tally.time_utils import format_seconds
 
+if TYPE_CHECKING:
+    from toggl_tally.tracing import SpanRecorder
+
 
 class RichReport(object):
     def __init__(
@@ -99,6 +103,97 @@ class RichReport(object):
             table.add_row(holiday[0], holiday[1].strftime("%a %d %b"))
         self.console.print(table)
 
+    def batch_table(self, results: List[dict]):
+        table = Table(title="Batch")
+        table.add_column("Config", justify="right", style="cyan", no_wrap=True)
+        table.add_column("Worked", style=self.hours_style)
+        table.add_column("Target", style=self.limit_int_style)
+        table.add_column("Outstanding", style=self.hours_style)
+        table.add_column("Days left", style=self.int_style)
+        table.add_column("Per day", style=self.hours_style)
+        table.add_column("Next invoice", style=self.date_style)
+        for result in results:
+            if "error" in result:
+                table.add_row(
+                    result["name"], self.apply_style(result["error"], "error_style")
+                )
+                continue
+            seconds_per_day = result["seconds_per_day"]
+            next_invoice_date = datetime.fromisoformat(result["next_invoice_date"])
+            table.add_row(
+                result["name"],
+                format_seconds(result["seconds_worked"]),
+                str(result["hours_per_month"]),
+                format_seconds(result["seconds_outstanding"]),
+                str(result["remaining_working_days"]),
+                "-" if seconds_per_day is None else format_seconds(seconds_per_day),
+                next_invoice_date.strftime(self.date_format),
+            )
+        self.console.print(table)
+
+    def breakdown_table(self, result: dict):
+        from rich.markup import escape
+
+        from toggl_tally.breakdown import iter_breakdown_rows
+
+        total_seconds = result["seconds"]
+        table = Table(title=f"Breakdown ({format_seconds(total_seconds)})")
+        table.add_column("Workspace / client / project", style="cyan", no_wrap=True)
+        table.add_column("Worked", style=self.hours_style)
+        table.add_column("Share", justify="right", style="magenta")
+        for depth, name, seconds in iter_breakdown_rows(result):
+            table.add_row(
+                "  " * depth
+                + (f"[bold]{escape(name)}[/bold]" if depth == 0 else escape(name)),
+                format_seconds(seconds),
+                f"{100 * seconds / total_seconds:.0f}%" if total_seconds else "-",
+            )
+        self.console.print(table)
+
+    def history_table(self, periods: List[dict]):
+        table = Table(title="History")
+        table.add_column("Period", justify="right", style=self.date_style)
+        table.add_column("Worked", style=self.hours_style)
+        table.add_column("Target", style=self.limit_int_style)
+        table.add_column("Utilisation", justify="right", style="magenta")
+        for period in periods:
+            first_billable_date = datetime.fromisoformat(period["first_billable_date"])
+            last_billable_date = datetime.fromisoformat(period["last_billable_date"])
+            label = (
+                f"{first_billable_date.strftime(self.date_format)} -"
+                f" {last_billable_date.strftime(self.date_format)}"
+            )
+            if period["current"]:
+                label += " (so far)"
+            utilisation = period["utilisation"]
+            table.add_row(
+                label,
+                format_seconds(period["seconds_worked"]),
+                format_seconds(period["target_seconds"]),
+                "-" if utilisation is None else f"{100 * utilisation:.0f}%",
+            )
+        self.console.print(table)
+
+    def profile_table(self, recorder: "SpanRecorder"):
+        """
+        Time spent in each kind of span. Spans nest and run concurrently, so
+        their shares of the run don't add up to 100%.
+        """
+        elapsed_ns = time.perf_counter_ns() - recorder.start_ns
+        table = Table(title=f"Profile ({elapsed_ns / 1e6:.1f} ms)")
+        table.add_column("Span", justify="right", style="cyan", no_wrap=True)
+        table.add_column("Calls", justify="right", style=self.int_style)
+        table.add_column("Total ms", justify="right", style=self.hours_style)
+        table.add_column("Share of run", justify="right", style="magenta")
+        for row in recorder.summary():
+            table.add_row(
+                row["name"],
+                str(row["count"]),
+                f"{row['total_ns'] / 1e6:.1f}",
+                f"{100 * row['total_ns'] / elapsed_ns:.0f}%",
+            )
+        self.console.print(table)
+
     def apply_style(self, text, style: str):
         style_str = getattr(self, style)
         return f"[{style_str}]{text}[/{style_str}]"
@@ -0,0 +1,215 @@
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Tuple, Union
+
+from toggl_tally.time_utils import parse_timestamp
+
+if TYPE_CHECKING:
+    from toggl_tally.filter import TogglFilter
+
+# (workspace id, project id), with a project id of 0 for time entries without
+# a project
+CellKey = Tuple[int, int]
+
+
+class DailyRollup(object):
+    """
+    Total time entry durations per day and per project, in a timezone fixed
+    when the rollup is created. Totals for a range of days, for any filter,
+    are summed from the rollup's cells rather than from raw time entries;
+    clients and workspaces are covered through their projects' cells.
+
+    The rollup is kept up to date from time entries as they are added,
+    changed and removed (see TimeEntryCache). It covers complete days from
+    ``first_day`` onwards. Days before ``compacted_until`` are closed: their
+    raw time entries may have been discarded, and later changes to them are
+    ignored.
+
+    >>> rollup = DailyRollup(timezone="UTC")
+    >>> rollup.rebuild(
+    ...     [
+    ...         {"workspace_id": 1, "project_id": 10, "duration": 3600,
+    ...          "start": "2023-03-01T08:00:00Z"},
+    ...         {"workspace_id": 1, "project_id": None, "duration": 1800,
+    ...          "start": "2023-03-02T08:00:00Z"},
+    ...     ],
+    ...     start_date=datetime.fromisoformat("2023-03-01T00:00:00+00:00"),
+    ... )
+    >>> rollup.totals_between(date(2023, 3, 1), date(2023, 3, 31))
+    {(1, 10): 3600, (1, 0): 1800}
+    """
+
+    def __init__(self, timezone: Union[str, None] = None):
+        self.timezone = timezone
+        self.cells: Dict[date, Dict[CellKey, int]] = {}
+        self.first_day: Union[date, None] = None
+        self.compacted_until: Union[date, None] = None
+        if timezone is not None:
+            from dateutil import tz
+
+            self._tzinfo = tz.gettz(timezone)
+        else:
+            # the system's local timezone
+            self._tzinfo = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DailyRollup":
+        rollup = cls(timezone=data["timezone"])
+        rollup.first_day = _parse_date(data["first_day"])
+        rollup.compacted_until = _parse_date(data["compacted_until"])
+        rollup.cells = {
+            date.fromisoformat(day): {
+                (workspace_id, project_id): seconds
+                for workspace_id, project_id, seconds in day_cells
+            }
+            for day, day_cells in data["cells"].items()
+        }
+        return rollup
+
+    def to_dict(self) -> dict:
+        return dict(
+            timezone=self.timezone,
+            first_day=_format_date(self.first_day),
+            compacted_until=_format_date(self.compacted_until),
+            cells={
+                day.isoformat(): [
+                    [workspace_id, project_id, seconds]
+                    for (workspace_id, project_id), seconds in day_cells.items()
+                ]
+                for day, day_cells in sorted(self.cells.items())
+            },
+        )
+
+    def day_of(self, time_entry: dict) -> date:
+        return self.local_date(parse_timestamp(time_entry["start"]))
+
+    def local_date(self, moment: datetime) -> date:
+        return moment.astimezone(self._tzinfo).date()
+
+    def day_start(self, day: date) -> datetime:
+        """
+        Midnight at the start of the day, in the rollup's timezone
+        """
+        midnight = datetime.combine(day, time())
+        if self._tzinfo is None:
+            return midnight.astimezone()
+        return midnight.replace(tzinfo=self._tzinfo)
+
+    def covers(self, start_day: date) -> bool:
+        return self.first_day is not None and self.first_day <= start_day
+
+    def is_open(self, day: date) -> bool:
+        """
+        Whether changes to time entries on the day are applied to the rollup
+        """
+        if self.first_day is None or day < self.first_day:
+            return False
+        return self.compacted_until is None or day >= self.compacted_until
+
+    def add(self, time_entry: dict, sign: int = 1):
+        # running time entries are counted once they stop
+        if time_entry["duration"] < 0:
+            return
+        day = self.day_of(time_entry)
+        if not self.is_open(day):
+            return
+        day_cells = self.cells.setdefault(day, {})
+        key = (time_entry["workspace_id"], time_entry["project_id"] or 0)
+        seconds = day_cells.get(key, 0) + sign * time_entry["duration"]
+        if seconds:
+            day_cells[key] = seconds
+        else:
+            day_cells.pop(key, None)
+            if not day_cells:
+                del self.cells[day]
+
+    def remove(self, time_entry: dict):
+        self.add(time_entry, sign=-1)
+
+    def rebuild(self, time_entries: Iterable[dict], start_date: datetime):
+        """
+        Replace the open days' totals with those of every time entry from
+        ``start_date`` onwards.
+
+        If the time entries don't reach back to the start of a compacted
+        rollup, the compacted days are kept and every day before
+        ``start_date`` is closed too, since its raw time entries are no
+        longer available to apply changes to.
+        """
+        local_start = start_date.astimezone(self._tzinfo)
+        first_day = local_start.date()
+        if local_start.time() != time():
+            # the first day is only partly covered
+            first_day += timedelta(days=1)
+        if self.compacted_until is not None and first_day > self.first_day:
+            self.compacted_until = max(self.compacted_until, first_day)
+            self.cells = {
+                day: day_cells
+                for day, day_cells in self.cells.items()
+                if day < self.compacted_until
+            }
+        else:
+            self.first_day = first_day
+            self.compacted_until = None
+            self.cells = {}
+        for time_entry in time_entries:
+            self.add(time_entry)
+
+    def compact(self, until: date):
+        """
+        Close the days before ``until``, e.g. the days of invoice periods that
+        have already been billed
+        """
+        if self.first_day is None:
+            return
+        if self.compacted_until is None or until > self.compacted_until:
+            self.compacted_until = until
+
+    def totals_between(self, start_day: date, end_day: date) -> Dict[CellKey, int]:
+        """
+        Total seconds per (workspace id, project id) over the days from
+        ``start_day`` to ``end_day`` inclusive
+        """
+        totals: Dict[CellKey, int] = {}
+        for day, day_cells in self._iter_days(start_day, end_day):
+            for key, seconds in day_cells.items():
+                totals[key] = totals.get(key, 0) + seconds
+        return totals
+
+    def seconds_between(
+        self,
+        start_day: date,
+        end_day: date,
+        toggl_filter: Union["TogglFilter", None] = None,
+    ) -> int:
+        """
+        Total seconds over the days from ``start_day`` to ``end_day``
+        inclusive, of the time entries passing the filter if one is given
+        """
+        seconds = 0
+        for day, day_cells in self._iter_days(start_day, end_day):
+            for key, cell_seconds in day_cells.items():
+                if toggl_filter is None or toggl_filter.includes_ids(*key):
+                    seconds += cell_seconds
+        return seconds
+
+    def _iter_days(
+        self, start_day: date, end_day: date
+    ) -> Iterable[Tuple[date, Dict[CellKey, int]]]:
+        if not self.covers(start_day):
+            raise ValueError(
+                f"Daily rollup starts on {self.first_day}, after {start_day}"
+            )
+        day = start_day
+        while day <= end_day:
+            day_cells = self.cells.get(day)
+            if day_cells:
+                yield day, day_cells
+            day += timedelta(days=1)
+
+
+def _parse_date(value: Union[str, None]) -> Union[date, None]:
+    return date.fromisoformat(value) if value is not None else None
+
+
+def _format_date(value: Union[date, None]) -> Union[str, None]:
+    return value.isoformat() if value is not None else None
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from typing import Callable, Tuple, Type, TypeVar, Union
+
+from toggl_tally.tracing import span
+
+Response = TypeVar("Response")
+
+# Toggl allows about one request per second per API token, with short bursts
+# https://developers.track.toggl.com/docs/#generic-responses
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 4
+
+
+class TokenBucket(object):
+    """
+    Allows ``rate`` acquisitions per second on average, and bursts of up to
+    ``capacity``. Thread-safe; ``acquire`` blocks until a token is available.
+
+    >>> bucket = TokenBucket(rate=1, capacity=2, clock=lambda: 0, sleep=print)
+    >>> bucket.acquire(), bucket.acquire()
+    (None, None)
+    >>> bucket.wait_time()
+    1.0
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _fill(self, now: float):
+        # updated is in the future while paused
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+    def wait_time(self) -> float:
+        """
+        Seconds until a token will be available
+        """
+        with self._lock:
+            now = self.clock()
+            self._fill(now)
+            return self._wait_time(now)
+
+    def _wait_time(self, now: float) -> float:
+        if self.paused_until > now:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._fill(now)
+                wait = self._wait_time(now)
+                if not wait:
+                    self.tokens -= 1
+                    return
+            self.sleep(wait)
+
+    def pause_until(self, moment: float):
+        """
+        Hand out no tokens until ``moment``, e.g. when the server asks us to
+        back off, and start again from an empty bucket
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, moment)
+            self.tokens = 0.0
+            self.updated = max(self.updated, moment)
+
+
+class RetryPolicy(object):
+    """
+    Which responses to retry, and how long to wait before each retry: the
+    server's Retry-After if it gave one, or else exponential backoff with
+    full jitter.
+
+    >>> policy = RetryPolicy(backoff_base=1, backoff_cap=10, rng=random.Random(0))
+    >>> [policy.should_retry(status, attempt=0) for status in [200, 404, 429, 503]]
+    [False, False, True, True]
+    >>> policy.delay(attempt=2, retry_after=7)
+    7
+    >>> 0 <= policy.delay(attempt=10) <= 10
+    True
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30,
+        retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+        rng: Union[random.Random, None] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_statuses = retry_statuses
+        self.rng = rng or random.Random()
+
+    def should_retry(self, status: int, attempt: int) -> bool:
+        return status in self.retry_statuses and attempt < self.max_retries
+
+    def delay(self, attempt: int, retry_after: Union[float, None] = None) -> float:
+        if retry_after is not None:
+            return retry_after
+        return self.rng.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2**attempt)
+        )
+
+
+class RequestScheduler(object):
+    """
+    Issues requests through a token bucket rate limiter, with at most
+    ``max_concurrency`` requests in flight (until their response headers
+    arrive), retrying rate limited and transiently failing requests per the
+    retry policy. A Retry-After from the server pauses every request made
+    through the scheduler, not just the one that was rejected.
+
+    ``rate=None`` turns off rate limiting.
+    """
+
+    def __init__(
+        self,
+        rate: Union[float, None] = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_concurrency: int = 4,
+        retry_policy: Union[RetryPolicy, None] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.bucket = (
+            TokenBucket(rate, burst, clock=clock, sleep=sleep) if rate else None
+        )
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.clock = clock
+        self.sleep = sleep
+        self.n_retries = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def call(
+        self,
+        send: Callable[[], Response],
+        retry_exceptions: Tuple[Type[BaseException], ...] = (),
+    ) -> Response:
+        """
+        Call ``send`` until it returns a response that shouldn't be retried,
+        or the retries run out. The last response is returned either way, and
+        an exception in ``retry_exceptions`` is raised once retries run out.
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            with self._semaphore:
+                try:
+                    response = send()
+                except retry_exceptions as error:
+                    if attempt >= self.retry_policy.max_retries:
+                        raise
+                    response = None
+                    reason = type(error).__name__
+            if response is not None and not self.retry_policy.should_retry(
+                response.status_code, attempt
+            ):
+                return response
+            retry_after = None
+            if response is not None:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                reason = str(response.status_code)
+            delay = self.retry_policy.delay(attempt, retry_after=retry_after)
+            if retry_after is not None and self.bucket is not None:
+                self.bucket.pause_until(self.clock() + delay)
+            self.n_retries += 1
+            with span("api.retry_wait", reason=reason):
+                self.sleep(delay)
+            attempt += 1
+
+
+def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+    """
+    Seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP date
+
+    >>> parse_retry_after("3")
+    3.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is not None
+    True
+    >>> parse_retry_after("soon") is None
+    True
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
@@ -0,0 +1,406 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple, Union
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.cache import default_cache_dir, user_cache_key
+from toggl_tally.entries import TimeEntry
+from toggl_tally.metadata import MetadataCache, TogglMetadataIndex
+from toggl_tally.time_utils import get_current_datetime, parse_timestamp
+from toggl_tally.tracing import span
+
+if TYPE_CHECKING:
+    from toggl_tally.filter import TogglFilter
+
+# bumped when the schema changes, which rebuilds the store on the next sync
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS time_entries (
+    id INTEGER PRIMARY KEY,
+    workspace_id INTEGER NOT NULL,
+    project_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS time_entries_start ON time_entries (start);
+CREATE INDEX IF NOT EXISTS time_entries_project_id
+    ON time_entries (project_id, start);
+CREATE INDEX IF NOT EXISTS time_entries_workspace_id
+    ON time_entries (workspace_id, start);
+CREATE TABLE IF NOT EXISTS metadata (
+    entity TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (entity, id)
+);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# TogglMetadataIndex arguments by metadata entity
+_METADATA_ENTITIES = {
+    "project": "user_projects",
+    "client": "user_clients",
+    "workspace": "user_workspaces",
+}
+
+
+class SQLiteStore(object):
+    """
+    Local SQLite store of a user's time entries and metadata, an alternative
+    to the JSON caches for years of history.
+
+    Time entries are indexed by start time, project and workspace, and sums
+    are computed in SQL with the filter and date range pushed down, so only
+    the totals are loaded into Python. Syncing works like TimeEntryCache:
+    a full download from a start date, then upserts and deletes of the time
+    entries changed since the previous sync.
+
+    The database is in WAL mode and writes take an immediate lock, so several
+    toggl-tally processes can read and sync the same store. Each thread gets
+    its own connection.
+    """
+
+    def __init__(self, path: Path, timeout: float = 30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._migrate()
+
+    @classmethod
+    def for_user(
+        cls,
+        cache_dir: Union[Path, None] = None,
+        api_token: Union[str, None] = None,
+    ) -> "SQLiteStore":
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        return cls(cache_dir / f"store_{user_cache_key(api_token)}.sqlite3")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # autocommit, with transactions begun explicitly by _write
+            connection = sqlite3.connect(
+                str(self.path), timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """
+        A transaction holding the database's write lock from the start, so
+        that concurrent writers queue up rather than fail part way through
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _migrate(self):
+        with self._write() as connection:
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != SCHEMA_VERSION:
+                for table in ["time_entries", "metadata", "state"]:
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+            # executescript would commit the transaction
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _get_state(self, key: str) -> Union[str, None]:
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    @staticmethod
+    def _set_state(connection: sqlite3.Connection, key: str, value: str):
+        connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    @property
+    def last_sync(self) -> Union[int, None]:
+        value = self._get_state("last_sync")
+        return int(value) if value is not None else None
+
+    @property
+    def covered_from(self) -> Union[datetime, None]:
+        value = self._get_state("covered_from")
+        return parse_timestamp(value) if value is not None else None
+
+    def is_fresh(self, max_age: Union[float, None]) -> bool:
+        last_sync = self.last_sync
+        if max_age is None or last_sync is None:
+            return False
+        return time.time() - last_sync <= max_age
+
+    def covers(self, start_date: datetime) -> bool:
+        covered_from = self.covered_from
+        return covered_from is not None and covered_from <= start_date
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM time_entries"
+        ).fetchone()
+        return count
+
+    def sync(self, api: TogglAPI, start_date: datetime, full: bool = False) -> int:
+        """
+        Bring the store up to date from ``start_date`` onwards.
+
+        Returns the number of time entries received from the API.
+        """
+        sync_started = int(time.time())
+        last_sync = self.last_sync
+        if full or last_sync is None or not self.covers(start_date):
+            time_entries = api.get_time_entries_between(
+                start_date=start_date, end_date=get_current_datetime()
+            )
+            with self._write() as connection:
+                connection.execute("DELETE FROM time_entries")
+                self._upsert(connection, time_entries)
+                self._set_state(connection, "covered_from", start_date.isoformat())
+                self._set_state(connection, "last_sync", str(sync_started))
+        else:
+            time_entries = api.get_time_entries_since(since=last_sync)
+            with self._write() as connection:
+                self._merge(connection, time_entries)
+                # another process may have synced more recently
+                connection.execute(
+                    "UPDATE state SET value = MAX(CAST(value AS INTEGER), ?)"
+                    " WHERE key = 'last_sync'",
+                    (sync_started,),
+                )
+        return len(time_entries)
+
+    def merge(self, time_entries: List[dict]):
+        with self._write() as connection:
+            self._merge(connection, time_entries)
+
+    def _merge(self, connection: sqlite3.Connection, time_entries: List[dict]):
+        deleted = [
+            (time_entry["id"],)
+            for time_entry in time_entries
+            if time_entry.get("server_deleted_at")
+        ]
+        connection.executemany("DELETE FROM time_entries WHERE id = ?", deleted)
+        self._upsert(
+            connection,
+            (
+                time_entry
+                for time_entry in time_entries
+                if not time_entry.get("server_deleted_at")
+            ),
+        )
+
+    @staticmethod
+    def _upsert(connection: sqlite3.Connection, time_entries: Iterable[dict]):
+        connection.executemany(
+            "INSERT OR REPLACE INTO time_entries"
+            " (id, workspace_id, project_id, start, duration, data)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (_time_entry_row(time_entry) for time_entry in time_entries),
+        )
+
+    def sync_if_stale(
+        self, api: TogglAPI, start_date: datetime, max_age: Union[float, None]
+    ) -> "SQLiteStore":
+        """
+        Sync first if the store is older than ``max_age`` seconds or does not
+        reach back to ``start_date``
+        """
+        hit = self.is_fresh(max_age) and self.covers(start_date)
+        with span("cache.sqlite", hit=hit):
+            if not hit:
+                covered_from = self.covered_from
+                if covered_from is not None and not self.covers(start_date):
+                    # never shrink the history an earlier sync downloaded
+                    start_date = min(start_date, covered_from)
+                self.sync(api, start_date=start_date)
+        return self
+
+    def get_fresh_time_entries_between(
+        self,
+        api: TogglAPI,
+        start_date: datetime,
+        end_date: datetime,
+        max_age: Union[float, None] = None,
+    ) -> List[dict]:
+        """
+        As TimeEntryCache.get_fresh_time_entries_between
+        """
+        self.sync_if_stale(api, start_date=start_date, max_age=max_age)
+        return list(self.iter_time_entries_between(start_date, end_date))
+
+    def iter_time_entries(self) -> Iterator[dict]:
+        for (data,) in self.connection.execute(
+            "SELECT data FROM time_entries ORDER BY start"
+        ):
+            yield json.loads(data)
+
+    def iter_time_entries_between(
+        self, start_date: datetime, end_date: datetime
+    ) -> Iterator[dict]:
+        rows = self.connection.execute(
+            "SELECT data FROM time_entries WHERE start BETWEEN ? AND ? ORDER BY start",
+            (int(start_date.timestamp()), int(end_date.timestamp())),
+        )
+        for (data,) in rows:
+            yield json.loads(data)
+
+    def seconds_worked(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        toggl_filter: Union["TogglFilter", None] = None,
+    ) -> int:
+        """
+        Total duration of the finished time entries passing the filter that
+        started between the dates inclusive, summed in SQL
+        """
+        where, params = _where_clause(start_date, end_date, toggl_filter)
+        with span("sqlite.seconds_worked"):
+            (seconds,) = self.connection.execute(
+                f"SELECT COALESCE(SUM(duration), 0) FROM time_entries WHERE {where}",
+                params,
+            ).fetchone()
+        return seconds
+
+    def totals_by_project(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        toggl_filter: Union["TogglFilter", None] = None,
+    ) -> Dict[Tuple[int, int], int]:
+        """
+        As breakdown.totals_by_project, grouped in SQL
+        """
+        where, params = _where_clause(start_date, end_date, toggl_filter)
+        with span("sqlite.totals_by_project"):
+            rows = self.connection.execute(
+                "SELECT workspace_id, project_id, SUM(duration) FROM time_entries"
+                f" WHERE {where} GROUP BY workspace_id, project_id",
+                params,
+            ).fetchall()
+        return {
+            (workspace_id, project_id): seconds
+            for workspace_id, project_id, seconds in rows
+        }
+
+    def metadata_cache(
+        self, api: TogglAPI, ttl: float = 24 * 60 * 60
+    ) -> "SQLiteMetadataCache":
+        return SQLiteMetadataCache(api, self, ttl=ttl)
+
+
+class SQLiteMetadataCache(MetadataCache):
+    """
+    A MetadataCache kept in a SQLiteStore rather than a JSON file
+    """
+
+    def __init__(self, api: TogglAPI, store: SQLiteStore, ttl: float = 24 * 60 * 60):
+        super().__init__(api, store.path, ttl=ttl)
+        self.store = store
+
+    def load(self):
+        fetched_at = self.store._get_state("metadata_fetched_at")
+        if fetched_at is None:
+            return
+        entities: Dict[str, List[dict]] = {name: [] for name in _METADATA_ENTITIES}
+        # in the order the API returned them
+        for entity, data in self.store.connection.execute(
+            "SELECT entity, data FROM metadata ORDER BY rowid"
+        ):
+            entities[entity].append(json.loads(data))
+        self.fetched_at = float(fetched_at)
+        self.index = TogglMetadataIndex(
+            **{
+                argument: entities[entity]
+                for entity, argument in _METADATA_ENTITIES.items()
+            }
+        )
+
+    def save(self):
+        with self.store._write() as connection:
+            connection.execute("DELETE FROM metadata")
+            connection.executemany(
+                "INSERT INTO metadata (entity, id, data) VALUES (?, ?, ?)",
+                (
+                    (entity, item["id"], json.dumps(item))
+                    for entity, argument in _METADATA_ENTITIES.items()
+                    for item in getattr(self.index, argument)
+                ),
+            )
+            self.store._set_state(
+                connection, "metadata_fetched_at", repr(self.fetched_at)
+            )
+
+    def invalidate(self):
+        self.index = None
+        self.fetched_at = None
+        self.is_refreshed = False
+        with self.store._write() as connection:
+            connection.execute("DELETE FROM metadata")
+            connection.execute("DELETE FROM state WHERE key = 'metadata_fetched_at'")
+
+
+def _time_entry_row(time_entry: dict) -> tuple:
+    record = TimeEntry.from_dict(time_entry)
+    return (
+        record.id,
+        record.workspace_id,
+        record.project_id,
+        record.start,
+        record.duration,
+        json.dumps(time_entry),
+    )
+
+
+def _where_clause(
+    start_date: datetime,
+    end_date: datetime,
+    toggl_filter: Union["TogglFilter", None],
+) -> Tuple[str, list]:
+    """
+    SQL conditions for finished time entries in the date range, passing the
+    filter (the union of its workspaces and projects) if one is given. Each
+    list of ids is bound as one JSON array, so that a filter with thousands
+    of projects stays within SQLite's limit on bound parameters.
+    """
+    clauses = ["start BETWEEN ? AND ?", "duration >= 0"]
+    params: list = [int(start_date.timestamp()), int(end_date.timestamp())]
+    if toggl_filter is not None:
+        included = []
+        for column, ids in [
+            ("workspace_id", toggl_filter.included_workspace_ids),
+            ("project_id", toggl_filter.included_project_ids),
+        ]:
+            if ids:
+                included.append(f"{column} IN (SELECT value FROM json_each(?))")
+                params.append(json.dumps(sorted(ids)))
+        clauses.append(f"({' OR '.join(included)})" if included else "0")
+    return " AND ".join(clauses), params
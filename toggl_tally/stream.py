@@ -0,0 +1,76 @@
+import codecs
+import json
+import re
+from json import JSONDecodeError
+from typing import Any, Iterable, Iterator, Union
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(chunks: Iterable[Union[bytes, str]]) -> Iterator[Any]:
+    """
+    Incrementally decode a JSON array from chunks of a response body, yielding
+    each element as soon as it is complete, so that only one element (plus one
+    chunk) is held in memory at a time
+
+    >>> list(iter_json_array([b'[{"id": 1', b'}, {"id": ', b"2}]"]))
+    [{'id': 1}, {'id': 2}]
+    >>> list(iter_json_array([b"[1", b"23, 4", b"]"]))
+    [123, 4]
+    >>> list(iter_json_array([b"[", b"]"]))
+    []
+    >>> list(iter_json_array([b"null"]))
+    []
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    # one of "[", "first", "value", "separator", "end", or "whole" when the
+    # body isn't an array and has to be decoded in one go
+    expecting = "["
+    for chunk in chunks:
+        buffer += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        if expecting == "whole":
+            continue
+        position = 0
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if expecting == "[":
+                if char != "[":
+                    expecting = "whole"
+                    break
+                position += 1
+                expecting = "first"
+            elif expecting in ("first", "separator") and char == "]":
+                position += 1
+                expecting = "end"
+            elif expecting == "separator":
+                if char != ",":
+                    raise JSONDecodeError("Expecting ',' delimiter", buffer, position)
+                position += 1
+                expecting = "value"
+            elif expecting in ("first", "value"):
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except JSONDecodeError:
+                    # incomplete value, wait for the next chunk
+                    break
+                if end == len(buffer):
+                    # a number could continue in the next chunk
+                    break
+                yield value
+                position = end
+                expecting = "separator"
+            else:
+                raise JSONDecodeError("Extra data", buffer, position)
+        buffer = buffer[position:]
+    buffer += utf8.decode(b"", final=True)
+    if expecting == "whole":
+        value = json.loads(buffer)
+        if value is not None:
+            yield from value
+    elif expecting != "end":
+        raise JSONDecodeError("Unterminated array", buffer, len(buffer))
@@ -1,11 +1,11 @@
 from calendar import monthrange
 from datetime import date, datetime, timedelta, timezone
-from typing import List, Tuple, Union
-
-import holidays
-from dateutil import rrule
+from functools import wraps
+from typing import Any, Callable, List, Tuple, Union
 
 from toggl_tally.time_utils import get_current_datetime
+from toggl_tally.tracing import span
+from toggl_tally.workdays import HolidayIndex, WorkingDayCalendar, shift_to_day
 
 DAY_OF_WEEK = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
 
@@ -28,142 +28,70 @@ class TogglTally(object):
         exclude_public_holidays: bool = True,
     ):
         self.invoice_day_of_month = invoice_day_of_month
+        self.country = country
         self.skip_today = skip_today
         self.timezone = timezone
-        self.working_days = _get_rrule_days(working_days)
-        self._working_day_ints = [DAY_OF_WEEK[day_str] for day_str in working_days]
-        self.public_holidays = holidays.country_holidays(country, years=self.now.year)
+        self._working_day_ints = _get_working_day_ints(working_days)
+        self.public_holidays = HolidayIndex(country)
         self.exclude_public_holidays = exclude_public_holidays
+        holidays_for_year = (
+            self.public_holidays.for_year if exclude_public_holidays else None
+        )
+        self.calendar = WorkingDayCalendar(self._working_day_ints, holidays_for_year)
+        self.weekday_calendar = WorkingDayCalendar(range(5), holidays_for_year)
 
     @property
     def now(self) -> datetime:
         return get_current_datetime(self.timezone)
 
+    def snapshot(self) -> "TallySnapshot":
+        """
+        Capture the current time once, for a consistent set of derived dates
+        """
+        return TallySnapshot(self, now=self.now)
+
     @property
     def next_working_day(self) -> datetime:
-        now = self.now
-        next_working_day = datetime(
-            day=now.day, month=now.month, year=now.year, tzinfo=now.tzinfo
-        )
-        if self.skip_today:
-            next_working_day += timedelta(days=1)
-        return self.get_next_workday_inclusive(next_working_day)
+        return self.snapshot().next_working_day
 
     @property
     def current_month_invoice_date(self) -> datetime:
-        return self.calculate_invoice_date(
-            self.invoice_day_of_month,
-            self.now.month,
-            self.now.year,
-            tzinfo=self.now.tzinfo,
-        )
+        return self.snapshot().current_month_invoice_date
 
     @property
     def last_invoice_date(self) -> datetime:
-        if self.now < self.current_month_invoice_date:
-            return self.calculate_invoice_date(
-                self.invoice_day_of_month,
-                self.now.month - 1,
-                self.now.year,
-                tzinfo=self.now.tzinfo,
-            )
-        else:
-            return self.current_month_invoice_date
+        return self.snapshot().last_invoice_date
 
     @property
     def first_billable_date(self) -> datetime:
-        last_invoice_date = self.last_invoice_date
-        if last_invoice_date.day < self.invoice_day_of_month:
-            # Return the next day
-            return last_invoice_date + timedelta(days=1)
-        else:
-            # Return the last invoice date
-            return last_invoice_date
+        return self.snapshot().first_billable_date
 
     @property
     def next_invoice_date(self) -> datetime:
-        if self.now < self.current_month_invoice_date:
-            return self.current_month_invoice_date
-        else:
-            return self.calculate_invoice_date(
-                self.invoice_day_of_month,
-                self.now.month + 1,
-                self.now.year,
-                tzinfo=self.now.tzinfo,
-            )
+        return self.snapshot().next_invoice_date
 
     @property
     def last_billable_date(self) -> datetime:
-        # should be inclusive if the next invoice date is before the strict invoice date
-        # i.e. you likely want to bill including this day
-        if self.next_invoice_date.day < self.invoice_day_of_month:
-            return self.next_invoice_date
-        return self.get_last_workday_inclusive(
-            self.next_invoice_date - timedelta(days=1)
-        )
-
-    @property
-    def _remaining_working_days(self) -> List[datetime]:
-        return list(
-            rrule.rrule(
-                freq=rrule.DAILY,
-                dtstart=self.next_working_day,
-                until=self.last_billable_date,
-                byweekday=self.working_days,
-            )
-        )
+        return self.snapshot().last_billable_date
 
     @property
     def remaining_working_days(self) -> int:
-        working_days = self._remaining_working_days
-        if self.exclude_public_holidays:
-            return len([day for day in working_days if day not in self.public_holidays])
-        return len(working_days)
+        return self.snapshot().remaining_working_days
 
     @property
     def remaining_public_holidays(self) -> List[Tuple[str, date]]:
-        working_dates = [day.date() for day in self._remaining_working_days]
-        holiday_tuples = []
-        for holiday_date, holiday_name in self.public_holidays.items():
-            if holiday_date in working_dates:
-                holiday_tuples.append((holiday_name, holiday_date))
-        return holiday_tuples
+        return self.snapshot().remaining_public_holidays
 
     def get_last_weekday_inclusive(self, date: datetime) -> datetime:
-        shifted_date = date
-        if self.exclude_public_holidays:
-            while shifted_date.weekday() > 4 or shifted_date in self.public_holidays:
-                shifted_date -= timedelta(days=1)
-        else:
-            while shifted_date.weekday() > 4:
-                shifted_date -= timedelta(days=1)
-        return shifted_date
+        return shift_to_day(
+            date, self.weekday_calendar.previous_working_day(_as_date(date))
+        )
 
     def get_last_workday_inclusive(self, date: datetime) -> datetime:
-        shifted_date = date
-        if self.exclude_public_holidays:
-            while (
-                shifted_date.weekday() not in self._working_day_ints
-                or shifted_date in self.public_holidays
-            ):
-                shifted_date -= timedelta(days=1)
-        else:
-            while shifted_date.weekday() not in self._working_day_ints:
-                shifted_date -= timedelta(days=1)
-        return shifted_date
+        return shift_to_day(date, self.calendar.previous_working_day(_as_date(date)))
 
     def get_next_workday_inclusive(self, date: datetime) -> datetime:
-        shifted_date = date
-        if self.exclude_public_holidays:
-            while (
-                shifted_date.weekday() not in self._working_day_ints
-                or shifted_date in self.public_holidays
-            ):
-                shifted_date += timedelta(days=1)
-        else:
-            while shifted_date.weekday() not in self._working_day_ints:
-                shifted_date += timedelta(days=1)
-        return shifted_date
+        return shift_to_day(date, self.calendar.next_working_day(_as_date(date)))
 
     def calculate_invoice_date(
         self,
@@ -186,16 +114,144 @@ class TogglTally(object):
         return self.get_last_weekday_inclusive(invoice_date)
 
 
-def _get_rrule_days(day_strings: List[str]):
-    rrule_days = []
-    if not day_strings:
-        raise ValueError("Working days should be non-empty")
-    for day_str in day_strings:
+def _memoised_property(method: Callable[["TallySnapshot"], Any]) -> property:
+    name = method.__name__
+
+    @wraps(method)
+    def getter(self: "TallySnapshot"):
         try:
-            rrule_day = getattr(rrule, day_str)
-        except AttributeError:
-            raise ValueError(
-                'Working days should use the codes: ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]'
+            return self._memo[name]
+        except KeyError:
+            with span(f"tally.{name}"):
+                value = self._memo[name] = method(self)
+            return value
+
+    return property(getter)
+
+
+class TallySnapshot(object):
+    """
+    The dates and working days of a TogglTally at a single moment.
+
+    ``now`` is read once, so every value is consistent even if the clock
+    moves on (or past midnight) while they are used, and each value is
+    computed at most once, on first access.
+    """
+
+    __slots__ = ("tally", "now", "_memo")
+
+    def __init__(self, tally: TogglTally, now: datetime):
+        object.__setattr__(self, "tally", tally)
+        object.__setattr__(self, "now", now)
+        object.__setattr__(self, "_memo", {})
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def previous_period(self) -> "TallySnapshot":
+        """
+        A snapshot in the invoice period before this one, at its last moment
+        """
+        return TallySnapshot(
+            self.tally, now=self.last_invoice_date - timedelta(microseconds=1)
+        )
+
+    def _invoice_date(self, months_from_now: int) -> datetime:
+        year, month = _add_months(self.now.year, self.now.month, months_from_now)
+        return self.tally.calculate_invoice_date(
+            self.tally.invoice_day_of_month, month, year, tzinfo=self.now.tzinfo
+        )
+
+    @_memoised_property
+    def next_working_day(self) -> datetime:
+        next_working_day = datetime(
+            day=self.now.day,
+            month=self.now.month,
+            year=self.now.year,
+            tzinfo=self.now.tzinfo,
+        )
+        if self.tally.skip_today:
+            next_working_day += timedelta(days=1)
+        return self.tally.get_next_workday_inclusive(next_working_day)
+
+    @_memoised_property
+    def current_month_invoice_date(self) -> datetime:
+        return self._invoice_date(0)
+
+    @_memoised_property
+    def last_invoice_date(self) -> datetime:
+        if self.now < self.current_month_invoice_date:
+            return self._invoice_date(-1)
+        return self.current_month_invoice_date
+
+    @_memoised_property
+    def first_billable_date(self) -> datetime:
+        last_invoice_date = self.last_invoice_date
+        if last_invoice_date.day < self.tally.invoice_day_of_month:
+            # Return the next day
+            return last_invoice_date + timedelta(days=1)
+        # Return the last invoice date
+        return last_invoice_date
+
+    @_memoised_property
+    def next_invoice_date(self) -> datetime:
+        if self.now < self.current_month_invoice_date:
+            return self.current_month_invoice_date
+        return self._invoice_date(1)
+
+    @_memoised_property
+    def last_billable_date(self) -> datetime:
+        # should be inclusive if the next invoice date is before the strict invoice date
+        # i.e. you likely want to bill including this day
+        next_invoice_date = self.next_invoice_date
+        if next_invoice_date.day < self.tally.invoice_day_of_month:
+            return next_invoice_date
+        return self.tally.get_last_workday_inclusive(
+            next_invoice_date - timedelta(days=1)
+        )
+
+    @_memoised_property
+    def remaining_working_days(self) -> int:
+        return self.tally.calendar.count_working_days(
+            self.next_working_day.date(), self.last_billable_date.date()
+        )
+
+    @_memoised_property
+    def remaining_public_holidays(self) -> List[Tuple[str, date]]:
+        return [
+            (holiday_name, holiday_date)
+            for holiday_name, holiday_date in self.tally.public_holidays.between(
+                self.next_working_day.date(), self.last_billable_date.date()
             )
-        rrule_days.append(rrule_day)
-    return rrule_days
+            if holiday_date.weekday() in self.tally._working_day_ints
+        ]
+
+
+def _add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    """
+    >>> _add_months(2023, 12, 1)
+    (2024, 1)
+    >>> _add_months(2023, 1, -1)
+    (2022, 12)
+    """
+    years, month_index = divmod(month - 1 + months, 12)
+    return year + years, month_index + 1
+
+
+def _as_date(moment: Union[date, datetime]) -> date:
+    return moment.date() if isinstance(moment, datetime) else moment
+
+
+def _get_working_day_ints(day_strings: List[str]) -> List[int]:
+    """
+    >>> _get_working_day_ints(["MO", "WE", "SU"])
+    [0, 2, 6]
+    """
+    if not day_strings:
+        raise ValueError("Working days should be non-empty")
+    try:
+        return [DAY_OF_WEEK[day_str] for day_str in day_strings]
+    except KeyError:
+        raise ValueError(
+            'Working days should use the codes: ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]'
+        )
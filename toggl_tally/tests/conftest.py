@@ -1,8 +1,11 @@
-from unittest.mock import PropertyMock, patch
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
 
 from toggl_tally import TogglFilter, TogglTally
+from toggl_tally.api import TOGGL_API_URL
+from toggl_tally.time_utils import get_current_datetime
 
 
 @pytest.fixture()
@@ -147,3 +150,51 @@ def time_entries():
             "description": "Method X",
         },
     ]
+
+
+@pytest.fixture()
+def started_time_entries(time_entries):
+    return [
+        dict(time_entry, start=f"2023-03-{index + 1:02d}T08:00:00+00:00")
+        for index, time_entry in enumerate(time_entries)
+    ]
+
+
+@pytest.fixture()
+def dated_time_entries(time_entries):
+    # an hour apart from the start of March 2023, with the running time entry
+    # given its own id so that stores keyed by id keep every entry
+    start = datetime(2023, 3, 1, tzinfo=timezone.utc)
+    return [
+        dict(time_entry, id=index, start=(start + timedelta(hours=index)).isoformat())
+        for index, time_entry in enumerate(time_entries)
+    ]
+
+
+@pytest.fixture()
+def api_token(monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+
+
+@pytest.fixture()
+def mock_api(user_projects, user_clients, user_workspaces, time_entries):
+    # time entries started just now, so within every billable period
+    api = MagicMock(base_url=TOGGL_API_URL)
+    api.get_user_projects.return_value = user_projects
+    api.get_user_clients.return_value = user_clients
+    api.get_user_workspaces.return_value = user_workspaces
+    start = get_current_datetime().isoformat()
+    api.get_time_entries_between.return_value = [
+        dict(time_entry, start=start) for time_entry in time_entries
+    ]
+    api.get_time_entries_since.return_value = []
+    return api
+
+
+@pytest.fixture()
+def patched_cli_api(mock_api):
+    mock_api.iter_time_entries_between.return_value = (
+        mock_api.get_time_entries_between.return_value
+    )
+    with patch("toggl_tally.cli.TogglAPI", return_value=mock_api):
+        yield mock_api
@@ -0,0 +1,91 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.time_utils import parse_timestamp
+
+START_DATE = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def history():
+    # one time entry every 6 hours for 90 days, including some starting
+    # exactly on window boundaries
+    return [
+        {
+            "id": index,
+            "workspace_id": 10,
+            "project_id": 1000,
+            "start": (START_DATE + timedelta(hours=6 * index)).isoformat(),
+            "duration": 3600,
+            "at": "2023-04-01T00:00:00+00:00",
+        }
+        for index in range(90 * 4)
+    ]
+
+
+@pytest.fixture()
+def fake_api(history):
+    """
+    A TogglAPI answering time entry requests from the history, with both
+    ends of the range inclusive like the Toggl API
+    """
+    api = TogglAPI(window=timedelta(days=7))
+    api.windows_fetched = []
+    lock = threading.Lock()
+
+    def get_time_entries_window(start_date, end_date):
+        with lock:
+            api.windows_fetched.append((start_date, end_date))
+        return [
+            time_entry
+            for time_entry in history
+            if start_date <= parse_timestamp(time_entry["start"]) <= end_date
+        ]
+
+    api._get_time_entries_window = get_time_entries_window
+    return api
+
+
+def test_time_entries_fetched_in_windows(fake_api, history):
+    end_date = START_DATE + timedelta(days=90)
+    assert fake_api.get_time_entries_between(START_DATE, end_date) == history
+    assert len(fake_api.windows_fetched) == 13
+
+
+def test_time_entries_iterated_in_windows(fake_api, history):
+    end_date = START_DATE + timedelta(days=90)
+    assert list(fake_api.iter_time_entries_between(START_DATE, end_date)) == history
+    assert len(fake_api.windows_fetched) == 13
+
+
+def test_time_entries_within_window_fetched_at_once(fake_api, history):
+    end_date = START_DATE + timedelta(days=7)
+    assert fake_api.get_time_entries_between(START_DATE, end_date) == history[:29]
+    assert fake_api.windows_fetched == [(START_DATE, end_date)]
+
+
+def test_truncated_windows_split(fake_api, history):
+    fake_api.max_window_entries = 10
+    end_date = START_DATE + timedelta(days=30)
+    assert fake_api.get_time_entries_between(START_DATE, end_date) == history[:121]
+    assert max(end - start for start, end in fake_api.windows_fetched) <= timedelta(
+        days=7
+    )
+    assert min(end - start for start, end in fake_api.windows_fetched) < timedelta(
+        days=2
+    )
+
+
+def test_duplicate_time_entries_keep_latest_update(fake_api, history):
+    # the time entry on the window boundary changed between window requests
+    boundary_entry = history[28]
+    updated_entry = dict(boundary_entry, duration=7200, at="2023-04-02T00:00:00+00:00")
+    responses = iter([[boundary_entry], [updated_entry], [boundary_entry]])
+    fake_api._get_time_entries_window = lambda start_date, end_date: next(responses)
+    time_entries = fake_api.get_time_entries_between(
+        START_DATE, START_DATE + timedelta(days=21)
+    )
+    assert time_entries == [updated_entry]
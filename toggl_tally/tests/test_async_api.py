@@ -0,0 +1,138 @@
+import asyncio
+import json
+import re
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from requests.exceptions import HTTPError
+
+pytest.importorskip("aiohttp")
+
+from toggl_tally.async_api import AsyncTogglAPI  # noqa: E402
+
+
+@pytest.fixture()
+def fake_toggl_server(user_projects, user_clients, user_workspaces, time_entries):
+    responses = {
+        "/me/projects": user_projects,
+        "/me/clients": user_clients,
+        "/me/workspaces": user_workspaces,
+        "/me/time_entries": time_entries,
+    }
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            requests_seen.append((url.path, parse_qs(url.query)))
+            if url.path == "/me/bad_request":
+                self._send(400, b"invalid start_date")
+            elif url.path == "/me/rate_limited" and len(requests_seen) == 1:
+                self._send(429, b"slow down", {"Retry-After": "0"})
+            elif url.path == "/me/rate_limited":
+                self._send(200, b"[]")
+            elif url.path in responses:
+                self._send(200, json.dumps(responses[url.path]).encode())
+            else:
+                self._send(404, b"not found")
+
+        def _send(self, status, body, headers={}):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.requests_seen = requests_seen
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_toggl_api_gathers_requests(
+    fake_toggl_server, api_token, user_projects, user_clients, user_workspaces
+):
+    async def fetch_metadata():
+        async with AsyncTogglAPI(base_url=fake_toggl_server.base_url) as api:
+            return await asyncio.gather(
+                api.get_user_projects(),
+                api.get_user_clients(),
+                api.get_user_workspaces(),
+            )
+
+    assert asyncio.run(fetch_metadata()) == [
+        user_projects,
+        user_clients,
+        user_workspaces,
+    ]
+
+
+def test_async_toggl_api_time_entries_params(
+    fake_toggl_server, api_token, time_entries
+):
+    async def fetch_time_entries():
+        async with AsyncTogglAPI(base_url=fake_toggl_server.base_url) as api:
+            return await api.get_time_entries_between(
+                start_date=datetime(2023, 3, 1, tzinfo=timezone.utc),
+                end_date=datetime(2023, 3, 31, tzinfo=timezone.utc),
+            )
+
+    assert asyncio.run(fetch_time_entries()) == time_entries
+    assert fake_toggl_server.requests_seen == [
+        (
+            "/me/time_entries",
+            {
+                "start_date": ["2023-03-01T00:00:00+00:00"],
+                "end_date": ["2023-03-31T00:00:00+00:00"],
+            },
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "path,expected_error",
+    [
+        pytest.param(
+            "/me/bad_request",
+            "400 Client Error: invalid start_date for url: {base_url}/me/bad_request",
+            id="bad_request_detail",
+        ),
+        pytest.param(
+            "/me/missing",
+            "404 Client Error: Not Found for url: {base_url}/me/missing",
+            id="not_found",
+        ),
+    ],
+)
+def test_async_toggl_api_errors(fake_toggl_server, api_token, path, expected_error):
+    async def fetch():
+        async with AsyncTogglAPI(base_url=fake_toggl_server.base_url) as api:
+            return await api._call_toggl_api(f"{api.base_url}{path}")
+
+    exception_match_str = re.escape(
+        expected_error.format(base_url=fake_toggl_server.base_url)
+    )
+    with pytest.raises(HTTPError, match=exception_match_str):
+        asyncio.run(fetch())
+
+
+def test_async_toggl_api_retries_rate_limited_requests(fake_toggl_server, api_token):
+    async def fetch():
+        async with AsyncTogglAPI(base_url=fake_toggl_server.base_url) as api:
+            return await api._call_toggl_api(f"{api.base_url}/me/rate_limited")
+
+    assert asyncio.run(fetch()) == []
+    assert len(fake_toggl_server.requests_seen) == 2
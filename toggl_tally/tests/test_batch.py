@@ -0,0 +1,180 @@
+import json
+import re
+from datetime import datetime, timezone
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.batch import (
+    HoursConfig,
+    SharedData,
+    evaluate_configs,
+    load_batch_configs,
+)
+from toggl_tally.cli import toggl_tally
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.filter import TogglFilter
+from toggl_tally.metadata import MetadataCache
+from toggl_tally.tally import TallySnapshot
+from toggl_tally.time_utils import get_current_datetime, parse_timestamp
+
+BATCH_CONFIGS = {
+    "supercorp": dict(
+        hours_per_month=160, invoice_day=1, country="ZA", clients=["Supercorp"]
+    ),
+    "megacorp": dict(
+        hours_per_month=80,
+        invoice_day=10,
+        country="ZA",
+        clients="Megacorp",
+        projects=["Course work"],
+    ),
+    "alternate": dict(
+        hours_per_month=40,
+        invoice_day=5,
+        country="GB",
+        workspaces=["Alternate workspace"],
+        working_days=["MO", "WE"],
+    ),
+}
+
+
+@pytest.mark.parametrize(
+    "config, exception_match_str",
+    [
+        pytest.param(
+            dict(hours_per_month=160, invoice_day=1, country="ZA", client=["Foo"]),
+            "Unknown keys ['client'] in batch config foo",
+            id="unknown_key",
+        ),
+        pytest.param(
+            dict(hours_per_month=160),
+            "Missing keys ['invoice_day', 'country'] in batch config foo",
+            id="missing_keys",
+        ),
+    ],
+)
+def test_hours_config_fails_for_invalid_config(config, exception_match_str):
+    with pytest.raises(ValueError, match=re.escape(exception_match_str)):
+        HoursConfig.from_dict("foo", config)
+
+
+@pytest.mark.parametrize(
+    "processes",
+    [pytest.param(None, id="serial"), pytest.param(2, id="process_pool")],
+)
+def test_evaluate_configs_matches_individual_runs(
+    processes, started_time_entries, user_projects, user_clients, user_workspaces
+):
+    configs = load_batch_configs(
+        dict(BATCH_CONFIGS, missing=dict(BATCH_CONFIGS["supercorp"], clients=["Nope"]))
+    )
+    now = datetime(2023, 3, 31, 12, tzinfo=timezone.utc)
+    shared = SharedData(
+        time_entries=TimeEntryBatch.from_dicts(started_time_entries),
+        user_projects=user_projects,
+        user_clients=user_clients,
+        user_workspaces=user_workspaces,
+    )
+    results = evaluate_configs(
+        configs, nows=[now] * len(configs), shared=shared, processes=processes
+    )
+    assert [result["name"] for result in results] == [
+        "supercorp",
+        "megacorp",
+        "alternate",
+        "missing",
+    ]
+    assert results[-1]["error"] == "Client name Nope not found in user clients"
+    for config, result in zip(configs[:-1], results):
+        snapshot = TallySnapshot(config.make_tally(), now=now)
+        toggl_filter = TogglFilter(
+            api=TogglAPI(),
+            projects=config.projects,
+            clients=config.clients,
+            workspaces=config.workspaces,
+            user_projects=user_projects,
+            user_clients=user_clients,
+            user_workspaces=user_workspaces,
+        )
+        expected_seconds_worked = sum(
+            time_entry["duration"]
+            for time_entry in toggl_filter.filter_time_entries(started_time_entries)
+            if parse_timestamp(time_entry["start"]) >= snapshot.first_billable_date
+        )
+        assert result["seconds_worked"] == expected_seconds_worked
+        assert result["remaining_working_days"] == snapshot.remaining_working_days
+        assert result["next_invoice_date"] == snapshot.next_invoice_date.isoformat()
+    assert [result["seconds_worked"] for result in results[:-1]] == [
+        16300,
+        1400,
+        1800,
+    ]
+
+
+def test_batch_command_fetches_once(tmp_path, patched_cli_api):
+    batch_file = tmp_path / "batch.yml"
+    batch_file.write_text(json.dumps(BATCH_CONFIGS))
+    result = CliRunner().invoke(toggl_tally, ["batch", str(batch_file), "--json"])
+    assert result.exit_code == 0, result.output
+    results = json.loads(result.stdout)["configs"]
+    assert {result["name"]: result["seconds_worked"] for result in results} == {
+        "supercorp": 16300,
+        "megacorp": 1400 + 1800 + 1600,
+        "alternate": 1800,
+    }
+    patched_cli_api.iter_time_entries_between.assert_called_once()
+    patched_cli_api.get_user_projects.assert_called_once()
+
+
+def test_batch_command_refreshes_stale_metadata_once(
+    tmp_path, monkeypatch, patched_cli_api, time_entries, user_projects
+):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    new_project = {
+        "name": "New project",
+        "id": 1050,
+        "workspace_id": 10,
+        "client_id": None,
+    }
+    batch_file = tmp_path / "batch.yml"
+    batch_file.write_text(
+        json.dumps(
+            dict(
+                BATCH_CONFIGS,
+                newer=dict(
+                    hours_per_month=10,
+                    invoice_day=1,
+                    country="ZA",
+                    projects=["New project"],
+                ),
+            )
+        )
+    )
+    api = patched_cli_api
+    start = get_current_datetime().isoformat()
+    api.iter_time_entries_between.return_value = [
+        dict(time_entry, start=start) for time_entry in time_entries
+    ] + [dict(time_entries[0], id=1, project_id=1050, start=start)]
+    # fill the metadata cache before the new project exists
+    MetadataCache.for_user(api).get_index()
+    api.get_user_projects.return_value = user_projects + [new_project]
+    result = CliRunner().invoke(
+        toggl_tally,
+        [
+            "batch",
+            str(batch_file),
+            "--json",
+            "--processes=2",
+            "--metadata-ttl=3600",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    results = {
+        result["name"]: result for result in json.loads(result.stdout)["configs"]
+    }
+    assert "error" not in results["newer"]
+    assert results["newer"]["seconds_worked"] == time_entries[0]["duration"]
+    assert api.get_user_projects.call_count == 2
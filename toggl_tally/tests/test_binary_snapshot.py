@@ -0,0 +1,182 @@
+import json
+import pickle
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.binary_snapshot import (
+    IncompatibleSnapshot,
+    MappedTimeEntryBatch,
+    get_fresh_time_entry_batch,
+    snapshot_path,
+    write_snapshot,
+)
+from toggl_tally.cache import TimeEntryCache
+from toggl_tally.cli import toggl_tally
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.time_utils import get_current_datetime
+
+START = datetime(2023, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def snapshot_file(tmp_path, dated_time_entries):
+    path = tmp_path / "time_entries.bin"
+    # in reverse order of start, which the snapshot sorts
+    write_snapshot(
+        path,
+        TimeEntryBatch.from_dicts(dated_time_entries[::-1]),
+        last_sync=int(time.time()),
+        covered_from=START - timedelta(days=1),
+    )
+    return path
+
+
+def test_snapshot_round_trip(snapshot_file, dated_time_entries):
+    with MappedTimeEntryBatch.open(snapshot_file) as batch:
+        assert list(batch) == list(TimeEntryBatch.from_dicts(dated_time_entries))
+        assert batch.is_fresh(max_age=60)
+        assert batch.covers(START - timedelta(days=1))
+        assert not batch.covers(START - timedelta(days=2))
+
+
+def test_snapshot_numpy_views_are_zero_copy(snapshot_file, dated_time_entries):
+    pytest.importorskip("numpy")
+    batch = MappedTimeEntryBatch.open(snapshot_file)
+    columns = batch.to_numpy()
+    assert not columns["duration"].flags.owndata
+    assert not columns["duration"].flags.writeable
+    assert columns["duration"][columns["duration"] >= 0].sum() == (
+        TimeEntryBatch.from_dicts(dated_time_entries).total_duration()
+    )
+
+
+def test_snapshot_between(snapshot_file, dated_time_entries):
+    batch = MappedTimeEntryBatch.open(snapshot_file)
+    selected = batch.between(START + timedelta(hours=1), START + timedelta(hours=3))
+    assert sorted(selected.columns["id"]) == sorted(
+        time_entry["id"] for time_entry in dated_time_entries[1:4]
+    )
+
+
+def test_snapshot_pickles_as_copy(snapshot_file):
+    batch = MappedTimeEntryBatch.open(snapshot_file)
+    copy = pickle.loads(pickle.dumps(batch))
+    assert type(copy) is TimeEntryBatch
+    assert list(copy) == list(batch)
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        pytest.param(lambda data: b"", id="empty"),
+        pytest.param(lambda data: data[:-8], id="truncated"),
+        pytest.param(
+            lambda data: data[:4] + struct.pack("<H", 99) + data[6:], id="version"
+        ),
+        pytest.param(lambda data: b"{}" + data[2:], id="json"),
+    ],
+)
+def test_incompatible_snapshot(snapshot_file, corrupt):
+    snapshot_file.write_bytes(corrupt(snapshot_file.read_bytes()))
+    with pytest.raises(IncompatibleSnapshot):
+        MappedTimeEntryBatch.open(snapshot_file)
+
+
+def test_get_fresh_time_entry_batch(tmp_path, mock_api):
+    api = mock_api
+    now = get_current_datetime()
+    kwargs = dict(
+        start_date=now - timedelta(days=1),
+        end_date=now,
+        max_age=3600,
+        cache_dir=tmp_path,
+        api_token="secret",
+    )
+    batch = get_fresh_time_entry_batch(api, **kwargs)
+    api.get_time_entries_between.assert_called_once()
+    path = snapshot_path(TimeEntryCache.path_for_user(tmp_path, "secret"))
+    assert path.exists()
+    # the JSON cache isn't read while the snapshot is fresh
+    TimeEntryCache.path_for_user(tmp_path, "secret").unlink()
+    mapped = get_fresh_time_entry_batch(api, **kwargs)
+    assert isinstance(mapped, MappedTimeEntryBatch)
+    assert sorted(mapped, key=lambda time_entry: time_entry.id) == sorted(
+        batch, key=lambda time_entry: time_entry.id
+    )
+    api.get_time_entries_between.assert_called_once()
+
+
+def test_incompatible_snapshot_is_rebuilt(tmp_path, mock_api, time_entries):
+    api = mock_api
+    now = get_current_datetime()
+    path = snapshot_path(TimeEntryCache.path_for_user(tmp_path, "secret"))
+    path.write_bytes(b"not a snapshot")
+    kwargs = dict(
+        start_date=now - timedelta(days=1),
+        end_date=now,
+        max_age=3600,
+        cache_dir=tmp_path,
+        api_token="secret",
+    )
+    get_fresh_time_entry_batch(api, **kwargs)
+    # the running time entry replaces the finished one with its id
+    assert len(MappedTimeEntryBatch.open(path)) == len(time_entries) - 1
+
+
+def test_cache_created_for_snapshot_has_rollup_timezone(
+    tmp_path, monkeypatch, api_token, patched_cli_api
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    result = CliRunner().invoke(
+        toggl_tally,
+        [
+            "history",
+            "--hours-per-month=160",
+            "--invoice-day=15",
+            "--country=ZA",
+            "--timezone=Africa/Johannesburg",
+            "--max-cache-age=3600",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # so hours and breakdown in the same timezone can use the rollup
+    cache = TimeEntryCache.for_user(timezone="Africa/Johannesburg")
+    assert cache.rollup.timezone == "Africa/Johannesburg"
+
+
+def test_history_from_snapshot_matches_api(
+    tmp_path, monkeypatch, api_token, patched_cli_api, time_entries
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    now = get_current_datetime().isoformat()
+    # the running time entry shares its id with a finished one
+    patched_cli_api.iter_time_entries_between.return_value = (
+        patched_cli_api.get_time_entries_between.return_value
+    ) = [
+        dict(time_entry, start=now)
+        for time_entry in time_entries
+        if time_entry["duration"] >= 0
+    ]
+    outputs = []
+    for cache_args in [[], ["--max-cache-age=3600"], ["--max-cache-age=3600"]]:
+        patched_cli_api.reset_mock()
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                "history",
+                "--hours-per-month=160",
+                "--invoice-day=15",
+                "--country=ZA",
+                "--clients=Supercorp",
+                "--json",
+                *cache_args,
+            ],
+        )
+        assert result.exit_code == 0, result.output
+        outputs.append(json.loads(result.stdout))
+    patched_cli_api.get_time_entries_between.assert_not_called()
+    assert outputs[0] == outputs[1] == outputs[2]
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.breakdown import breakdown, iter_breakdown_rows, totals_by_project
+from toggl_tally.cli import toggl_tally
+from toggl_tally.metadata import TogglMetadataIndex
+
+
+def test_breakdown_groups_by_workspace_client_and_project(
+    user_projects, user_clients, user_workspaces, time_entries
+):
+    index = TogglMetadataIndex(user_projects, user_clients, user_workspaces)
+    result = breakdown(totals_by_project(time_entries), index)
+    assert result["seconds"] == 22900
+    assert [
+        (depth, name, seconds) for depth, name, seconds in iter_breakdown_rows(result)
+    ] == [
+        (0, "John Doe's workspace", 21100),
+        (1, "Supercorp", 16300),
+        (2, "Doohickey design", 10800),
+        (2, "Foo implementation", 3600),
+        (2, "Bar implementation", 1900),
+        (1, "(no client)", 3400),
+        (2, "Course work", 3400),
+        (1, "Megacorp", 1400),
+        (2, "Baz refactoring", 1400),
+        (0, "Alternate workspace", 1800),
+        (1, "Hypermart", 1800),
+        (2, "Project X", 1800),
+    ]
+
+
+@pytest.mark.parametrize(
+    "filter_args,expected_seconds,expected_clients",
+    [
+        pytest.param(
+            [], 22900, ["Supercorp", "(no client)", "Megacorp", "Hypermart"], id="all"
+        ),
+        pytest.param(["--clients=Supercorp"], 16300, ["Supercorp"], id="client"),
+        pytest.param(
+            ["--workspaces=Alternate workspace", "--projects=Baz refactoring"],
+            3200,
+            ["Hypermart", "Megacorp"],
+            id="union",
+        ),
+    ],
+)
+def test_breakdown_command(
+    filter_args,
+    expected_seconds,
+    expected_clients,
+    patched_cli_api,
+):
+    result = CliRunner().invoke(
+        toggl_tally,
+        ["breakdown", "--invoice-day=15", "--country=ZA", "--json", *filter_args],
+    )
+    assert result.exit_code == 0, result.output
+    patched_cli_api.iter_time_entries_between.assert_called_once()
+    document = json.loads(result.stdout)
+    assert document["seconds"] == expected_seconds
+    assert [
+        client["name"]
+        for workspace in document["workspaces"]
+        for client in workspace["clients"]
+    ] == expected_clients
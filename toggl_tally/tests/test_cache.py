@@ -0,0 +1,112 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from toggl_tally.cache import TimeEntryCache
+
+
+@pytest.fixture()
+def cached_time_entries():
+    return [
+        {
+            "id": 1,
+            "workspace_id": 10,
+            "project_id": 1000,
+            "duration": 3600,
+            "start": "2023-03-01T08:00:00+00:00",
+        },
+        {
+            "id": 2,
+            "workspace_id": 10,
+            "project_id": 1030,
+            "duration": 1800,
+            "start": "2023-03-02T08:00:00+00:00",
+        },
+        {
+            "id": 3,
+            "workspace_id": 11,
+            "project_id": 1001,
+            "duration": 1800,
+            "start": "2023-03-03T08:00:00+00:00",
+        },
+    ]
+
+
+@pytest.fixture()
+def mock_api(mock_api, cached_time_entries):
+    mock_api.get_time_entries_between.return_value = cached_time_entries
+    return mock_api
+
+
+def test_time_entry_cache_full_sync(tmp_path, mock_api, cached_time_entries):
+    cache = TimeEntryCache(tmp_path / "cache.json")
+    start_date = datetime(2023, 3, 1, tzinfo=timezone.utc)
+    assert cache.sync(mock_api, start_date=start_date) == 3
+    cache.save()
+    mock_api.get_time_entries_since.assert_not_called()
+    reloaded_cache = TimeEntryCache(tmp_path / "cache.json")
+    assert reloaded_cache.covers(start_date)
+    assert reloaded_cache.is_fresh(max_age=60)
+    assert reloaded_cache.entries == cache.entries
+    assert (
+        reloaded_cache.get_time_entries_between(
+            start_date, datetime(2023, 3, 4, tzinfo=timezone.utc)
+        )
+        == cached_time_entries
+    )
+
+
+def test_time_entry_cache_incremental_sync(tmp_path, mock_api, cached_time_entries):
+    cache = TimeEntryCache(tmp_path / "cache.json")
+    start_date = datetime(2023, 3, 1, tzinfo=timezone.utc)
+    cache.sync(mock_api, start_date=start_date)
+    last_sync = cache.last_sync
+    updated_entry = dict(cached_time_entries[0], duration=7200)
+    deleted_entry = dict(cached_time_entries[1], server_deleted_at="2023-03-05")
+    new_entry = dict(cached_time_entries[2], id=4, start="2023-03-04T08:00:00Z")
+    mock_api.get_time_entries_since.return_value = [
+        updated_entry,
+        deleted_entry,
+        new_entry,
+    ]
+    cache.sync(mock_api, start_date=start_date)
+    mock_api.get_time_entries_between.assert_called_once()
+    mock_api.get_time_entries_since.assert_called_once_with(since=last_sync)
+    assert cache.get_time_entries_between(
+        start_date, datetime(2023, 3, 5, tzinfo=timezone.utc)
+    ) == [updated_entry, cached_time_entries[2], new_entry]
+
+
+def test_time_entry_cache_resyncs_when_range_not_covered(tmp_path, mock_api):
+    cache = TimeEntryCache(tmp_path / "cache.json")
+    cache.sync(mock_api, start_date=datetime(2023, 3, 1, tzinfo=timezone.utc))
+    earlier_start_date = datetime(2023, 2, 1, tzinfo=timezone.utc)
+    assert not cache.covers(earlier_start_date)
+    cache.sync(mock_api, start_date=earlier_start_date)
+    assert mock_api.get_time_entries_between.call_count == 2
+    mock_api.get_time_entries_since.assert_not_called()
+    assert cache.covered_from == earlier_start_date
+
+
+def test_time_entry_cache_skips_network_when_fresh(tmp_path, mock_api):
+    cache = TimeEntryCache(tmp_path / "cache.json")
+    start_date = datetime(2023, 3, 1, tzinfo=timezone.utc)
+    end_date = datetime(2023, 3, 2, 12, tzinfo=timezone.utc)
+    cache.get_fresh_time_entries_between(mock_api, start_date, end_date, max_age=60)
+    time_entries = TimeEntryCache(
+        tmp_path / "cache.json"
+    ).get_fresh_time_entries_between(mock_api, start_date, end_date, max_age=60)
+    assert [entry["id"] for entry in time_entries] == [1, 2]
+    mock_api.get_time_entries_between.assert_called_once()
+    mock_api.get_time_entries_since.assert_not_called()
+
+
+def test_time_entry_cache_ignores_incompatible_version(tmp_path, mock_api):
+    cache = TimeEntryCache(tmp_path / "cache.json")
+    cache.sync(mock_api, start_date=datetime(2023, 3, 1, tzinfo=timezone.utc))
+    cache.version = 0
+    cache.save()
+    reloaded_cache = TimeEntryCache(tmp_path / "cache.json")
+    assert reloaded_cache.entries == {}
+    assert not reloaded_cache.is_fresh(max_age=time.time())
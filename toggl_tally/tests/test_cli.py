@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+import toggl_tally
+from toggl_tally.cache import TimeEntryCache
+from toggl_tally.daemon import DaemonClient, TallyDaemon
+from toggl_tally.metadata import MetadataCache
+from toggl_tally.time_utils import get_current_datetime
+
+HEAVY_MODULES = ["requests", "holidays", "dateutil.rrule", "yaml", "rich", "numpy"]
+# cumulative `python -X importtime` microseconds for importing toggl_tally.cli,
+# which was over 300ms when everything was imported eagerly
+IMPORT_TIME_BUDGET_US = 200_000
+CLI_IMPORT_TIME = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| toggl_tally\.cli$")
+
+
+def run_toggl_tally(args, env=None):
+    """
+    Run the CLI in a fresh interpreter, returning its stdout, the modules it
+    imported and the cumulative import time of toggl_tally.cli
+    """
+    script = "\n".join(
+        [
+            "import json, sys",
+            "from toggl_tally.cli import toggl_tally",
+            "try:",
+            f"    toggl_tally({args!r})",
+            "except SystemExit as exit:",
+            "    assert not exit.code, exit.code",
+            "print(json.dumps(sorted(sys.modules)), file=sys.stderr)",
+        ]
+    )
+    env = dict(os.environ if env is None else env)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(Path(toggl_tally.__file__).parents[1]), env.get("PYTHONPATH", "")]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stderr
+    *import_times, modules = result.stderr.strip().splitlines()
+    cli_import_time = None
+    for line in import_times:
+        match = CLI_IMPORT_TIME.match(line)
+        if match:
+            cli_import_time = int(match.group(1))
+    assert (
+        cli_import_time is not None
+    ), "No -X importtime line for toggl_tally.cli in stderr"
+    return result.stdout, json.loads(modules), cli_import_time
+
+
+def test_help_skips_heavy_imports():
+    stdout, modules, cli_import_time = run_toggl_tally(["--help"])
+    assert "Get remaining daily hours" in stdout
+    assert [module for module in HEAVY_MODULES if module in modules] == []
+    assert cli_import_time < IMPORT_TIME_BUDGET_US
+
+
+def test_hours_from_fresh_caches_skips_requests(
+    tmp_path, monkeypatch, api_token, mock_api
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    MetadataCache.for_user(mock_api).refresh()
+    time_entry_cache = TimeEntryCache.for_user()
+    time_entry_cache.sync(
+        mock_api, start_date=get_current_datetime() - timedelta(days=62)
+    )
+    time_entry_cache.save()
+
+    stdout, modules, _ = run_toggl_tally(
+        [
+            "hours",
+            "--hours-per-month=160",
+            "--invoice-day=15",
+            "--country=ZA",
+            "--clients=Supercorp",
+            "--max-cache-age=3600",
+            "--metadata-ttl=3600",
+        ]
+    )
+    assert "hours worked since last invoice" in stdout
+    assert "requests" not in modules
+
+
+def test_hours_via_daemon_skips_heavy_imports(
+    tmp_path, monkeypatch, api_token, mock_api
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    tally_daemon = TallyDaemon.for_user(mock_api, refresh_interval=60 * 60)
+    thread = threading.Thread(target=tally_daemon.serve_forever)
+    thread.start()
+    try:
+        while not DaemonClient(tally_daemon.socket_path).ping():
+            time.sleep(0.01)
+        stdout, modules, _ = run_toggl_tally(
+            [
+                "hours",
+                "--hours-per-month=160",
+                "--invoice-day=15",
+                "--country=ZA",
+                "--clients=Supercorp",
+            ]
+        )
+    finally:
+        tally_daemon.shutdown()
+        thread.join()
+    assert "hours worked since last invoice" in stdout
+    assert [module for module in ["requests", "holidays"] if module in modules] == []
+    # without --max-cache-age, the daemon syncs before answering
+    mock_api.get_time_entries_since.assert_called_once()
+
+
+@pytest.mark.parametrize("name", toggl_tally.__all__)
+def test_lazy_public_imports(name):
+    assert getattr(toggl_tally, name).__name__ == name
@@ -0,0 +1,148 @@
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+from toggl_tally.api import TOGGL_API_URL
+from toggl_tally.cache import TimeEntryCache, user_cache_key
+from toggl_tally.daemon import DaemonClient, DaemonUnavailable, TallyDaemon
+from toggl_tally.metadata import MetadataCache
+
+HOURS_CONFIG = dict(
+    hours_per_month=160, invoice_day=1, country="ZA", clients=["Supercorp"]
+)
+# the running time entry shares an id with a finished one, which it replaces
+# in the daemon's time entries
+SUPERCORP_SECONDS = 16300 - 1900
+
+
+@pytest.fixture()
+def running_daemon(tmp_path, mock_api):
+    tally_daemon = TallyDaemon(
+        mock_api,
+        socket_path=tmp_path / "serve.sock",
+        time_entry_cache=TimeEntryCache(tmp_path / "time_entries.json"),
+        metadata_cache=MetadataCache(mock_api, tmp_path / "metadata.json"),
+        refresh_interval=60 * 60,
+    )
+    thread = threading.Thread(target=tally_daemon.serve_forever)
+    thread.start()
+    client = DaemonClient(tally_daemon.socket_path)
+    deadline = time.monotonic() + 10
+    while not client.ping() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield tally_daemon
+    tally_daemon.shutdown()
+    thread.join()
+
+
+def test_daemon_answers_hours_from_warm_state(running_daemon, mock_api):
+    client = DaemonClient(running_daemon.socket_path)
+    for _ in range(3):
+        result = client.hours(HOURS_CONFIG)
+        assert result["seconds_worked"] == SUPERCORP_SECONDS
+    mock_api.get_time_entries_between.assert_called_once()
+    mock_api.get_user_projects.assert_called_once()
+    assert len(running_daemon._tallies) == 1
+
+
+def test_daemon_socket_is_private(running_daemon):
+    socket_mode = stat.S_IMODE(running_daemon.socket_path.stat().st_mode)
+    # only the owner can connect
+    assert not socket_mode & 0o077
+
+
+def test_daemon_refresh_syncs_changes(running_daemon, mock_api):
+    mock_api.get_time_entries_since.return_value = [
+        {"id": 1000001, "server_deleted_at": "2023-03-01T08:00:00+00:00"}
+    ]
+    running_daemon.refresh()
+    result = DaemonClient(running_daemon.socket_path).hours(HOURS_CONFIG)
+    assert result["seconds_worked"] == SUPERCORP_SECONDS - 3600
+
+
+def test_daemon_reports_unknown_filter_names(running_daemon):
+    client = DaemonClient(running_daemon.socket_path)
+    with pytest.raises(ValueError, match="Client name Nope not found in user clients"):
+        client.hours(dict(HOURS_CONFIG, clients=["Nope"]))
+    # the daemon keeps serving after an error
+    assert client.hours(HOURS_CONFIG)["seconds_worked"] == SUPERCORP_SECONDS
+
+
+def test_daemon_client_unavailable_without_daemon(tmp_path):
+    client = DaemonClient(tmp_path / "serve.sock")
+    assert not client.ping()
+    with pytest.raises(DaemonUnavailable):
+        client.hours(HOURS_CONFIG)
+
+
+def test_daemon_refreshes_state_older_than_requested(running_daemon, mock_api):
+    client = DaemonClient(running_daemon.socket_path)
+    client.hours(HOURS_CONFIG, max_age=60 * 60, metadata_ttl=60 * 60)
+    mock_api.get_time_entries_since.assert_not_called()
+    mock_api.get_user_projects.assert_called_once()
+    result = client.hours(HOURS_CONFIG, max_age=-1, metadata_ttl=-1)
+    assert result["seconds_worked"] == SUPERCORP_SECONDS
+    mock_api.get_time_entries_since.assert_called_once()
+    assert mock_api.get_user_projects.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        pytest.param(dict(api_url="http://127.0.0.1:8080/api/v9"), id="api_url"),
+        pytest.param(dict(store="sqlite"), id="store"),
+    ],
+)
+def test_daemon_unavailable_for_other_sources(running_daemon, options):
+    client = DaemonClient(running_daemon.socket_path)
+    assert client.hours(HOURS_CONFIG, api_url=TOGGL_API_URL, store="json")
+    with pytest.raises(DaemonUnavailable):
+        client.hours(HOURS_CONFIG, **options)
+
+
+def test_daemon_client_unavailable_when_daemon_hangs(tmp_path):
+    socket_path = tmp_path / "serve.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        # accepts connections but never answers
+        sock.bind(str(socket_path))
+        sock.listen()
+        client = DaemonClient(socket_path, timeout=0.1)
+        with pytest.raises(DaemonUnavailable):
+            client.hours(HOURS_CONFIG)
+
+
+def test_daemon_reads_from_sqlite_store(tmp_path, api_token, mock_api):
+    tally_daemon = TallyDaemon.for_user(
+        mock_api,
+        socket_path=tmp_path / "serve.sock",
+        cache_dir=tmp_path,
+        store="sqlite",
+        refresh_interval=60 * 60,
+    )
+    thread = threading.Thread(target=tally_daemon.serve_forever)
+    thread.start()
+    try:
+        client = DaemonClient(tally_daemon.socket_path)
+        while not client.ping():
+            time.sleep(0.01)
+        result = client.hours(HOURS_CONFIG, store="sqlite")
+        with pytest.raises(DaemonUnavailable):
+            client.hours(HOURS_CONFIG, store="json")
+    finally:
+        tally_daemon.shutdown()
+        thread.join()
+    assert result["seconds_worked"] == SUPERCORP_SECONDS
+    assert len(tally_daemon.time_entry_cache) == len(tally_daemon.time_entries)
+    assert not (tmp_path / f"time_entries_{user_cache_key('secret')}.json").exists()
+
+
+def test_daemon_creates_cache_with_rollup_timezone(tmp_path, api_token, mock_api):
+    tally_daemon = TallyDaemon.for_user(
+        mock_api, cache_dir=tmp_path, timezone="Africa/Johannesburg"
+    )
+    tally_daemon.refresh()
+    cache = TimeEntryCache.for_user(tmp_path, timezone="Africa/Johannesburg")
+    assert cache.rollup.timezone == "Africa/Johannesburg"
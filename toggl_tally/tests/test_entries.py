@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import pytest
+
+from toggl_tally.aggregate import DurationAggregator
+from toggl_tally.entries import TimeEntry, TimeEntryBatch
+
+
+def test_time_entry_batch_round_trip(started_time_entries):
+    batch = TimeEntryBatch.from_dicts(started_time_entries)
+    assert len(batch) == len(started_time_entries)
+    assert list(batch) == [
+        TimeEntry.from_dict(time_entry) for time_entry in started_time_entries
+    ]
+    assert batch[3] == TimeEntry.from_dict(started_time_entries[3])
+    assert batch[3]["project_id"] == started_time_entries[3]["project_id"]
+
+
+def test_time_entry_batch_total_duration(started_time_entries):
+    batch = TimeEntryBatch.from_dicts(started_time_entries)
+    assert batch.total_duration() == sum(
+        entry["duration"] for entry in started_time_entries if entry["duration"] >= 0
+    )
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize(
+    "toggl_filter_object",
+    [
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=["Doohickey design"],
+                client_names=["Megacorp"],
+                workspace_names=["Alternate workspace"],
+            ),
+            id="filter_batch",
+        ),
+    ],
+    indirect=["toggl_filter_object"],
+)
+def test_filter_batch_matches_filter_time_entries(
+    toggl_filter_object, started_time_entries, use_numpy
+):
+    batch = TimeEntryBatch.from_dicts(started_time_entries)
+    if use_numpy:
+        pytest.importorskip("numpy")
+        filtered_batch = toggl_filter_object.filter_batch(batch)
+    else:
+        with patch.object(TimeEntryBatch, "to_numpy", side_effect=ImportError):
+            filtered_batch = toggl_filter_object.filter_batch(batch)
+    filtered_time_entries = toggl_filter_object.filter_time_entries(
+        started_time_entries
+    )
+    assert list(filtered_batch) == [
+        TimeEntry.from_dict(time_entry) for time_entry in filtered_time_entries
+    ]
+    assert DurationAggregator().consume_batch(filtered_batch) == sum(
+        time_entry["duration"] for time_entry in filtered_time_entries
+    )
@@ -0,0 +1,227 @@
+import json
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+import pytest
+import requests
+from click.testing import CliRunner
+
+from toggl_tally.api import TogglAPI, split_time_range
+from toggl_tally.cache import TimeEntryCache
+from toggl_tally.cli import toggl_tally
+from toggl_tally.fake_toggl import FakeTogglServer, generate_dataset
+from toggl_tally.history import invoice_periods
+from toggl_tally.http_cache import ValidatorCache
+from toggl_tally.scheduler import RequestScheduler, RetryPolicy
+from toggl_tally.tally import TogglTally
+from toggl_tally.time_utils import parse_timestamp
+
+END_DATE = datetime(2023, 4, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def dataset():
+    return generate_dataset(n_time_entries=2000, days=90, end_date=END_DATE)
+
+
+@pytest.fixture()
+def fake_toggl(dataset, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    with FakeTogglServer(dataset, seed=0) as server:
+        yield server
+
+
+def make_api(server: FakeTogglServer, **kwargs) -> TogglAPI:
+    return TogglAPI(
+        base_url=server.base_url,
+        scheduler=RequestScheduler(
+            rate=None,
+            retry_policy=RetryPolicy(max_retries=20, backoff_base=0),
+        ),
+        **kwargs,
+    )
+
+
+def between(dataset, start_date, end_date):
+    return [
+        time_entry
+        for time_entry in dataset["time_entries"]
+        if start_date <= parse_timestamp(time_entry["start"]) <= end_date
+    ]
+
+
+def test_metadata_endpoints(fake_toggl, dataset):
+    api = make_api(fake_toggl)
+    assert api.get_user_workspaces() == dataset["workspaces"]
+    assert api.get_user_clients() == dataset["clients"]
+    assert api.get_user_projects() == dataset["projects"]
+
+
+def test_time_entries_fetched_in_parallel_windows(fake_toggl, dataset):
+    api = make_api(fake_toggl)
+    api.window = timedelta(days=7)
+    start_date = END_DATE - timedelta(days=60)
+    assert api.get_time_entries_between(start_date, END_DATE) == between(
+        dataset, start_date, END_DATE
+    )
+    assert fake_toggl.responses["/me/time_entries", 200] == 9
+
+
+@pytest.mark.parametrize("gzip", [True, False])
+def test_time_entries_streamed(dataset, monkeypatch, gzip):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    start_date = END_DATE - timedelta(days=30)
+    with FakeTogglServer(dataset, gzip=gzip) as server:
+        time_entries = list(
+            make_api(server).iter_time_entries_between(start_date, END_DATE)
+        )
+    assert time_entries == between(dataset, start_date, END_DATE)
+
+
+def test_faults_are_retried(dataset, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    with FakeTogglServer(
+        dataset, faults={429: 0.4, 503: 0.2}, retry_after=0, seed=1
+    ) as server:
+        api = make_api(server)
+        for _ in range(10):
+            assert api.get_user_projects() == dataset["projects"]
+    assert server.responses["/me/projects", 200] == 10
+    assert server.responses["/me/projects", 429] > 0
+    assert server.responses["/me/projects", 503] > 0
+    assert api.scheduler.n_retries == (
+        server.responses["/me/projects", 429] + server.responses["/me/projects", 503]
+    )
+
+
+def test_conditional_requests(fake_toggl, dataset, tmp_path):
+    for _ in range(3):
+        api = make_api(fake_toggl, validator_cache=ValidatorCache(tmp_path))
+        assert api.get_user_projects() == dataset["projects"]
+    assert fake_toggl.responses["/me/projects", 200] == 1
+    assert fake_toggl.responses["/me/projects", 304] == 2
+
+
+def test_missing_api_token_rejected(fake_toggl):
+    api = make_api(fake_toggl)
+    # requests are made without credentials
+    api.auth = lambda: None
+    with pytest.raises(requests.HTTPError, match="403"):
+        api.get_user_projects()
+
+
+def test_cli_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    snapshot = TogglTally(invoice_day_of_month=1, country="ZA").snapshot()
+    dataset = generate_dataset(n_time_entries=500, days=60)
+    with FakeTogglServer(dataset) as server:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                f"--api-url={server.base_url}",
+                "breakdown",
+                "--invoice-day=1",
+                "--country=ZA",
+                "--json",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout)["seconds"] == sum(
+        time_entry["duration"]
+        for time_entry in between(
+            dataset, snapshot.first_billable_date, datetime.now(timezone.utc)
+        )
+        if time_entry["duration"] >= 0
+    )
+
+
+def test_cli_fetches_long_ranges_in_windows(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    window = timedelta(days=7)
+    monkeypatch.setattr("toggl_tally.cli.TogglAPI", partial(TogglAPI, window=window))
+    snapshot = TogglTally(invoice_day_of_month=1, country="ZA").snapshot()
+    dataset = generate_dataset(n_time_entries=500, days=60)
+    with FakeTogglServer(dataset) as server:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                f"--api-url={server.base_url}",
+                "breakdown",
+                "--invoice-day=1",
+                "--country=ZA",
+                "--json",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    now = datetime.now(timezone.utc)
+    # one request per window of the billable period, rather than one in all
+    assert server.responses["/me/time_entries", 200] == len(
+        split_time_range(snapshot.first_billable_date, now, window)
+    )
+    assert json.loads(result.stdout)["seconds"] == sum(
+        time_entry["duration"]
+        for time_entry in between(dataset, snapshot.first_billable_date, now)
+        if time_entry["duration"] >= 0
+    )
+
+
+def test_cli_history_fetches_periods_in_windows(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    snapshots = invoice_periods(
+        TogglTally(invoice_day_of_month=1, country="ZA").snapshot(), 4
+    )
+    dataset = generate_dataset(n_time_entries=500, days=150)
+    with FakeTogglServer(dataset) as server:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                f"--api-url={server.base_url}",
+                "history",
+                "--hours-per-month=160",
+                "--invoice-day=1",
+                "--country=ZA",
+                "--workspaces=Workspace 0",
+                "--periods=4",
+                "--json",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    now = datetime.now(timezone.utc)
+    # the periods together span several windows
+    windows = split_time_range(snapshots[0].first_billable_date, now, TogglAPI().window)
+    assert len(windows) > 1
+    assert server.responses["/me/time_entries", 200] == len(windows)
+    periods = json.loads(result.stdout)["periods"]
+    assert sum(period["seconds_worked"] for period in periods) == sum(
+        time_entry["duration"]
+        for time_entry in between(dataset, snapshots[0].first_billable_date, now)
+        if time_entry["duration"] >= 0
+    )
+
+
+def test_cli_keeps_caches_of_other_apis_apart(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    with FakeTogglServer(generate_dataset(n_time_entries=100, days=60)) as server:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                f"--api-url={server.base_url}",
+                "hours",
+                "--hours-per-month=160",
+                "--invoice-day=1",
+                "--country=ZA",
+                "--workspaces=Workspace 0",
+                "--max-cache-age=3600",
+                "--metadata-ttl=3600",
+                "--no-daemon",
+            ],
+        )
+    assert result.exit_code == 0, result.output
+    # nothing from the fake server where the Toggl API's caches are
+    assert [path.name for path in tmp_path.iterdir()] == ["api"]
+    (api_cache_dir,) = (tmp_path / "api").iterdir()
+    assert TimeEntryCache.for_user(api_cache_dir).entries
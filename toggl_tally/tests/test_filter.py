@@ -1,4 +1,5 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
 import pytest
@@ -240,3 +241,78 @@ def test_filter_time_entries(
     ]
     filtered_time_entries = toggl_filter_object.filter_time_entries(time_entries)
     assert filtered_time_entries == expected_filtered_time_entries
+
+
+def test_toggl_filter_accepts_prefetched_metadata(
+    user_projects, user_clients, user_workspaces
+):
+    with patch(
+        "toggl_tally.TogglAPI"
+    ) as MockTogglAPI, ThreadPoolExecutor() as executor:
+        instance = MockTogglAPI.return_value
+        toggl_filter = TogglFilter(
+            api=instance,
+            projects=["Project X"],
+            clients=["Supercorp"],
+            workspaces=[],
+            user_projects=user_projects,
+            user_clients=executor.submit(lambda: user_clients),
+            user_workspaces=executor.submit(lambda: user_workspaces),
+        )
+    instance.get_user_projects.assert_not_called()
+    instance.get_user_clients.assert_not_called()
+    instance.get_user_workspaces.assert_not_called()
+    assert toggl_filter.filtered_projects == TogglEntities(
+        entities=[TogglEntity(id=1001, name="Project X", type="project")]
+    )
+    assert toggl_filter.filtered_clients == TogglEntities(
+        entities=[TogglEntity(id=55, name="Supercorp", type="client")]
+    )
+
+
+@pytest.mark.parametrize(
+    "toggl_filter_object,exclude_running_entries",
+    [
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=["Doohickey design"],
+                client_names=["Supercorp"],
+                workspace_names=["Alternate workspace"],
+            ),
+            True,
+            id="inclusion_mask_by_project_client_and_workspace",
+        ),
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=[],
+                client_names=["Supercorp"],
+                workspace_names=[],
+            ),
+            False,
+            id="inclusion_mask_including_running_entries",
+        ),
+    ],
+    indirect=["toggl_filter_object"],
+)
+def test_inclusion_mask_matches_filter_time_entries(
+    toggl_filter_object, exclude_running_entries, time_entries
+):
+    np = pytest.importorskip("numpy")
+    mask = toggl_filter_object.inclusion_mask(
+        workspace_ids=np.array([entry["workspace_id"] for entry in time_entries]),
+        project_ids=np.array([entry["project_id"] or 0 for entry in time_entries]),
+        durations=np.array([entry["duration"] for entry in time_entries]),
+        exclude_running_entries=exclude_running_entries,
+    )
+    filtered_time_entries = toggl_filter_object.filter_time_entries(
+        time_entries, exclude_running_entries=exclude_running_entries
+    )
+    assert [
+        entry for entry, included in zip(time_entries, mask) if included
+    ] == filtered_time_entries
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.cli import toggl_tally
+from toggl_tally.entries import TimeEntryBatch
+from toggl_tally.history import invoice_periods, period_history
+from toggl_tally.tally import TallySnapshot, TogglTally
+
+NOW = datetime(2023, 3, 20, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def periods():
+    tally = TogglTally(invoice_day_of_month=15, country="ZA")
+    return invoice_periods(TallySnapshot(tally, now=NOW), 4)
+
+
+def test_invoice_periods(periods):
+    assert [period.first_billable_date.date().isoformat() for period in periods] == [
+        "2022-12-15",
+        "2023-01-14",  # the 15th is a Sunday, invoiced on Friday the 13th
+        "2023-02-15",
+        "2023-03-15",
+    ]
+    for period, next_period in zip(periods, periods[1:]):
+        assert period.next_invoice_date == next_period.last_invoice_date
+
+
+def test_period_history_matches_per_period_sums(periods):
+    time_entries = [
+        {
+            "id": index,
+            "workspace_id": 10,
+            "project_id": None,
+            "duration": 60 * (index % 7 + 1),
+            "start": (NOW - timedelta(hours=7 * index)).isoformat(),
+        }
+        for index in range(400)
+    ]
+    results = period_history(
+        periods, TimeEntryBatch.from_dicts(time_entries), hours_per_month=160
+    )
+    boundaries = [period.first_billable_date for period in periods] + [NOW]
+    for result, start, end in zip(results, boundaries, boundaries[1:]):
+        assert result["seconds_worked"] == sum(
+            time_entry["duration"]
+            for time_entry in time_entries
+            if start <= datetime.fromisoformat(time_entry["start"]) < end
+            or datetime.fromisoformat(time_entry["start"]) == end == NOW
+        )
+    assert [result["current"] for result in results] == [False, False, False, True]
+    assert results[-1]["target_seconds"] == 160 * 60 * 60
+
+
+def test_history_fetches_once(patched_cli_api):
+    result = CliRunner().invoke(
+        toggl_tally,
+        [
+            "history",
+            "--hours-per-month=160",
+            "--invoice-day=15",
+            "--country=ZA",
+            "--clients=Supercorp",
+            "--periods=3",
+            "--json",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    patched_cli_api.iter_time_entries_between.assert_called_once()
+    results = json.loads(result.stdout)["periods"]
+    assert [result["seconds_worked"] for result in results] == [0, 0, 16300]
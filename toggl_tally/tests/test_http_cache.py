@@ -0,0 +1,86 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.http_cache import ValidatorCache
+
+
+class FakeToggl(object):
+    """
+    Answers GET requests with ETag validators, and 304 Not Modified when the
+    request's If-None-Match is still current
+    """
+
+    def __init__(self, bodies: dict, send_validators: bool = True):
+        self.bodies = bodies
+        self.send_validators = send_validators
+        self.requests = []
+
+    def get(self, url, headers, **kwargs):
+        self.requests.append(headers)
+        body = json.dumps(self.bodies[url.rsplit("/v9", 1)[1]])
+        etag = f'"{hash(body)}"' if self.send_validators else None
+        if etag is not None and headers.get("If-None-Match") == etag:
+            return MagicMock(
+                ok=True, status_code=304, headers={"ETag": etag}, content=b""
+            )
+        return MagicMock(
+            ok=True,
+            status_code=200,
+            headers={"ETag": etag} if etag is not None else {},
+            content=body.encode(),
+            text=body,
+            json=lambda: json.loads(body),
+        )
+
+
+@pytest.fixture()
+def toggl(user_projects, user_clients):
+    return FakeToggl({"/me/projects": user_projects, "/me/clients": user_clients})
+
+
+def make_api(toggl, tmp_path, api_token="secret", **kwargs):
+    api = TogglAPI(validator_cache=ValidatorCache(tmp_path, **kwargs))
+    api.session = MagicMock(auth=(api_token, "api_token"))
+    api.session.get.side_effect = toggl.get
+    return api
+
+
+def test_unchanged_response_revalidated(toggl, tmp_path, user_projects):
+    assert make_api(toggl, tmp_path).get_user_projects() == user_projects
+    assert make_api(toggl, tmp_path).get_user_projects() == user_projects
+    assert "If-None-Match" not in toggl.requests[0]
+    assert "If-None-Match" in toggl.requests[1]
+
+
+def test_changed_response_downloaded(toggl, tmp_path, user_projects):
+    make_api(toggl, tmp_path).get_user_projects()
+    toggl.bodies["/me/projects"] = user_projects[:1]
+    assert make_api(toggl, tmp_path).get_user_projects() == user_projects[:1]
+    # and the new version is revalidated from then on
+    assert make_api(toggl, tmp_path).get_user_projects() == user_projects[:1]
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+@pytest.mark.parametrize(
+    "api_kwargs,send_validators",
+    [
+        pytest.param(dict(endpoints=["/me/clients"]), True, id="ineligible_endpoint"),
+        pytest.param({}, False, id="no_validators"),
+    ],
+)
+def test_response_not_cached(toggl, tmp_path, api_kwargs, send_validators):
+    toggl.send_validators = send_validators
+    for _ in range(2):
+        make_api(toggl, tmp_path, **api_kwargs).get_user_projects()
+    assert not any("If-None-Match" in headers for headers in toggl.requests)
+    assert not list(tmp_path.iterdir())
+
+
+def test_responses_cached_per_user(toggl, tmp_path):
+    make_api(toggl, tmp_path, api_token="alice").get_user_projects()
+    make_api(toggl, tmp_path, api_token="bob").get_user_projects()
+    assert not any("If-None-Match" in headers for headers in toggl.requests)
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+from toggl_tally.filter import TogglEntities, TogglEntity, TogglFilter
+from toggl_tally.metadata import MetadataCache, TogglMetadataIndex
+
+
+def test_metadata_index_hierarchy(user_projects, user_clients, user_workspaces):
+    index = TogglMetadataIndex(user_projects, user_clients, user_workspaces)
+    assert index.get_id("client", "Megacorp") == 56
+    assert index.get_entity("project", 1001)["name"] == "Project X"
+    assert index.get_workspace_client_ids(10) == [55, 56, 20]
+    assert index.get_workspace_client_ids(11) == [40]
+    assert index.get_client_project_ids(55) == [1000, 1002, 1003]
+    assert index.get_client_project_ids(20) == []
+    assert index.get_client_project_ids(None) == [1030]
+    with pytest.raises(KeyError):
+        index.get_id("project", "Nonexistent")
+
+
+def test_metadata_cache_reads_from_disk_within_ttl(tmp_path, mock_api):
+    MetadataCache(mock_api, tmp_path / "metadata.json").get_index()
+    cache = MetadataCache(mock_api, tmp_path / "metadata.json")
+    index = cache.get_index()
+    assert index.get_id("workspace", "Alternate workspace") == 11
+    assert not cache.is_refreshed
+    mock_api.get_user_projects.assert_called_once()
+
+
+def test_metadata_cache_refreshes_after_ttl(tmp_path, mock_api):
+    MetadataCache(mock_api, tmp_path / "metadata.json").get_index()
+    cache = MetadataCache(mock_api, tmp_path / "metadata.json", ttl=-1)
+    cache.get_index()
+    assert cache.is_refreshed
+    assert mock_api.get_user_projects.call_count == 2
+
+
+def test_metadata_cache_invalidate(tmp_path, mock_api):
+    cache = MetadataCache(mock_api, tmp_path / "metadata.json")
+    cache.get_index()
+    cache.invalidate()
+    assert not (tmp_path / "metadata.json").exists()
+    cache.get_index()
+    assert mock_api.get_user_projects.call_count == 2
+
+
+def test_toggl_filter_refreshes_metadata_cache_for_unknown_name(
+    tmp_path, mock_api, user_projects
+):
+    MetadataCache(mock_api, tmp_path / "metadata.json").get_index()
+    new_project = {
+        "name": "New project",
+        "id": 1050,
+        "workspace_id": 10,
+        "client_id": None,
+    }
+    mock_api.get_user_projects.return_value = user_projects + [new_project]
+    toggl_filter = TogglFilter(
+        api=mock_api,
+        projects=["New project"],
+        metadata_cache=MetadataCache(mock_api, tmp_path / "metadata.json"),
+    )
+    assert toggl_filter.filtered_projects == TogglEntities(
+        entities=[TogglEntity(id=1050, name="New project", type="project")]
+    )
+    assert mock_api.get_user_projects.call_count == 2
+
+
+def test_toggl_filter_metadata_cache_fails_for_missing_name(tmp_path, mock_api):
+    MetadataCache(mock_api, tmp_path / "metadata.json").get_index()
+    exception_match_str = re.escape(
+        "Project name Nonexistent not found in user projects"
+    )
+    with pytest.raises(ValueError, match=exception_match_str):
+        TogglFilter(
+            api=mock_api,
+            projects=["Nonexistent"],
+            metadata_cache=MetadataCache(mock_api, tmp_path / "metadata.json"),
+        )
+    assert mock_api.get_user_projects.call_count == 2
@@ -0,0 +1,155 @@
+from unittest.mock import MagicMock
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.cli import toggl_tally
+from toggl_tally.metrics import MetricsRegistry, TogglTallyMetrics, _Metric
+from toggl_tally.scheduler import RequestScheduler, RetryPolicy
+from toggl_tally.tracing import add_span_listener, remove_span_listener, span
+
+
+@pytest.fixture()
+def metrics():
+    metrics = TogglTallyMetrics(MetricsRegistry())
+    add_span_listener(metrics)
+    yield metrics
+    remove_span_listener(metrics)
+
+
+def _samples(text: str) -> dict:
+    return dict(
+        line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#")
+    )
+
+
+@pytest.mark.parametrize(
+    "openmetrics,expected",
+    [
+        pytest.param(
+            False,
+            [
+                "# HELP latency_seconds Latency",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{endpoint="/me",le="0.1"} 1',
+                'latency_seconds_bucket{endpoint="/me",le="1"} 2',
+                'latency_seconds_bucket{endpoint="/me",le="+Inf"} 3',
+                'latency_seconds_count{endpoint="/me"} 3',
+                'latency_seconds_sum{endpoint="/me"} 2.55',
+                "# HELP retries_total Retries",
+                "# TYPE retries_total counter",
+                'retries_total{reason="429"} 2',
+            ],
+            id="prometheus",
+        ),
+        pytest.param(
+            True,
+            [
+                "# HELP latency_seconds Latency",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{endpoint="/me",le="0.1"} 1',
+                'latency_seconds_bucket{endpoint="/me",le="1"} 2',
+                'latency_seconds_bucket{endpoint="/me",le="+Inf"} 3',
+                'latency_seconds_count{endpoint="/me"} 3',
+                'latency_seconds_sum{endpoint="/me"} 2.55',
+                "# HELP retries Retries",
+                "# TYPE retries counter",
+                'retries_total{reason="429"} 2',
+                "# EOF",
+            ],
+            id="openmetrics",
+        ),
+    ],
+)
+def test_registry_render(openmetrics, expected):
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=[0.1, 1])
+    retries = registry.counter("retries", "Retries")
+    for seconds in [0.05, 0.5, 2]:
+        latency.observe(seconds, endpoint="/me")
+    retries.inc(reason="429")
+    retries.inc(reason="429")
+    assert registry.render(openmetrics=openmetrics).splitlines() == expected
+
+
+def test_api_request_and_retry_metrics(metrics):
+    responses = iter(
+        [
+            MagicMock(ok=False, status_code=503, headers={}),
+            MagicMock(ok=True, status_code=200, content=b'[{"id": 1}]'),
+        ]
+    )
+    api = TogglAPI(
+        scheduler=RequestScheduler(
+            rate=None, retry_policy=RetryPolicy(backoff_base=0), sleep=lambda _: None
+        )
+    )
+    api.session = MagicMock(auth=("token", "api_token"))
+    api.session.get.side_effect = lambda *args, **kwargs: next(responses)
+    api.get_user_projects()
+    samples = _samples(metrics.registry.render())
+    assert (
+        samples['toggl_tally_api_requests_total{endpoint="/me/projects",status="200"}']
+        == "1"
+    )
+    assert samples['toggl_tally_api_retries_total{reason="503"}'] == "1"
+    assert (
+        samples['toggl_tally_api_response_bytes_sum{endpoint="/me/projects"}'] == "11"
+    )
+    assert (
+        samples[
+            'toggl_tally_api_request_duration_seconds_count{endpoint="/me/projects"}'
+        ]
+        == "1"
+    )
+
+
+def test_cache_metrics(metrics):
+    with span("cache.metadata", hit=True):
+        pass
+    with span("cache.time_entries", hit=False):
+        pass
+    samples = _samples(metrics.registry.render())
+    assert (
+        samples['toggl_tally_cache_requests_total{cache="metadata",result="hit"}']
+        == "1"
+    )
+    assert (
+        samples['toggl_tally_cache_requests_total{cache="time_entries",result="miss"}']
+        == "1"
+    )
+
+
+def test_hours_metrics_file(tmp_path, patched_cli_api, time_entries):
+    metrics_path = tmp_path / "textfile" / "toggl_tally.prom"
+    result = CliRunner().invoke(
+        toggl_tally,
+        [
+            f"--metrics-file={metrics_path}",
+            "--metrics-format=openmetrics",
+            "hours",
+            "--hours-per-month=160",
+            "--invoice-day=15",
+            "--country=ZA",
+            "--clients=Supercorp",
+            "--no-daemon",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    text = metrics_path.read_text()
+    assert text.endswith("# EOF\n")
+    samples = _samples(text)
+    fetched = int(samples["toggl_tally_time_entries_fetched_total"])
+    retained = int(samples["toggl_tally_time_entries_retained_total"])
+    assert fetched == len(time_entries)
+    assert 0 < retained < fetched
+    assert float(samples["toggl_tally_run_duration_seconds"]) > 0
+
+
+def test_metric_without_samples_fails_on_creation():
+    class Unfinished(_Metric):
+        type = "gauge"
+
+    with pytest.raises(TypeError, match="samples"):
+        Unfinished("unfinished", "Has no samples")
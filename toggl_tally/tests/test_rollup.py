@@ -0,0 +1,118 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.cache import TimeEntryCache
+from toggl_tally.cli import toggl_tally
+from toggl_tally.rollup import DailyRollup
+
+START_DATE = datetime(2023, 3, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def history():
+    return [
+        {
+            "id": index,
+            "workspace_id": 10 + index % 2,
+            "project_id": [1000, 1001, None][index % 3],
+            "duration": 600 * (index % 5 + 1),
+            "start": f"2023-03-{1 + index // 4:02d}T{6 * (index % 4):02d}:00:00Z",
+        }
+        for index in range(40)
+    ]
+
+
+@pytest.fixture()
+def cache(tmp_path, history):
+    api = MagicMock()
+    api.get_time_entries_between.return_value = history
+    cache = TimeEntryCache(tmp_path / "cache.json", timezone="UTC")
+    cache.sync(api, start_date=START_DATE)
+    return cache
+
+
+def _rebuilt(cache: TimeEntryCache) -> DailyRollup:
+    rollup = DailyRollup(timezone="UTC")
+    rollup.rebuild(cache.entries.values(), start_date=START_DATE)
+    return rollup
+
+
+def test_rollup_totals_match_time_entries(cache, history):
+    by_workspace = SimpleNamespace(
+        includes_ids=lambda workspace_id, project_id: workspace_id == 11
+        or project_id == 1000
+    )
+    expected = sum(
+        time_entry["duration"]
+        for time_entry in history[8:24]
+        if time_entry["workspace_id"] == 11 or time_entry["project_id"] == 1000
+    )
+    assert (
+        cache.rollup.seconds_between(date(2023, 3, 3), date(2023, 3, 6), by_workspace)
+        == expected
+    )
+    assert sum(
+        cache.rollup.totals_between(date(2023, 3, 1), date(2023, 3, 31)).values()
+    ) == sum(time_entry["duration"] for time_entry in history)
+
+
+def test_rollup_follows_incremental_sync(cache, history):
+    api = MagicMock()
+    api.get_time_entries_since.return_value = [
+        dict(history[0], duration=7200),
+        dict(history[1], server_deleted_at="2023-03-11T00:00:00Z"),
+        dict(history[2], start="2023-03-09T08:00:00Z", project_id=1001),
+        dict(history[3], id=100),
+        dict(history[4], id=101, duration=-1678000000),
+    ]
+    cache.sync(api, start_date=START_DATE)
+    assert cache.rollup.cells == _rebuilt(cache).cells
+
+
+def test_compacted_days_keep_their_totals(cache, tmp_path):
+    totals = cache.rollup.totals_between(date(2023, 3, 1), date(2023, 3, 10))
+    assert cache.compact(date(2023, 3, 6)) == 20
+    assert min(cache.rollup.day_of(entry) for entry in cache.entries.values()) == date(
+        2023, 3, 6
+    )
+    cache.save()
+    reloaded = TimeEntryCache(tmp_path / "cache.json")
+    assert reloaded.rollup.timezone == "UTC"
+    assert reloaded.rollup.compacted_until == date(2023, 3, 6)
+    assert reloaded.rollup.totals_between(date(2023, 3, 1), date(2023, 3, 10)) == totals
+    # changes to closed days are ignored
+    reloaded.rollup.add(dict(cache.entries[20], start="2023-03-02T08:00:00Z"))
+    assert reloaded.rollup.totals_between(date(2023, 3, 1), date(2023, 3, 10)) == totals
+
+
+def test_rollup_rejects_days_it_does_not_cover(cache):
+    with pytest.raises(ValueError, match="starts on 2023-03-01"):
+        cache.rollup.seconds_between(date(2023, 2, 28), date(2023, 3, 1))
+
+
+def test_hours_from_rollup_matches_time_entries(
+    tmp_path, monkeypatch, api_token, patched_cli_api
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    outputs = []
+    for cache_args in [[], ["--max-cache-age=3600"]]:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [
+                "hours",
+                "--hours-per-month=160",
+                "--invoice-day=15",
+                "--country=ZA",
+                "--clients=Supercorp",
+                "--no-daemon",
+                *cache_args,
+            ],
+        )
+        assert result.exit_code == 0, result.output
+        outputs.append(result.output)
+    assert outputs[0] == outputs[1]
+    assert TimeEntryCache.for_user().rollup.first_day is not None
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests.exceptions import HTTPError
+
+from toggl_tally.api import TogglAPI
+from toggl_tally.scheduler import RequestScheduler, RetryPolicy, TokenBucket
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture()
+def flaky_toggl_server(user_projects):
+    """
+    Serves user projects, after answering the first ``failures`` requests
+    with the given status and headers
+    """
+    state = dict(failures=[], in_flight=0, max_in_flight=0, n_requests=0)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with lock:
+                state["n_requests"] += 1
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+                failure = state["failures"].pop(0) if state["failures"] else None
+            time.sleep(state.get("latency", 0))
+            if failure is None:
+                self._send(200, json.dumps(user_projects).encode())
+            else:
+                status, headers = failure
+                self._send(status, b"slow down", headers)
+            with lock:
+                state["in_flight"] -= 1
+
+        def _send(self, status, body, headers={}):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.state = state
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(7):
+        bucket.acquire()
+    # a burst of 3, then one token every half second
+    assert clock.sleeps == [0.5, 0.5, 0.5, 0.5]
+
+
+def test_token_bucket_pause_until():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=5, clock=clock, sleep=clock.sleep)
+    bucket.pause_until(10)
+    bucket.acquire()
+    assert clock.now == 11
+
+
+def test_scheduler_retries_rate_limited_requests(
+    flaky_toggl_server, api_token, user_projects
+):
+    flaky_toggl_server.state["failures"] = [
+        (429, {"Retry-After": "0"}),
+        (429, {}),
+        (503, {}),
+    ]
+    scheduler = RequestScheduler(
+        rate=None, retry_policy=RetryPolicy(backoff_base=0.001)
+    )
+    api = TogglAPI(base_url=flaky_toggl_server.base_url, scheduler=scheduler)
+    assert api.get_user_projects() == user_projects
+    assert flaky_toggl_server.state["n_requests"] == 4
+    assert scheduler.n_retries == 3
+
+
+def test_scheduler_gives_up_after_max_retries(flaky_toggl_server, api_token):
+    flaky_toggl_server.state["failures"] = [(429, {"Retry-After": "0"})] * 3
+    scheduler = RequestScheduler(
+        rate=None, retry_policy=RetryPolicy(max_retries=2, backoff_base=0.001)
+    )
+    api = TogglAPI(base_url=flaky_toggl_server.base_url, scheduler=scheduler)
+    with pytest.raises(HTTPError, match="429 Client Error"):
+        api.get_user_projects()
+    assert flaky_toggl_server.state["n_requests"] == 3
+
+
+def test_scheduler_caps_concurrency(flaky_toggl_server, api_token, user_projects):
+    flaky_toggl_server.state["latency"] = 0.05
+    api = TogglAPI(
+        base_url=flaky_toggl_server.base_url,
+        scheduler=RequestScheduler(rate=None, max_concurrency=2),
+    )
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(api.get_user_projects()))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [user_projects] * 6
+    assert flaky_toggl_server.state["max_in_flight"] == 2
+
+
+def test_scheduler_retry_after_pauses_all_requests():
+    clock = FakeClock()
+    scheduler = RequestScheduler(rate=1, burst=4, clock=clock, sleep=clock.sleep)
+
+    class Response(object):
+        def __init__(self, status_code, headers={}):
+            self.status_code = status_code
+            self.headers = headers
+
+        def close(self):
+            pass
+
+    responses = iter([Response(429, {"Retry-After": "30"}), Response(200)])
+    assert scheduler.call(lambda: next(responses)).status_code == 200
+    # the retry waits out the Retry-After, plus a second for the bucket to
+    # refill after the pause
+    assert clock.now == 31
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from click.testing import CliRunner
+
+from toggl_tally.breakdown import filter_totals, totals_by_project
+from toggl_tally.cli import toggl_tally
+from toggl_tally.sqlite_store import SQLiteStore
+from toggl_tally.time_utils import get_current_datetime
+
+START = datetime(2023, 3, 1, tzinfo=timezone.utc)
+END = datetime(2023, 3, 31, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def store(tmp_path, mock_api, dated_time_entries):
+    mock_api.get_time_entries_between.return_value = dated_time_entries
+    store = SQLiteStore(tmp_path / "store.sqlite3")
+    store.sync(mock_api, start_date=START)
+    yield store
+    store.close()
+
+
+def test_sqlite_store_full_sync(tmp_path, store, mock_api, dated_time_entries):
+    mock_api.get_time_entries_since.assert_not_called()
+    reopened = SQLiteStore(tmp_path / "store.sqlite3")
+    assert len(reopened) == len(dated_time_entries)
+    assert reopened.covers(START)
+    assert reopened.is_fresh(max_age=60)
+    assert list(reopened.iter_time_entries_between(START, END)) == dated_time_entries
+
+
+def test_sqlite_store_incremental_sync(store, mock_api, dated_time_entries):
+    last_sync = store.last_sync
+    updated_entry = dict(dated_time_entries[0], duration=7200)
+    deleted_entry = dict(dated_time_entries[1], server_deleted_at="2023-03-05")
+    mock_api.get_time_entries_since.return_value = [updated_entry, deleted_entry]
+    assert store.sync(mock_api, start_date=START) == 2
+    mock_api.get_time_entries_between.assert_called_once()
+    mock_api.get_time_entries_since.assert_called_once_with(since=last_sync)
+    assert list(store.iter_time_entries_between(START, END)) == [
+        updated_entry,
+        *dated_time_entries[2:],
+    ]
+
+
+@pytest.mark.parametrize(
+    "toggl_filter_object",
+    [
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=["Baz refactoring"],
+                client_names=[],
+                workspace_names=["Alternate workspace"],
+            ),
+            id="union",
+        ),
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=[],
+                client_names=["Supercorp"],
+                workspace_names=[],
+            ),
+            id="client",
+        ),
+    ],
+    indirect=["toggl_filter_object"],
+)
+def test_sqlite_store_sums_match_filter(store, toggl_filter_object, dated_time_entries):
+    expected = toggl_filter_object.filter_time_entries(dated_time_entries)
+    assert store.seconds_worked(START, END, toggl_filter_object) == sum(
+        time_entry["duration"] for time_entry in expected
+    )
+    assert store.totals_by_project(START, END, toggl_filter_object) == filter_totals(
+        totals_by_project(dated_time_entries), toggl_filter_object
+    )
+
+
+def test_sqlite_store_filter_with_many_projects(store, dated_time_entries):
+    # more project ids than SQLite allows bound parameters, even in builds
+    # that raise the limit to 250000
+    project_ids = frozenset(range(1000, 1000 + 300_000))
+    toggl_filter = SimpleNamespace(
+        included_workspace_ids=frozenset(), included_project_ids=project_ids
+    )
+    assert store.seconds_worked(START, END, toggl_filter) == sum(
+        time_entry["duration"]
+        for time_entry in dated_time_entries
+        if time_entry["project_id"] in project_ids and time_entry["duration"] >= 0
+    )
+
+
+def test_sqlite_store_date_range(store, dated_time_entries):
+    assert store.seconds_worked(START, START + timedelta(hours=1)) == sum(
+        time_entry["duration"] for time_entry in dated_time_entries[:2]
+    )
+
+
+def test_sqlite_metadata_cache(store, mock_api, user_projects, user_workspaces):
+    index = store.metadata_cache(mock_api).get_index()
+    reloaded = store.metadata_cache(mock_api).get_index()
+    mock_api.get_user_projects.assert_called_once()
+    assert reloaded.user_projects == index.user_projects == user_projects
+    assert reloaded.user_workspaces == user_workspaces
+
+
+def test_sqlite_store_concurrent_writers(tmp_path, dated_time_entries):
+    path = tmp_path / "store.sqlite3"
+    SQLiteStore(path)
+
+    def merge(offset: int):
+        # each worker opens the store separately, as another process would
+        SQLiteStore(path).merge(
+            [
+                dict(time_entry, id=time_entry["id"] + offset)
+                for time_entry in dated_time_entries
+            ]
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(merge, range(0, 80, 10)))
+    assert len(SQLiteStore(path)) == 8 * len(dated_time_entries)
+
+
+@pytest.mark.parametrize("command", ["hours", "breakdown"])
+def test_sqlite_store_cli_matches_json_cache(
+    command, tmp_path, monkeypatch, api_token, patched_cli_api, dated_time_entries
+):
+    monkeypatch.setenv("TOGGL_TALLY_CACHE_DIR", str(tmp_path))
+    now = get_current_datetime().isoformat()
+    patched_cli_api.get_time_entries_between.return_value = [
+        dict(time_entry, start=now) for time_entry in dated_time_entries
+    ]
+    args = [command, "--invoice-day=15", "--country=ZA", "--clients=Supercorp"]
+    if command == "hours":
+        args += ["--hours-per-month=160", "--no-daemon"]
+    outputs = []
+    for store_args in [[], ["--store=sqlite"]]:
+        result = CliRunner().invoke(
+            toggl_tally,
+            [*store_args, *args, "--max-cache-age=3600", "--metadata-ttl=3600"],
+        )
+        assert result.exit_code == 0, result.output
+        outputs.append(result.output)
+    assert outputs[0] == outputs[1]
+    assert len(SQLiteStore.for_user()) == len(dated_time_entries)
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from toggl_tally.aggregate import DurationAggregator
+from toggl_tally.api import TogglAPI
+from toggl_tally.stream import iter_json_array
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 16, 1024])
+def test_iter_json_array_chunk_boundaries(time_entries, chunk_size):
+    body = json.dumps(time_entries).encode()
+    chunks = (body[i : i + chunk_size] for i in range(0, len(body), chunk_size))
+    assert list(iter_json_array(chunks)) == time_entries
+
+
+def test_iter_json_array_split_multibyte_character():
+    body = json.dumps([{"description": "Café"}], ensure_ascii=False).encode()
+    chunks = [body[: body.index(b"\xa9")], body[body.index(b"\xa9") :]]
+    assert list(iter_json_array(chunks)) == [{"description": "Café"}]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        pytest.param(b'[{"id": 1}', id="unterminated"),
+        pytest.param(b'[{"id": 1} {"id": 2}]', id="missing_delimiter"),
+        pytest.param(b'[{"id": 1}] []', id="extra_data"),
+    ],
+)
+def test_iter_json_array_fails_for_invalid_json(body):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array([body]))
+
+
+def test_toggl_api_streams_time_entries(monkeypatch, time_entries):
+    monkeypatch.setenv("TOGGL_API_TOKEN", "secret")
+    body = json.dumps(time_entries).encode()
+    response = MagicMock(ok=True)
+    response.iter_content.return_value = iter([body[:100], body[100:]])
+    api = TogglAPI()
+    api.session = MagicMock(auth=None)
+    api.session.get.return_value = response
+    time_entries_iter = api.iter_time_entries_between(
+        start_date=datetime(2023, 3, 1, tzinfo=timezone.utc),
+        end_date=datetime(2023, 3, 31, tzinfo=timezone.utc),
+    )
+    # the request is made before the body is consumed
+    assert api.session.get.call_args[1]["stream"] is True
+    response.iter_content.assert_not_called()
+    assert list(time_entries_iter) == time_entries
+    response.__exit__.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "toggl_filter_object",
+    [
+        pytest.param(
+            dict(
+                user_projects="user_projects",
+                user_clients="user_clients",
+                user_workspaces="user_workspaces",
+                project_names=[],
+                client_names=["Supercorp"],
+                workspace_names=[],
+            ),
+            id="streaming_filter_by_client",
+        ),
+    ],
+    indirect=["toggl_filter_object"],
+)
+def test_streaming_filter_and_aggregate(toggl_filter_object, time_entries):
+    aggregator = DurationAggregator()
+    seconds_worked = aggregator.consume(
+        toggl_filter_object.iter_time_entries(iter(time_entries))
+    )
+    filtered_time_entries = toggl_filter_object.filter_time_entries(time_entries)
+    assert seconds_worked == sum(entry["duration"] for entry in filtered_time_entries)
+    assert aggregator.n_entries == len(filtered_time_entries)
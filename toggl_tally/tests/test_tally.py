@@ -2,7 +2,6 @@ import re
 from datetime import date, datetime
 
 import pytest
-from dateutil import rrule
 
 import toggl_tally.tally as sut
 
@@ -84,6 +83,19 @@ def test_toggl_tally_next_working_day(toggl_tally_object, expected_next_working_
             datetime(2023, 6, 20),
             id="invoice_date_weekend",
         ),
+        pytest.param(
+            dict(now=datetime(2023, 12, 20), invoice_day_of_month=15),
+            # 15 December 2023 was a special public holiday in ZA
+            datetime(2023, 12, 14),
+            datetime(2024, 1, 15),
+            id="invoice_date_next_year",
+        ),
+        pytest.param(
+            dict(now=datetime(2024, 1, 10), invoice_day_of_month=15),
+            datetime(2023, 12, 14),
+            datetime(2024, 1, 15),
+            id="invoice_date_last_year",
+        ),
     ],
     indirect=["toggl_tally_object"],
 )
@@ -195,7 +207,20 @@ def test_toggl_tally_remaining_working_days(
             ),
             [("Human Rights Day", date(2023, 3, 21))],
             id="remaining_public_holidays",
-        )
+        ),
+        pytest.param(
+            dict(
+                now=datetime(2023, 12, 20),
+                invoice_day_of_month=15,
+                exclude_public_holidays=True,
+            ),
+            [
+                ("Christmas Day", date(2023, 12, 25)),
+                ("Day of Goodwill", date(2023, 12, 26)),
+                ("New Year's Day", date(2024, 1, 1)),
+            ],
+            id="remaining_public_holidays_across_new_year",
+        ),
     ],
     indirect=["toggl_tally_object"],
 )
@@ -208,31 +233,23 @@ def test_toggl_tally_remaining_public_holidays(
     )
 
 
-def test_toggle_tally_rrule_day_strs():
-    expected_result = [
-        rrule.MO,
-        rrule.TU,
-        rrule.WE,
-        rrule.TH,
-        rrule.FR,
-        rrule.SA,
-        rrule.SU,
-    ]
-    sut._get_rrule_days(["MO", "TU", "WE", "TH", "FR", "SA", "SU"]) == expected_result
+def test_toggle_tally_working_day_strs():
+    day_strs = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+    assert sut._get_working_day_ints(day_strs) == list(range(7))
 
 
-def test_toggle_tally_rrule_day_strs_fails_for_invalid():
+def test_toggle_tally_working_day_strs_fails_for_invalid():
     exception_match_str = re.escape(
         'Working days should use the codes: ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]'
     )
     with pytest.raises(ValueError, match=exception_match_str):
-        sut._get_rrule_days(["MO", "FO"])
+        sut._get_working_day_ints(["MO", "FO"])
 
 
-def test_toggle_tally_rrule_day_strs_fails_for_empty():
+def test_toggle_tally_working_day_strs_fails_for_empty():
     exception_match_str = re.escape("Working days should be non-empty")
     with pytest.raises(ValueError, match=exception_match_str):
-        sut._get_rrule_days([])
+        sut._get_working_day_ints([])
 
 
 @pytest.mark.parametrize(
@@ -255,3 +272,24 @@ def test_toggl_tally_first_billable_date(
     toggl_tally_object, expected_first_billable_date
 ):
     assert toggl_tally_object.first_billable_date == expected_first_billable_date
+
+
+@pytest.mark.parametrize(
+    "toggl_tally_object",
+    [pytest.param(dict(now=datetime(2023, 3, 1), invoice_day_of_month=26))],
+    indirect=["toggl_tally_object"],
+)
+def test_toggl_tally_snapshot(toggl_tally_object):
+    snapshot = toggl_tally_object.snapshot()
+    assert snapshot.now == datetime(2023, 3, 1)
+    assert snapshot.next_invoice_date == toggl_tally_object.next_invoice_date
+    assert snapshot.last_billable_date == toggl_tally_object.last_billable_date
+    assert (
+        snapshot.remaining_working_days
+        == toggl_tally_object.remaining_working_days
+        == 17
+    )
+    # derived values are computed once
+    assert snapshot.next_invoice_date is snapshot.next_invoice_date
+    with pytest.raises(AttributeError):
+        snapshot.now = datetime(2023, 3, 2)
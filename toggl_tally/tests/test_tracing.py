@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timezone
+
+from click.testing import CliRunner
+
+from toggl_tally.cli import toggl_tally
+from toggl_tally.tally import TallySnapshot, TogglTally
+from toggl_tally.tracing import (
+    _NULL_SPAN,
+    _listeners,
+    add_span_listener,
+    recording,
+    remove_span_listener,
+    span,
+)
+
+
+def test_span_is_a_no_op_without_listeners():
+    with span("phase", size=1) as null_span:
+        null_span.attributes["status"] = 200
+    assert null_span is _NULL_SPAN
+    assert null_span.attributes == {}
+
+
+def test_span_listener_hook():
+    spans = []
+    add_span_listener(spans.append)
+    try:
+        with span("outer"):
+            with span("inner", size=1) as inner:
+                inner.attributes["status"] = 200
+    finally:
+        remove_span_listener(spans.append)
+    with span("after"):
+        pass
+    assert [(recorded.name, recorded.attributes) for recorded in spans] == [
+        ("inner", dict(size=1, status=200)),
+        ("outer", {}),
+    ]
+    assert spans[1].start_ns <= spans[0].start_ns <= spans[0].end_ns <= spans[1].end_ns
+
+
+def test_tally_spans():
+    with recording() as recorder:
+        tally = TogglTally(invoice_day_of_month=15, country="ZA")
+        TallySnapshot(
+            tally, now=datetime(2023, 3, 20, tzinfo=timezone.utc)
+        ).remaining_working_days
+    names = {row["name"] for row in recorder.summary()}
+    assert {
+        "tally.remaining_working_days",
+        "holidays.load_year",
+        "calendar.build_year",
+    } <= names
+
+
+def test_hours_profile_and_trace(tmp_path, patched_cli_api):
+    trace_path = tmp_path / "trace.json"
+    result = CliRunner().invoke(
+        toggl_tally,
+        [
+            "--profile",
+            f"--trace={trace_path}",
+            "hours",
+            "--hours-per-month=160",
+            "--invoice-day=15",
+            "--country=ZA",
+            "--clients=Supercorp",
+            "--no-daemon",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "hours.filter_and_sum" in result.output
+    # the recorder stops listening once the command is done
+    assert not _listeners
+    with trace_path.open() as f:
+        trace_events = json.load(f)["traceEvents"]
+    assert {"hours.setup", "hours.filter_and_sum", "filter.apply_filters"} <= {
+        trace_event["name"] for trace_event in trace_events
+    }
+    assert all(trace_event["ph"] == "X" for trace_event in trace_events)
@@ -0,0 +1,62 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from toggl_tally.workdays import WorkingDayCalendar
+
+HOLIDAYS = {date(2023, 3, 21), date(2023, 12, 25), date(2024, 1, 1)}
+
+
+def holidays_for_year(year):
+    return [holiday for holiday in HOLIDAYS if holiday.year == year]
+
+
+def is_working_day(day, working_days):
+    return day.weekday() in working_days and day not in HOLIDAYS
+
+
+@pytest.mark.parametrize(
+    "working_days",
+    [
+        pytest.param([0, 1, 2, 3, 4], id="weekdays"),
+        pytest.param([1, 5], id="tuesday_saturday"),
+        pytest.param([6], id="sunday"),
+    ],
+)
+def test_working_day_calendar_matches_day_by_day(working_days):
+    calendar = WorkingDayCalendar(working_days, holidays_for_year)
+    rng = random.Random(0)
+    for _ in range(200):
+        start = date(2023, 1, 1) + timedelta(days=rng.randrange(700))
+        end = start + timedelta(days=rng.randrange(-5, 400))
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        assert calendar.count_working_days(start, end) == len(
+            [day for day in days if is_working_day(day, working_days)]
+        )
+        next_day = start
+        while not is_working_day(next_day, working_days):
+            next_day += timedelta(days=1)
+        assert calendar.next_working_day(start) == next_day
+        previous_day = start
+        while not is_working_day(previous_day, working_days):
+            previous_day -= timedelta(days=1)
+        assert calendar.previous_working_day(start) == previous_day
+        assert calendar.is_working_day(start) == is_working_day(start, working_days)
+
+
+def test_working_day_calendar_count_many():
+    np = pytest.importorskip("numpy")
+    calendar = WorkingDayCalendar([0, 1, 2, 3, 4], holidays_for_year)
+    starts = [date(2023, 3, 1), date(2023, 12, 20), date(2023, 3, 10)]
+    ends = [date(2023, 3, 31), date(2024, 1, 5), date(2023, 3, 1)]
+    counts = calendar.count_working_days_many(starts, ends)
+    assert counts.tolist() == [
+        calendar.count_working_days(start, end) for start, end in zip(starts, ends)
+    ]
+    assert counts.dtype == np.int64
+
+
+def test_working_day_calendar_fails_for_empty_working_days():
+    with pytest.raises(ValueError, match="Working days should be non-empty"):
+        WorkingDayCalendar([])
@@ -1,11 +1,14 @@
 from datetime import datetime, timezone
 from typing import Union
 
-from dateutil import tz
-
 
 def get_current_datetime(local_timezone: Union[str, None] = None) -> str:
-    local_tz = tz.gettz(local_timezone) if local_timezone is not None else None
+    if local_timezone is not None:
+        from dateutil import tz
+
+        local_tz = tz.gettz(local_timezone)
+    else:
+        local_tz = None
     return datetime.now(timezone.utc).astimezone(local_tz)
 
 
@@ -20,6 +23,20 @@ def get_current_timestamp(local_timezone: Union[str, None] = None) -> str:
     return local_time.isoformat()
 
 
+def parse_timestamp(timestamp: str) -> datetime:
+    """
+    Parse an RFC3339 timestamp as returned by the Toggl API
+
+    >>> parse_timestamp("2023-03-01T08:00:00Z")
+    datetime.datetime(2023, 3, 1, 8, 0, tzinfo=datetime.timezone.utc)
+    >>> parse_timestamp("2023-03-01T10:00:00+02:00").utcoffset().seconds
+    7200
+    """
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return datetime.fromisoformat(timestamp)
+
+
 def format_seconds(seconds: float) -> str:
     """
     >>> format_seconds(3600)
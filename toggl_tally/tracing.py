@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+SpanListener = Callable[["Span"], None]
+
+_listeners: List[SpanListener] = []
+_listeners_lock = threading.Lock()
+
+
+class Span(object):
+    """
+    A timed phase of a run, reported to every span listener when it ends.
+    Spans nest by thread: a span started while another is open on the same
+    thread ends within it.
+    """
+
+    __slots__ = ("name", "attributes", "thread_id", "start_ns", "end_ns")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.thread_id = 0
+        self.start_ns = 0
+        self.end_ns = 0
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+    def __enter__(self) -> "Span":
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end_ns = time.perf_counter_ns()
+        for listener in _listeners:
+            listener(self)
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, {self.duration_ns / 1e6:.3f}ms)"
+
+
+class _NullSpan(object):
+    """
+    Stands in for a Span when nothing is listening, so that tracing costs a
+    function call and a list check
+    """
+
+    __slots__ = ()
+
+    @property
+    def attributes(self) -> dict:
+        # a fresh dict, so setting attributes on a null span is harmless
+        return {}
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes) -> Span:
+    """
+    Time a phase of a run, e.g. ``with span("api.request", endpoint=url):``.
+    Attributes can also be added to the span inside the block.
+    """
+    if not _listeners:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def add_span_listener(listener: SpanListener):
+    """
+    Call ``listener`` with every span that ends from now on, on the thread
+    that ran the span. This is the hook for collecting toggl_tally's spans
+    in another application.
+    """
+    global _listeners
+    with _listeners_lock:
+        # replaced rather than mutated, so spans ending on other threads
+        # iterate over a consistent list
+        _listeners = _listeners + [listener]
+
+
+def remove_span_listener(listener: SpanListener):
+    global _listeners
+    with _listeners_lock:
+        _listeners = [existing for existing in _listeners if existing != listener]
+
+
+class SpanRecorder(object):
+    """
+    Collects spans, for a breakdown of where a run's time went or a trace
+    file for chrome://tracing or https://ui.perfetto.dev
+
+    >>> with recording() as recorder:
+    ...     with span("outer"):
+    ...         with span("inner", size=3):
+    ...             pass
+    >>> [recorded.name for recorded in recorder.spans]
+    ['inner', 'outer']
+    >>> [row["name"] for row in recorder.summary()]
+    ['outer', 'inner']
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.start_ns = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> List[dict]:
+        """
+        Count and total duration of the spans of each name, longest first
+        """
+        totals: Dict[str, dict] = {}
+        for recorded in self.spans:
+            total = totals.setdefault(
+                recorded.name, dict(name=recorded.name, count=0, total_ns=0)
+            )
+            total["count"] += 1
+            total["total_ns"] += recorded.duration_ns
+        return sorted(totals.values(), key=lambda total: -total["total_ns"])
+
+    def to_chrome_trace(self) -> dict:
+        """
+        The spans in the Chrome trace event format, as complete events
+        timed in microseconds since the recorder was created
+        """
+        pid = os.getpid()
+        return dict(
+            traceEvents=[
+                dict(
+                    name=recorded.name,
+                    cat=recorded.name.split(".")[0],
+                    ph="X",
+                    ts=(recorded.start_ns - self.start_ns) / 1000,
+                    dur=recorded.duration_ns / 1000,
+                    pid=pid,
+                    tid=recorded.thread_id,
+                    args={
+                        key: str(value) for key, value in recorded.attributes.items()
+                    },
+                )
+                for recorded in sorted(self.spans, key=lambda span: span.start_ns)
+            ],
+            displayTimeUnit="ms",
+        )
+
+    def write_chrome_trace(self, path: Path):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+@contextmanager
+def recording() -> Iterator[SpanRecorder]:
+    """
+    Record the spans that end within the block
+    """
+    recorder = SpanRecorder()
+    add_span_listener(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_span_listener(recorder)
@@ -0,0 +1,242 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
+
+from toggl_tally.tracing import span
+
+HolidaysForYear = Callable[[int], Iterable[date]]
+
+
+class HolidayIndex(object):
+    """
+    A country's public holidays, loaded a year at a time as queries touch each
+    year and kept as sorted date ordinals for O(log n) lookups and range
+    queries.
+
+    >>> public_holidays = HolidayIndex("ZA")
+    >>> datetime(2023, 3, 21, 9, 30) in public_holidays
+    True
+    >>> for name, holiday_date in public_holidays.between(
+    ...     date(2023, 12, 20), date(2024, 1, 5)
+    ... ):
+    ...     print(holiday_date, name)
+    2023-12-25 Christmas Day
+    2023-12-26 Day of Goodwill
+    2024-01-01 New Year's Day
+    >>> sorted(public_holidays.years)
+    [2023, 2024]
+    """
+
+    def __init__(self, country: str):
+        self.country = country
+        self.years: Set[int] = set()
+        self._ordinals = array("l")
+        self._names: List[str] = []
+
+    def load_year(self, year: int):
+        if year in self.years:
+            return
+        with span("holidays.load_year", country=self.country, year=year):
+            import holidays
+
+            year_holidays = sorted(
+                (holiday_date.toordinal(), name)
+                for holiday_date, name in holidays.country_holidays(
+                    self.country, years=year
+                ).items()
+                if holiday_date.year == year
+            )
+        # splice the year in between the years already loaded
+        index = bisect_left(self._ordinals, date(year, 1, 1).toordinal())
+        self._ordinals[index:index] = array(
+            "l", (ordinal for ordinal, _ in year_holidays)
+        )
+        self._names[index:index] = [name for _, name in year_holidays]
+        self.years.add(year)
+
+    def get(self, day: Union[date, datetime]) -> Union[str, None]:
+        """
+        The name of the holiday on a day, if any
+        """
+        if isinstance(day, datetime):
+            day = day.date()
+        self.load_year(day.year)
+        ordinal = day.toordinal()
+        index = bisect_left(self._ordinals, ordinal)
+        if index < len(self._ordinals) and self._ordinals[index] == ordinal:
+            return self._names[index]
+        return None
+
+    def __contains__(self, day: Union[date, datetime]) -> bool:
+        return self.get(day) is not None
+
+    def between(self, start: date, end: date) -> List[Tuple[str, date]]:
+        """
+        (name, date) of each holiday between start and end inclusive
+        """
+        for year in range(start.year, end.year + 1):
+            self.load_year(year)
+        start_index = bisect_left(self._ordinals, start.toordinal())
+        end_index = bisect_right(self._ordinals, end.toordinal())
+        return [
+            (self._names[index], date.fromordinal(self._ordinals[index]))
+            for index in range(start_index, end_index)
+        ]
+
+    def for_year(self, year: int) -> List[date]:
+        return [
+            holiday_date
+            for _, holiday_date in self.between(date(year, 1, 1), date(year, 12, 31))
+        ]
+
+
+class _WorkingYear(object):
+    """
+    Working days of one year as prefix counts over the year's days, plus the
+    sorted ordinals of the working days themselves
+    """
+
+    __slots__ = ("first_ordinal", "prefix_counts", "working_ordinals")
+
+    def __init__(self, year: int, weekmask: tuple, holidays: Iterable[date]):
+        self.first_ordinal = date(year, 1, 1).toordinal()
+        n_days = date(year + 1, 1, 1).toordinal() - self.first_ordinal
+        holiday_ordinals = {holiday.toordinal() for holiday in holidays}
+        self.working_ordinals = array("l")
+        self.prefix_counts = array("l", [0])
+        count = 0
+        for ordinal in range(self.first_ordinal, self.first_ordinal + n_days):
+            # date.weekday() is 0 for Monday, as is (ordinal - 1) % 7
+            if weekmask[(ordinal - 1) % 7] and ordinal not in holiday_ordinals:
+                count += 1
+                self.working_ordinals.append(ordinal)
+            self.prefix_counts.append(count)
+
+    def count(self, start_ordinal: int, end_ordinal: int) -> int:
+        # inclusive of both ends, which must fall within the year
+        return (
+            self.prefix_counts[end_ordinal - self.first_ordinal + 1]
+            - self.prefix_counts[start_ordinal - self.first_ordinal]
+        )
+
+
+class WorkingDayCalendar(object):
+    """
+    Answers working day queries in O(1) (counts within a year, membership) or
+    O(log n) (next and previous working days), from per-year tables that are
+    built the first time a query touches each year.
+
+    ``working_days`` are weekday ints (0 for Monday) and ``holidays_for_year``
+    returns the non-working holidays of a year, if any.
+
+    >>> calendar = WorkingDayCalendar([0, 1, 2, 3, 4], lambda year: [date(year, 3, 21)])
+    >>> calendar.count_working_days(date(2023, 3, 1), date(2023, 3, 31))
+    22
+    >>> calendar.next_working_day(date(2023, 3, 18))
+    datetime.date(2023, 3, 20)
+    >>> calendar.previous_working_day(date(2023, 3, 21))
+    datetime.date(2023, 3, 20)
+    """
+
+    max_search_years = 10
+
+    def __init__(
+        self,
+        working_days: Iterable[int],
+        holidays_for_year: Union[HolidaysForYear, None] = None,
+    ):
+        working_days = set(working_days)
+        if not working_days:
+            raise ValueError("Working days should be non-empty")
+        self.weekmask = tuple(weekday in working_days for weekday in range(7))
+        self.holidays_for_year = holidays_for_year
+        self._years: Dict[int, _WorkingYear] = {}
+
+    def _year(self, year: int) -> _WorkingYear:
+        try:
+            return self._years[year]
+        except KeyError:
+            holidays = self.holidays_for_year(year) if self.holidays_for_year else []
+            with span("calendar.build_year", year=year):
+                working_year = self._years[year] = _WorkingYear(
+                    year, self.weekmask, holidays
+                )
+            return working_year
+
+    def is_working_day(self, day: date) -> bool:
+        ordinal = day.toordinal()
+        return self._year(day.year).count(ordinal, ordinal) == 1
+
+    def count_working_days(self, start: date, end: date) -> int:
+        """
+        Working days between start and end inclusive, or 0 if end is before start
+        """
+        if end < start:
+            return 0
+        count = 0
+        for year in range(start.year, end.year + 1):
+            working_year = self._year(year)
+            start_ordinal = max(start.toordinal(), working_year.first_ordinal)
+            end_ordinal = min(end.toordinal(), date(year, 12, 31).toordinal())
+            count += working_year.count(start_ordinal, end_ordinal)
+        return count
+
+    def next_working_day(self, day: date) -> date:
+        """
+        The first working day on or after day
+        """
+        ordinal = day.toordinal()
+        for year in range(day.year, day.year + self.max_search_years):
+            working_ordinals = self._year(year).working_ordinals
+            index = bisect_left(working_ordinals, ordinal)
+            if index < len(working_ordinals):
+                return date.fromordinal(working_ordinals[index])
+        raise ValueError(f"No working days within {self.max_search_years} years")
+
+    def previous_working_day(self, day: date) -> date:
+        """
+        The last working day on or before day
+        """
+        ordinal = day.toordinal()
+        for year in range(day.year, day.year - self.max_search_years, -1):
+            working_ordinals = self._year(year).working_ordinals
+            index = bisect_right(working_ordinals, ordinal)
+            if index > 0:
+                return date.fromordinal(working_ordinals[index - 1])
+        raise ValueError(f"No working days within {self.max_search_years} years")
+
+    def count_working_days_many(self, starts, ends):
+        """
+        Vectorised count_working_days over arrays of inclusive date ranges,
+        using NumPy's busday_count. Requires NumPy.
+        """
+        import numpy as np
+
+        starts = np.asarray(starts, dtype="datetime64[D]")
+        ends = np.asarray(ends, dtype="datetime64[D]")
+        if not starts.size:
+            return np.zeros(starts.shape, dtype=np.int64)
+        years = np.concatenate([starts, ends]).astype("datetime64[Y]").astype(int)
+        holidays = []
+        if self.holidays_for_year is not None:
+            for year in range(years.min() + 1970, years.max() + 1971):
+                holidays.extend(self.holidays_for_year(year))
+        counts = np.busday_count(
+            starts,
+            ends + np.timedelta64(1, "D"),
+            weekmask=[int(working) for working in self.weekmask],
+            holidays=np.array(holidays, dtype="datetime64[D]"),
+        )
+        return np.maximum(counts, 0)
+
+
+def shift_to_day(moment, day: date):
+    """
+    Move a date or datetime to another day, keeping its time and timezone
+
+    >>> from datetime import datetime
+    >>> shift_to_day(datetime(2023, 3, 18, 9, 30), date(2023, 3, 20))
+    datetime.datetime(2023, 3, 20, 9, 30)
+    """
+    return moment + timedelta(days=day.toordinal() - moment.toordinal())